@@ -1,9 +1,5 @@
 # app.py - APEX BNN Services Management App
 # Refactored for correctness, safety, and modularity — all logic preserved.
-import sys
-print("🔍 sys.path =", sys.path)
-print("📦 sys.modules keys:", [k for k in sys.modules.keys() if 'model' in k])
-from reportlab.lib.utils import ImageReader
 import os
 import csv
 import base64
@@ -12,8 +8,6 @@ import logging
 from datetime import datetime, timezone, timedelta
 from io import BytesIO, StringIO
 from functools import wraps  # Required for @wraps(f)
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
 from decimal import Decimal,ROUND_HALF_UP
 from datetime import datetime, timezone
 
@@ -41,10 +35,11 @@ from flask_bcrypt import Bcrypt
 from wtforms.validators import DataRequired, Optional, NumberRange
 from werkzeug.security import check_password_hash
 from werkzeug.utils import secure_filename
-from sqlalchemy import func, extract, Enum as SqlEnum,text
+from sqlalchemy import func, Enum as SqlEnum,text
 from flask_wtf import Form
 from zoneinfo import ZoneInfo
 from sqlalchemy import select,delete,update, func, or_, and_
+from sqlalchemy.orm import joinedload
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -52,22 +47,22 @@ load_dotenv()
 from models_core.config import Config
 from models_core import db
 from models_core import create_app,create_default_admin
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from io import BytesIO
-from reportlab.lib.colors import Color, black
+from models_core.migrations import upgrade_schema
+from models_core.money import ZERO, Money
+from models_core.lineage import chain_root_id, save_new_version
+from models_core.search_index import search_invoices
+from models_core.settings_cache import company_settings as cached_company_settings
+from models_core.stock_ledger import has_stock_movements, sync_document_stock, sync_procurement_stock
+from utils.lazy_views import add_lazy_routes
 from flask import request, Response, jsonify, flash, redirect, render_template
 
 
 # ✅ Explicitly get FLASK_ENV, default to 'production'
 env = os.getenv('FLASK_ENV', 'production')
-print(f"🌐 Using FLASK_ENV: {env}")  # Debug print
 
 # Initialize app using factory
 app = create_app(env)  # This calls db.init_app(app) internally
-print("🔧 Environment:", app.config.get("ENV"))
-print("📦 DB URI:", app.config.get("SQLALCHEMY_DATABASE_URI"))
+app.logger.debug("Using FLASK_ENV: %s", env)
 # Initialize extensions
 csrf = CSRFProtect(app)
 bcrypt = Bcrypt(app)
@@ -124,7 +119,38 @@ from forms import (
 )
 
 from flask_babel import Babel
-from utils.pdf_generator import generate_invoice_pdf
+from utils.pdf_assets import asset_cache
+from utils.batch_export import export_entries, export_query, iter_zip, queue_missing
+from utils.dashboard_metrics import (
+    BID_COUNT,
+    PROCUREMENT_COUNT,
+    SUPPLIER_COUNT,
+    bump_metric,
+    dashboard_summary,
+    invoice_snapshot,
+    record_invoice_change,
+    record_status_change,
+)
+from utils.invoice_stats import DOCUMENT_TYPES, client_revenue, invoice_kpis
+from utils.revenue_rollup import monthly_revenue
+from utils.http_cache import etag_cached
+from utils.memo import cache_stats, invalidate, memoize
+from utils.inventory_alerts import LOW_STOCK, OUT_OF_STOCK, inventory_alerts
+from utils.bid_analytics import get_bid_insights
+from utils.doc_sequence import next_monthly_sequence
+from utils.pagination import apply_search, paginate_request
+from utils.csv_export import csv_response, stream_rows
+from utils.typeahead import DEFAULT_LIMIT as TYPEAHEAD_LIMIT, LOOKUPS as TYPEAHEAD_LOOKUPS, selected_choice, typeahead
+from utils.render_queue import (
+    FAILED as RENDER_FAILED,
+    IN_PROGRESS as RENDER_IN_PROGRESS,
+    dispatch as dispatch_render,
+    dispatch_for_invoice as dispatch_render_for_invoice,
+    document_form_data,
+    queue_render,
+    resume_pending_jobs,
+    wait_for_render,
+)
 # ========================
 # Utility Functions
 # ========================
@@ -140,49 +166,30 @@ def safe_decimal(val, default='0'):
         print(f"⚠️ Failed to convert '{val}' to Decimal: {e}")
         return Decimal(default)
 
-def get_lowest_competitor(bid):
-    return min(bid.competitor_bids, key=lambda c: c.bid_price, default=None)
-
-def is_price_too_high(bid, threshold=0.15):
-    lowest = get_lowest_competitor(bid)
-    if not lowest:
-        return False
-    return bid.our_bid_price > lowest.bid_price * (1 + threshold)
-
+@memoize(ttl=300, maxsize=1, tags=('competitor_bid',))
 def get_top_competitors():
     return db.session.query(
         CompetitorBid.competitor_name,
         func.count(CompetitorBid.id).label('bid_count'),
-        func.avg(CompetitorBid.bid_price).label('avg_price')
+        func.avg(CompetitorBid.bid_price, type_=Money).label('avg_price')
     ).group_by(CompetitorBid.competitor_name).order_by(func.count(CompetitorBid.id).desc()).limit(10).all()
 
 def get_monthly_summary():
-    one_year_ago = datetime.now(timezone.utc) - timedelta(days=365)
-    summary = db.session.query(
-        extract('year', Invoice.date_created).label('year'),
-        extract('month', Invoice.date_created).label('month'),
-        func.sum(Invoice.total_amount).label('revenue'),
-        func.sum(Invoice.vat_amount).label('vat_collected')
-    ).filter(
-        Invoice.status == 'Paid',
-        Invoice.document_type == 'invoice',
-        Invoice.date_created >= one_year_ago
-    ).group_by('year', 'month').order_by('year', 'month').all()
-    return summary
+    # Paid invoices per month over the last year, from the revenue_by_month rollup. Not memoized:
+    # it is a dozen indexed rows, and a per-worker copy would lag the live headline totals
+    return monthly_revenue(since=datetime.now(timezone.utc) - timedelta(days=365))
 
+@memoize(ttl=60, maxsize=1, tags=('our_product_service',))
 def get_inventory_alerts():
-    items = OurProductService.query.all()
-    low_stock = [i for i in items if i.quantity_on_hand and i.reorder_point and 0 < i.quantity_on_hand <= i.reorder_point]
-    out_of_stock = [i for i in items if i.quantity_on_hand == 0]
-    return items, low_stock, out_of_stock
-
-def get_bid_data(status_filter, currency_filter):
-    query = Bid.query
-    if status_filter:
-        query = query.filter_by(status=status_filter)
-    if currency_filter:
-        query = query.filter_by(currency=currency_filter)
-    return query.all()
+    # Counts plus the first few items of each alert, computed in SQL (utils/inventory_alerts.py)
+    return inventory_alerts()
+
+@memoize(ttl=300, maxsize=1, tags=('our_product_service',))
+def get_product_categories():
+    return sorted(db.session.scalars(
+        select(OurProductService.category).where(OurProductService.category.is_not(None)).distinct()
+    ).all())
+
 babel = Babel(app)
 def ensure_directories():
     """Create necessary directories if they don't exist."""
@@ -231,7 +238,7 @@ def get_item_initials(description):
 def generate_doc_number(document_type, items_data):
     """
     Generate document number like: APEX-INV-I15P-SEP25-001
-    Format: APEX-{TYPE}-{PRODUCT}-{DAY}-{DAILY_SEQ}
+    Format: APEX-{TYPE}-{PRODUCT}-{MONTH}-{MONTHLY_SEQ}
     """
     prefixes = {
         'invoice': 'INV',
@@ -248,19 +255,12 @@ def generate_doc_number(document_type, items_data):
     else:
         product_code = "GEN"
 
-    # Get today's day suffix (e.g., SEP25)
+    # Get this month's suffix (e.g., SEP25)
     now = datetime.now()
     day_suffix = now.strftime("%b%y").upper()  # e.g., SEP25
 
-    # Count how many documents of this type were created today
-    start_of_day = datetime(now.year, now.month, now.day)
-    daily_count = db.session.query(Invoice).filter(
-        Invoice.document_type == document_type,
-        Invoice.created_at >= start_of_day
-    ).count()
-
-    # Increment by 1
-    seq_num = f"{daily_count + 1:03d}"  # → 001, 002...
+    # Next number for this type in the month shown in the suffix (atomic, see utils.doc_sequence)
+    seq_num = f"{next_monthly_sequence(document_type, now):03d}"  # → 001, 002...
 
     # Final number
     doc_number = f"APEX-{prefix}-{product_code}-{day_suffix}-{seq_num}"
@@ -386,68 +386,33 @@ def inject_datetime():
 def dashboard():
     try:
         now = datetime.now(timezone.utc)
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        pending_invoices = Invoice.query.filter_by(status='Pending', document_type='invoice').count()
-        total_revenue = db.session.query(func.sum(Invoice.total_amount)).filter_by(status='Paid', document_type='invoice').scalar() or 0.0
-        overdue_invoices = Invoice.query.filter_by(status='Overdue', document_type='invoice').count()
-        pending_proformas = Invoice.query.filter_by(status='Pending', document_type='proforma').count()
-        pending_delivery_notes = Invoice.query.filter_by(document_type='delivery_note').count()
-        recent_documents = Invoice.query.order_by(Invoice.date_created.desc()).limit(10).all()
-        recent_activity_count = Invoice.query.filter(Invoice.date_created >= now - timedelta(days=7)).count()
-
-        top_client = db.session.query(Client.name, func.sum(Invoice.total_amount)).join(Invoice).filter(Invoice.status == 'Paid').group_by(Client.id).order_by(func.sum(Invoice.total_amount).desc()).first()
-        top_client_name = top_client[0] if top_client else "N/A"
-        top_client_amount = top_client[1] if top_client else 0.0
-        avg_invoice_value = db.session.query(func.avg(Invoice.total_amount)).filter_by(document_type='invoice').scalar() or 0.0
-        total_suppliers = Supplier.query.count()
-        pending_procurements = ProcurementItem.query.filter_by(status='Ordered').count()
-        total_bids = Bid.query.count()
-        pending_bids = Bid.query.filter_by(status='Pending').count()
-
-        monthly_summary = get_monthly_summary()
-        monthly_labels = [f"{row.year}-{row.month:02d}" for row in monthly_summary]
-        monthly_revenue = [float(row.revenue) for row in monthly_summary]
-        monthly_vat_data = [float(row.vat_collected) for row in monthly_summary]
-        monthly_vat = db.session.query(func.sum(Invoice.vat_amount)).filter(
-            Invoice.status == 'Paid',
-            Invoice.document_type == 'invoice',
-            Invoice.date_created >= start_of_month
-        ).scalar() or 0.0
-
-        inventory_items, low_stock_items, out_of_stock_items = get_inventory_alerts()
+        # Headline figures come from the dashboard_metric rollup (see utils/dashboard_metrics.py)
+        summary = dashboard_summary(now)
+        # Paid revenue and VAT per month, from the revenue_by_month rollup
+        months = get_monthly_summary()
+        this_month = next((m for m in months if (m.year, m.month) == (now.year, now.month)), None)
+        recent_documents = Invoice.query.options(joinedload(Invoice.client)) \
+            .order_by(Invoice.date_created.desc()).limit(10).all()
+
+        alerts = get_inventory_alerts()
         status_filter = request.args.get('status')
         currency_filter = request.args.get('currency')
-        bids = get_bid_data(status_filter, currency_filter)
+        # Each row carries its lowest competitor offer, computed in one query
+        bids = get_bid_insights(status_filter, currency_filter)
         top_competitors = get_top_competitors()
 
         return render_template('dashboard.html',
-            pending_invoices=pending_invoices,
-            total_revenue=total_revenue,
-            overdue_invoices=overdue_invoices,
-            pending_proformas=pending_proformas,
-            pending_delivery_notes=pending_delivery_notes,
             recent_documents=recent_documents,
-            recent_activity_count=recent_activity_count,
-            top_client_name=top_client_name,
-            top_client_amount=top_client_amount,
-            avg_invoice_value=avg_invoice_value,
-            total_suppliers=total_suppliers,
-            pending_procurements=pending_procurements,
-            total_bids=total_bids,
-            pending_bids=pending_bids,
-            inventory_items=inventory_items,
-            low_stock_items=low_stock_items,
-            out_of_stock_items=out_of_stock_items,
-            monthly_vat=monthly_vat,
-            monthly_labels=monthly_labels,
-            monthly_revenue=monthly_revenue,
-            monthly_vat_data=monthly_vat_data,
+            alerts=alerts,
             bids=bids,
             top_competitors=top_competitors,
-            get_lowest_competitor=get_lowest_competitor,
-            is_price_too_high=is_price_too_high,
             status_filter=status_filter,
-            currency_filter=currency_filter
+            currency_filter=currency_filter,
+            monthly_vat=this_month.vat_collected if this_month else ZERO,
+            monthly_labels=[f"{m.year:04d}-{m.month:02d}" for m in months],
+            monthly_revenue=[float(m.revenue) for m in months],
+            monthly_vat_data=[float(m.vat_collected) for m in months],
+            **summary
         )
     except Exception as e:
         print(f"Error fetching dashboard: {e}")
@@ -461,22 +426,14 @@ def dashboard():
 
 @app.route('/api/monthly_revenue')
 @login_required
+@etag_cached('invoice', key=lambda: datetime.now(timezone.utc).strftime('%Y-%m'))
 def api_monthly_revenue():
-    now = datetime.now(timezone.utc)
-    start_of_month = now.replace(day=1)
-    data = db.session.query(
-        extract('month', Invoice.date_created).label('month'),
-        func.sum(Invoice.total_amount).label('revenue')
-    ).filter(
-        Invoice.status == 'Paid',
-        Invoice.document_type == 'invoice',
-        extract('year', Invoice.date_created) == now.year,
-        Invoice.date_created >= start_of_month
-    ).group_by('month').order_by('month').all()
-    return {'labels': [row[0] for row in data], 'values': [float(row[1]) for row in data]}
+    data = monthly_revenue(since=datetime.now(timezone.utc))
+    return {'labels': [row.month for row in data], 'values': [float(row.revenue) for row in data]}
 
 @app.route('/api/client/<int:client_id>')
 @login_required
+@etag_cached('client')
 def api_client(client_id):
     client = db.session.get(Client, client_id)
     if not client:
@@ -488,30 +445,44 @@ def api_client(client_id):
         'address': client.address or ''
     })
 
+@app.route('/api/typeahead/<kind>')
+@login_required
+def api_typeahead(kind):
+    if kind not in TYPEAHEAD_LOOKUPS:
+        abort(404)
+    limit = request.args.get('limit', TYPEAHEAD_LIMIT, type=int)
+    return jsonify(results=typeahead(kind, request.args.get('q', ''), limit))
+
 @app.route('/api/top_clients')
 @login_required
+@etag_cached('invoice', 'client')
 def api_top_clients():
-    top_client = db.session.query(Client.name, func.sum(Invoice.total_amount)) \
-        .join(Invoice).filter(Invoice.status == 'Paid') \
-        .group_by(Client.id).order_by(func.sum(Invoice.total_amount).desc()).first()
+    top_clients = client_revenue(limit=5)
     return {
-        'client': top_client[0] if top_client else 'N/A',
-        'amount': float(top_client[1]) if top_client else 0.0
+        'client': top_clients[0].name if top_clients else 'N/A',
+        'amount': float(top_clients[0].amount) if top_clients else 0.0,
+        # Chart.js shape used by the "Top 5 Clients by Revenue" chart
+        'labels': [row.name for row in top_clients],
+        'data': [float(row.amount) for row in top_clients]
     }
 @app.route('/api/document_type_distribution')
 @login_required
+@etag_cached('invoice')
 def api_document_type_distribution():
-    data = db.session.query(
-        Invoice.document_type,
-        func.count(Invoice.id).label('count')
-    ).filter(
-        Invoice.document_type.in_(['invoice', 'proforma', 'delivery_note'])
-    ).group_by(Invoice.document_type).all()
+    kpis = invoice_kpis(Invoice.document_type.in_(DOCUMENT_TYPES))
+    document_types = kpis.document_types()
     return jsonify({
-        'labels': [row.document_type.title() for row in data],
-        'data': [row.count for row in data]
+        'labels': [document_type.title() for document_type in document_types],
+        'data': [kpis.count(document_type) for document_type in document_types]
     })
 
+@app.route('/api/cache_stats')
+@login_required
+@role_required(['admin'])
+def api_cache_stats():
+    # Hit/miss counters of this worker's memoized helpers (utils/memo.py)
+    return jsonify(cache_stats())
+
 # ========================
 # Export Routes
 # ========================
@@ -519,33 +490,36 @@ def api_document_type_distribution():
 @app.route('/dashboard/export')
 @login_required
 def export_bids():
-    bids = Bid.query.all()
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['Item Description', 'Our Price', 'Currency', 'Status', 'Bid Date'])
-    for bid in bids:
-        cw.writerow([bid.item_description, bid.our_bid_price, bid.currency, bid.status, bid.bid_date])
-    output = si.getvalue()
-    return Response(output, mimetype='text/csv', headers={"Content-Disposition": "attachment;filename=bids.csv"})
+    rows = stream_rows(
+        select(Bid.item_description, Bid.our_bid_price, Bid.currency, Bid.status, Bid.bid_date).order_by(Bid.id)
+    )
+    return csv_response('bids.csv', ['Item Description', 'Our Price', 'Currency', 'Status', 'Bid Date'], rows)
 
 
 @app.route('/dashboard/export_inventory')
 @login_required
 def export_inventory():
-    items = InventoryItem.query.all()
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(["SKU", "Product", "Quantity", "Incoming", "Reorder", "Category", "Location", "Status", "Supplier", "Last Updated"])
-    for item in items:
-        cw.writerow([
-            item.sku, item.product_name, item.quantity, item.incoming_quantity,
-            item.reorder_threshold, item.category, item.location,
-            item.status.value if hasattr(item.status, 'value') else item.status,
-            item.supplier.name if item.supplier else "",
-            item.last_updated.strftime("%Y-%m-%d %H:%M")
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv", headers={"Content-Disposition": "attachment;filename=inventory.csv"})
+    # Supplier name comes from the same query (outer join), not a lazy load per row
+    rows = stream_rows(
+        select(
+            InventoryItem.sku, InventoryItem.product_name, InventoryItem.quantity,
+            InventoryItem.incoming_quantity, InventoryItem.reorder_threshold, InventoryItem.category,
+            InventoryItem.location, InventoryItem.status, Supplier.name, InventoryItem.last_updated,
+        )
+        .outerjoin(InventoryItem.supplier)
+        .order_by(InventoryItem.id)
+    )
+    header = ["SKU", "Product", "Quantity", "Incoming", "Reorder", "Category", "Location", "Status", "Supplier", "Last Updated"]
+    return csv_response('inventory.csv', header, (
+        [
+            sku, product_name, quantity, incoming, reorder, category, location,
+            status.value if hasattr(status, 'value') else status,
+            supplier_name or "",
+            last_updated.strftime("%Y-%m-%d %H:%M") if last_updated else "",
+        ]
+        for sku, product_name, quantity, incoming, reorder, category, location, status, supplier_name, last_updated
+        in rows
+    ))
 
 
 # ========================
@@ -556,8 +530,8 @@ def export_inventory():
 @login_required
 def list_clients():
     delete_form = DeleteItemForm()
-    clients = Client.query.all()
-    return render_template('clients/list.html', clients=clients, delete_form=delete_form)
+    page = paginate_request(apply_search(Client.query, Client.name), {'name': Client.name}, 'name')
+    return render_template('clients/list.html', clients=page.items, page=page, delete_form=delete_form)
 
 
 @app.route('/clients/add', methods=['GET', 'POST'])
@@ -636,8 +610,8 @@ def delete_client(client_id):
 @login_required
 def list_suppliers():
     delete_form = DeleteItemForm()
-    suppliers = Supplier.query.all()
-    return render_template('suppliers/list.html', suppliers=suppliers, delete_form=delete_form)
+    page = paginate_request(apply_search(Supplier.query, Supplier.name), {'name': Supplier.name}, 'name')
+    return render_template('suppliers/list.html', suppliers=page.items, page=page, delete_form=delete_form)
 
 
 @app.route('/suppliers/add', methods=['GET', 'POST'])
@@ -657,6 +631,7 @@ def add_supplier():
                 return render_template('suppliers/add.html')
             supplier = Supplier(name=name, contact_person=contact_person, email=email, phone=phone, address=address)
             db.session.add(supplier)
+            bump_metric(SUPPLIER_COUNT)
             db.session.commit()
             flash(f"Supplier '{name}' added successfully.", "success")
             return redirect(url_for('list_suppliers'))
@@ -701,6 +676,7 @@ def delete_supplier(supplier_id):
     if form.validate_on_submit() and form.confirm.data == 'yes':
         try:
             db.session.delete(supplier)
+            bump_metric(SUPPLIER_COUNT, delta=-1)
             db.session.commit()
             flash(f"🗑️ Supplier '{supplier.name}' deleted successfully.", "success")
         except Exception as e:
@@ -719,9 +695,10 @@ def delete_supplier(supplier_id):
 @app.route('/procurement_items')
 @login_required
 def list_procurement_items():
-    items = ProcurementItem.query.all()
+    page = paginate_request(apply_search(ProcurementItem.query, ProcurementItem.name),
+                            {'name': ProcurementItem.name}, 'name')
     delete_form = DeleteItemForm()
-    return render_template('procurement/list.html', items=items, delete_form=delete_form)
+    return render_template('procurement/list.html', items=page.items, page=page, delete_form=delete_form)
 
 
 @app.route('/procurement_items/add', methods=['GET', 'POST'])
@@ -737,15 +714,18 @@ def add_procurement_item():
                 purchase_price=form.purchase_price.data,
                 shipping_mode=form.shipping_mode.data,
                 purchase_date=form.purchase_date.data or datetime.now(timezone.utc),
-                expected_arrival_date=form.expected_arrival_date.data,
                 status=form.status.data,
+                quantity=form.quantity.data or 1,
                 currency=form.currency.data,
                 shipping_cost=form.shipping_cost.data or 0.0
             )
             new_item.total_cost = new_item.calculate_total_cost()
             new_item.expected_arrival_date = new_item.calculate_expected_arrival()
             db.session.add(new_item)
+            bump_metric(PROCUREMENT_COUNT, new_item.status or 'Ordered')
+            sync_procurement_stock(new_item)
             db.session.commit()
+            invalidate('our_product_service')
             flash(f"✅ Procurement item '{new_item.name}' added successfully.", "success")
             return redirect(url_for('list_procurement_items'))
         except Exception as e:
@@ -763,10 +743,15 @@ def edit_procurement_item(item_id):
     form = ProcurementForm(obj=item)
     if form.validate_on_submit():
         try:
+            old_status = item.status
             form.populate_obj(item)
+            item.quantity = item.quantity or 1
             item.total_cost = item.calculate_total_cost()
             item.expected_arrival_date = item.calculate_expected_arrival()
+            record_status_change(PROCUREMENT_COUNT, old_status, item.status)
+            sync_procurement_stock(item)
             db.session.commit()
+            invalidate('our_product_service')
             flash(f"Procurement item '{item.name}' updated successfully.", "success")
             return redirect(url_for('list_procurement_items'))
         except Exception as e:
@@ -784,6 +769,7 @@ def delete_procurement_item(item_id):
     item = ProcurementItem.query.get_or_404(item_id)
     try:
         db.session.delete(item)
+        bump_metric(PROCUREMENT_COUNT, item.status, -1)
         db.session.commit()
         flash(f"🗑️ Procurement item '{item.name}' deleted successfully.", "success")
     except Exception as e:
@@ -814,10 +800,11 @@ def list_inventory():
         query = query.filter(OurProductService.name.ilike(f"%{q}%"))
 
     # Apply stock status filters
+    # Same definitions as the dashboard alerts, so its "and N more" links list exactly those items
     if status_filter == 'low_stock':
-        query = query.filter(OurProductService.quantity_on_hand <= OurProductService.reorder_point)
+        query = query.filter(LOW_STOCK)
     elif status_filter == 'out_of_stock':
-        query = query.filter(OurProductService.quantity_on_hand == 0)
+        query = query.filter(OUT_OF_STOCK)
     # Note: 'in_stock' can be added if needed
 
     # Apply category filter
@@ -825,21 +812,11 @@ def list_inventory():
         query = query.filter(OurProductService.category == category)
 
     # Paginate results
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-    try:
-        items = query.paginate(page=page, per_page=per_page, error_out=False)
-    except Exception as e:
-        # Fallback in case paginate fails (e.g. during debugging)
-        import logging
-        logging.error("Pagination failed:", exc_info=True)
-        items = []
+    page = paginate_request(query, {'name': OurProductService.name}, 'name')
 
     # Get unique categories for dropdown
     try:
-        categories_query = db.session.query(OurProductService.category).distinct().all()
-        categories = [c[0] for c in categories_query if c[0]]
-        categories.sort()
+        categories = [c for c in get_product_categories() if c]
     except Exception:
         categories = []
 
@@ -848,7 +825,8 @@ def list_inventory():
 
     return render_template(
         'inventory/list.html',
-        items=items,
+        items=page.items,
+        page=page,
         categories=categories,
         delete_form=delete_form
     )
@@ -870,9 +848,9 @@ def add_inventory_item():
                 currency=form.currency.data.upper().strip(),
                 quantity_on_hand=form.quantity_on_hand.data or 0,
                 reorder_point=form.reorder_point.data or 0,
-                unit_cost=float(form.unit_cost.data) if form.unit_cost.data else 0.0,
-                standard_price=float(form.standard_price.data) if form.standard_price.data else 0.0,
-                cogs=float(form.cogs.data) if form.cogs.data else 0.0,
+                unit_cost=form.unit_cost.data or 0,
+                standard_price=form.standard_price.data or 0,
+                cogs=form.cogs.data or 0,
                 is_active=form.is_active.data,
                 status=form.status.data,
                 # supplier=form.supplier.data
@@ -884,6 +862,7 @@ def add_inventory_item():
             print("➕ Added to session")  # Debug step 3
             print("📤 Raw POST data:", dict(request.form))
             db.session.commit()  # ← This saves to DB
+            invalidate('our_product_service')
             print("💾 COMMITTED to database!")  # Success!
 
             flash(f"✅ '{new_item.name}' added successfully.", "success")
@@ -913,6 +892,7 @@ def edit_inventory_item(item_id):
         try:
             form.populate_obj(item)
             db.session.commit()
+            invalidate('our_product_service')
             flash(f"Inventory item '{item.name}' updated successfully.", "success")
             return redirect(url_for('list_inventory'))
         except Exception as e:
@@ -928,9 +908,14 @@ def edit_inventory_item(item_id):
 def delete_inventory_item(item_id):
     delete_form = DeleteItemForm()
     item = OurProductService.query.get_or_404(item_id)
+    if has_stock_movements(item.id):
+        flash(f"Inventory item '{item.name}' has stock history and cannot be deleted; mark it inactive instead.",
+              "error")
+        return redirect(url_for('list_inventory', delete_form=delete_form))
     try:
         db.session.delete(item)
         db.session.commit()
+        invalidate('our_product_service')
         flash(f"Inventory item '{item.name}' deleted successfully.", "success")
     except Exception as e:
         db.session.rollback()
@@ -947,8 +932,20 @@ def delete_inventory_item(item_id):
 @login_required
 def list_bids():
     delete_form = DeleteItemForm()
-    bids = Bid.query.all()
-    return render_template('bids/list.html', bids=bids, delete_form=delete_form)
+    query = apply_search(Bid.query, Bid.item_description)
+    status = request.args.get('status')
+    currency = request.args.get('currency')
+    if status:
+        query = query.filter(Bid.status == status)
+    if currency:
+        query = query.filter(Bid.currency == currency)
+    page = paginate_request(query, {
+        'newest': Bid.id,
+        'item_description': Bid.item_description,
+        'our_bid_price': Bid.our_bid_price,
+        'status': Bid.status,
+    }, 'newest', default_direction='desc')
+    return render_template('bids/list.html', bids=page.items, page=page, delete_form=delete_form)
 
 
 @app.route('/bids/add', methods=['GET', 'POST'])
@@ -966,6 +963,7 @@ def add_bid():
                 status=form.status.data
             )
             db.session.add(new_bid)
+            bump_metric(BID_COUNT, new_bid.status or 'Pending')
             db.session.commit()
             flash(f"✅ Bid '{new_bid.item_description}' added successfully.", "success")
             return redirect(url_for('list_bids'))
@@ -984,7 +982,9 @@ def edit_bid(bid_id):
     form = BidForm(obj=bid)
     if form.validate_on_submit():
         try:
+            old_status = bid.status
             form.populate_obj(bid)
+            record_status_change(BID_COUNT, old_status, bid.status)
             db.session.commit()
             flash(f"Bid '{bid.item_description}' updated successfully.", "success")
             return redirect(url_for('list_bids'))
@@ -1003,7 +1003,9 @@ def delete_bid(bid_id):
     bid = Bid.query.get_or_404(bid_id)
     try:
         db.session.delete(bid)
+        bump_metric(BID_COUNT, bid.status, -1)
         db.session.commit()
+        invalidate('competitor_bid')
         flash(f"Bid '{bid.item_description}' deleted successfully.", "success")
     except Exception as e:
         db.session.rollback()
@@ -1019,9 +1021,25 @@ def delete_bid(bid_id):
 @app.route('/competitors')
 @login_required
 def list_competitors():
-    competitors = Competitor.query.all()
+    query = apply_search(Competitor.query, Competitor.name)
+    location = request.args.get('location', '').strip()
+    if location:
+        query = query.filter(Competitor.location.ilike(f"%{location}%"))
+    page = paginate_request(query, {'name': Competitor.name}, 'name')
+
+    # Bid counts for the visible page only, plus the overall figures for the summary cards
+    bid_counts = dict(
+        db.session.query(Bid.competitor_id, func.count(Bid.id))
+        .filter(Bid.competitor_id.in_([c.id for c in page.items]))
+        .group_by(Bid.competitor_id).all()
+    ) if page.items else {}
+    total_count = Competitor.query.count()
+    linked_bids = Bid.query.filter(Bid.competitor_id.isnot(None)).count()
+    avg_bids = round(linked_bids / total_count, 1) if total_count else 0
+
     delete_form = DeleteItemForm()
-    return render_template('competitors/list.html', competitors=competitors, delete_form=delete_form)
+    return render_template('competitors/list.html', competitors=page.items, page=page, bid_counts=bid_counts,
+                           total_count=total_count, avg_bids=avg_bids, delete_form=delete_form)
 
 
 @app.route('/competitors/add', methods=['GET', 'POST'])
@@ -1095,12 +1113,10 @@ def generate_document():
         print(f"Fields: {dir(item_form)}")
         print(f"Description field type: {type(item_form.description)}")
 
-    # Load clients
-    clients = Client.query.order_by(Client.name).all()
-    form.client.choices = [(c.id, c.name) for c in clients] or [(-1, "No clients available")]
-
+    # Only the selected client is rendered; the field searches /api/typeahead/clients
     client = None
     client_id = request.args.get('client_id') or form.client.data
+    form.client.choices = selected_choice(Client, client_id) or [(-1, "Search for a client")]
     if client_id and client_id != -1:
         try:
             client = db.session.get(Client, int(client_id))
@@ -1125,7 +1141,7 @@ def generate_document():
 
             try:
                 if form.client.data == -1:
-                    flash("No clients available. Please add a client first.", "error")
+                    flash("Please select a client.", "error")
                     return redirect(url_for('generate_document', type=document_type))
 
                 client = db.session.get(Client, form.client.data)
@@ -1148,8 +1164,8 @@ def generate_document():
                 else:
                     vat_rate_val = Decimal('0.00')
 
-                subtotal = Decimal('0.00')
                 items_data = []
+                unit_prices = []
 
                 for item_form in form.items:
                     description = (item_form.form.description.data or "").strip()
@@ -1163,35 +1179,28 @@ def generate_document():
                         flash("Quantity must be greater than 0.", "error")
                         return redirect(url_for('generate_document', type=document_type))
 
-                    qty = int(raw_qty)
-
                     if document_type in ['invoice', 'proforma']:
                         price_val = safe_decimal(item_form.form.unit_price.data)
                         if price_val < 0:
                             flash("Unit price must be zero or positive.", "error")
                             return redirect(url_for('generate_document', type=document_type))
-                        total = qty * price_val
-                        subtotal += total  # ✅ Now both are Decimal
-
-                        items_data.append({
-                        'description': description,
-                        'quantity': qty,
-                        'unit_price': float(price_val),
-                        'total_price': float(total),
-                        'comment': comment
-                        })
-                    else:
-                        items_data.append({
-                        'description': description,
-                        'quantity': qty,
-                        'unit_price': None,
-                        'total_price': None,
-                        'comment': comment
-                        })
-                # Calculate totals only for invoices/proformas
-                if document_type != 'delivery_note':
-                    vat_amount = (subtotal * (vat_rate_val / Decimal('100'))).quantize(Decimal('0.00'))
-                    total_amount = (subtotal + vat_amount).quantize(Decimal('0.00'))
+                        unit_prices.append(price_val)
+
+                    items_data.append({
+                    'description': description,
+                    'quantity': int(raw_qty),
+                    'unit_price': None,
+                    'total_price': None,
+                    'comment': comment
+                    })
+
+                # Line totals, VAT and the grand total in one pass (utils/pricing.py)
+                if document_type in ['invoice', 'proforma']:
+                    from utils.pricing import price_lines  # numpy: loaded on first use, not at startup
+                    priced = price_lines([item['quantity'] for item in items_data], unit_prices, vat_rate_val)
+                    for item, (_, unit_price, total_price) in zip(items_data, priced.lines()):
+                        item['unit_price'], item['total_price'] = unit_price, total_price
+                    subtotal, vat_amount, total_amount = priced.subtotal, priced.vat_amount, priced.total_amount
                 else:
                     vat_amount = Decimal('0.00')
                     total_amount = Decimal('0.00')
@@ -1210,9 +1219,9 @@ def generate_document():
                     client_id=client.id,
                     issue_date=issue_date,
                     due_date=due_date,
-                    subtotal=float(subtotal),
-                    total_amount=float(total_amount),
-                    vat_amount=float(vat_amount),
+                    subtotal=subtotal,
+                    total_amount=total_amount,
+                    vat_amount=vat_amount,
                     vat_rate=float(vat_rate_val),
                     status='Pending',
                     signing_person_name=signing_person_name,
@@ -1226,6 +1235,8 @@ def generate_document():
                 for item in items_data:
                     invoice_item = InvoiceItem(invoice_id=invoice.id, created_by=current_user.id,**item)
                     db.session.add(invoice_item)
+                record_invoice_change(invoice)
+                sync_document_stock(invoice)
 
                 # db.session.commit()
                 flash(f"{document_type.title()} generated successfully.", "success")
@@ -1239,21 +1250,18 @@ def generate_document():
                     'issue_date': issue_date.isoformat(),
                     'due_date': due_date.isoformat() if due_date else 'N/A',
                     'items': items_data,
-                    'subtotal': float(subtotal),
+                    'subtotal': subtotal,
                     'vat_rate': float(vat_rate_val) if document_type != 'delivery_note' else 0.0,
                     'signing_person_name': signing_person_name,
                     'signing_person_function': signing_person_function,
                     'doc_number': invoice_number  # 👈 This goes to PDF
                 }
 
-                # ✅ Generate PDF with updated number
-                pdf_buffer = generate_invoice_pdf(form_data, document_type=document_type,
-                                                    save_to_disk=True  )
-                
-                print(f"📄 Generated PDF path: '{pdf_buffer}' (type: {type(pdf_buffer)})")
-                print(f"💾 Storing in DB: invoice.pdf_file = '{pdf_buffer}'")
-                invoice.pdf_file = pdf_buffer
+                # ✅ Queue the PDF; it renders in the background (utils/render_queue.py)
+                job = queue_render(invoice, form_data, document_type)
                 db.session.commit()
+                invalidate('our_product_service')
+                dispatch_render(job.id)
                 return redirect(url_for('view_document', invoice_id=invoice.id))
                 
             except Exception as e:
@@ -1283,9 +1291,8 @@ def edit_document(invoice_id):
     if not original:
         abort(404)
 
-    clients = Client.query.order_by(Client.name).all()
     form = GenerateDocumentForm()
-    form.client.choices = [(c.id, c.name) for c in clients]
+    form.client.choices = selected_choice(Client, form.client.data if request.method == 'POST' else original.client_id)
 
     # --- GET: Pre-fill form with current invoice data ---
     if request.method == 'GET':
@@ -1305,7 +1312,7 @@ def edit_document(invoice_id):
             entry = form.items.append_entry()
             entry.form.description.data = item.description
             entry.form.quantity.data = float(item.quantity)
-            entry.form.unit_price.data = float(item.unit_price) if item.unit_price else None
+            entry.form.unit_price.data = item.unit_price
             entry.form.comment.data = item.comment
 
         print(f"📄 GET: Loaded {len(original.items)} items from invoice {original.invoice_number}")
@@ -1343,7 +1350,7 @@ def edit_document(invoice_id):
 
     print(f"📊 Found {max_index + 1} item rows (indices 0 to {max_index})")
 
-    subtotal = Decimal('0.00')
+    unit_prices = []
 
     for i in range(max_index + 1):
         desc_key = f"items-{i}-form-description"
@@ -1379,25 +1386,22 @@ def edit_document(invoice_id):
             price_val = Decimal('0.00')
 
         quantity = int(qty_val)
-        total_price = qty_val * price_val
-        subtotal += total_price
+        unit_prices.append(price_val)
 
         submitted_items.append({
             'description': description,
             'quantity': quantity,
-            'unit_price': float(price_val),
-            'total_price': float(total_price),
+            'unit_price': None,
+            'total_price': None,
             'comment': comment
         })
 
-        print(f"✅ Parsed Item {i}: '{description}' x{quantity} @ ${price_val:.2f} → Total: ${total_price:.2f}")
+        print(f"✅ Parsed Item {i}: '{description}' x{quantity} @ ${price_val:.2f}")
 
     if len(submitted_items) == 0:
         flash("At least one valid item is required.", "error")
         return redirect(url_for('edit_document', invoice_id=invoice_id))
 
-    print(f"✅ Final Subtotal: ${subtotal:.2f}")
-
     # Get client
     try:
         client_id = int(form.client.data)
@@ -1410,25 +1414,13 @@ def edit_document(invoice_id):
         flash("Invalid client selected.", "error")
         return redirect(url_for('edit_document', invoice_id=invoice_id))
 
-    # Determine next version number
-    latest_version = db.session.scalar(
-        select(Invoice)
-        .where(
-            ((Invoice.parent_id == original.parent_id) | (Invoice.id == original.parent_id)),
-            Invoice.document_type == original.document_type
-        )
-        .order_by(Invoice.version.desc())
-    )
-    next_version = (latest_version.version if latest_version else 0) + 1
-
-    # Generate document number
+    # Generate document number (the -v<version> suffix is added by save_new_version)
     new_base_number = generate_doc_number(original.document_type, submitted_items)
-    new_invoice_number = f"{new_base_number}-v{next_version}"
+    root_id = chain_root_id(original)
 
     # Create new invoice
     new_invoice = Invoice(
         document_type=original.document_type,
-        invoice_number=new_invoice_number,
         po_number=form.po_number.data.strip() if form.po_number.data else None,
         client_id=client.id,
         issue_date=form.issue_date.data,
@@ -1436,24 +1428,26 @@ def edit_document(invoice_id):
         signing_person_name=form.signing_person_name.data.strip(),
         signing_person_function=form.signing_person_function.data.strip(),
         created_by=current_user.id,
-        version=next_version,
-        parent_id=original.parent_id or original.id
+        parent_id=root_id
     )
 
     # Set financial fields
     if new_invoice.document_type != 'delivery_note':
         vat_rate_val = safe_decimal(form.vat_rate.data or 0)
-        vat_amount = (subtotal * (vat_rate_val / 100)).quantize(Decimal('0.00'))
-        total_amount = (subtotal + vat_amount).quantize(Decimal('0.00'))
-
-        new_invoice.subtotal = float(subtotal)
-        new_invoice.vat_amount = float(vat_amount)
-        new_invoice.total_amount = float(total_amount)
+        from utils.pricing import price_lines
+        priced = price_lines([item['quantity'] for item in submitted_items], unit_prices, vat_rate_val)
+        for item, (_, unit_price, total_price) in zip(submitted_items, priced.lines()):
+            item['unit_price'], item['total_price'] = unit_price, total_price
+        print(f"✅ Final Subtotal: ${priced.subtotal:.2f}")
+
+        new_invoice.subtotal = priced.subtotal
+        new_invoice.vat_amount = priced.vat_amount
+        new_invoice.total_amount = priced.total_amount
         new_invoice.vat_rate = float(vat_rate_val)
     else:
-        new_invoice.subtotal = 0.0
-        new_invoice.vat_amount = 0.0
-        new_invoice.total_amount = 0.0
+        new_invoice.subtotal = Decimal('0.00')
+        new_invoice.vat_amount = Decimal('0.00')
+        new_invoice.total_amount = Decimal('0.00')
         new_invoice.vat_rate = 0.0
 
     # Add items
@@ -1469,60 +1463,30 @@ def edit_document(invoice_id):
         )
         new_invoice.items.append(invoice_item)
 
-    db.session.add(new_invoice)
+    # Next free version of the chain; a concurrent edit that took it first makes this retry
+    save_new_version(new_invoice, root_id, new_base_number)
+    record_invoice_change(new_invoice)
+    sync_document_stock(new_invoice)
     db.session.commit()
+    invalidate('our_product_service')
 
     print(f"\n🎉 New invoice {new_invoice.id} saved:")
     print(f"   Number: {new_invoice.invoice_number}")
     print(f"   Items: {[(i.description, i.quantity, i.unit_price) for i in new_invoice.items]}")
     print(f"   Subtotal: {new_invoice.subtotal}, Total: {new_invoice.total_amount}")
 
-    # ✅ Generate PDF with updated data
+    # ✅ Queue the PDF with updated data; it renders in the background
     try:
-        pdf_context = {
-            'document_type': new_invoice.document_type,
-            'doc_number': new_invoice.invoice_number,
-            'po_number': new_invoice.po_number,
-            'client_name': client.name,
-            'client_address': client.address,
-            'issue_date': new_invoice.issue_date.strftime('%Y-%m-%d') if new_invoice.issue_date else 'N/A',
-            'due_date': new_invoice.due_date.strftime('%Y-%m-%d') if new_invoice.due_date else 'N/A',
-            'signing_person_name': new_invoice.signing_person_name,
-            'signing_person_function': new_invoice.signing_person_function,
-            'vat_rate': float(new_invoice.vat_rate),
-            'subtotal': float(new_invoice.subtotal),
-            'total_amount': float(new_invoice.total_amount),
-            'items': [
-                {
-                    'description': i.description,
-                    'quantity': i.quantity,
-                    'unit_price': float(i.unit_price),
-                    'total_price': float(i.total_price),
-                    'comment': i.comment
-                }
-                for i in new_invoice.items
-            ]
-        }
+        pdf_context = document_form_data(new_invoice)
 
-        print("\n📊 FINAL ITEMS BEING SENT TO PDF GENERATOR:")
-        for i, item in enumerate(pdf_context['items']):
-            print(f"  {i+1}. '{item['description']}' x{item['quantity']} @ ${item['unit_price']:.2f}")
-
-        # Call your PDF generator
-        pdf_filename = generate_invoice_pdf(pdf_context,
-                                            document_type=new_invoice.document_type,
-                                            save_to_disk=True )  # Should return "generated_pdfs/filename.pdf"
-        new_invoice.pdf_file = pdf_filename
+        job = queue_render(new_invoice, pdf_context, new_invoice.document_type)
         db.session.commit()
-
-        print(f"🖨️ PDF generated and saved: {pdf_filename}")
-        print(f"📄 Generated PDF path: '{pdf_filename}' (type: {type(pdf_filename)})")
-        print(f"💾 Storing in DB: invoice.pdf_file = '{pdf_filename}'")
+        dispatch_render(job.id)
     except Exception as e:
         db.session.rollback()
         import traceback
         traceback.print_exc()
-        print(f"⚠️ Failed to generate PDF: {e}")
+        print(f"⚠️ Failed to queue PDF: {e}")
         flash("Invoice was saved, but could not generate PDF.", "warning")
 
     flash(f"New version created: {new_invoice.invoice_number}", "success")
@@ -1546,8 +1510,12 @@ def update_document_status(invoice_id):
     if new_status not in valid_statuses:
         flash("Invalid status.", "error")
     else:
+        before = invoice_snapshot(invoice)
         invoice.status = new_status
+        record_invoice_change(invoice, before)
+        sync_document_stock(invoice)
         db.session.commit()
+        invalidate('our_product_service')
         flash("Document status updated.", "success")
 
     return redirect(url_for('view_document', invoice_id=invoice_id, form=form))
@@ -1564,13 +1532,30 @@ def view_document(invoice_id):
         flash("You don't have permission to view this document.", "error")
         return redirect(url_for('dashboard'))
 
-    company_settings = get_or_create_company_settings()
+    company_settings = cached_company_settings()
     return render_template('view_document.html', invoice=invoice, company_settings=company_settings)
 
 @app.route('/download_document/<int:invoice_id>')
 @login_required
 def download_document(invoice_id):
     invoice = db.session.get(Invoice, invoice_id)
+    if invoice and invoice.pdf_status in RENDER_IN_PROGRESS:
+        # Wait (bounded) for the background render; ?wait=0 returns 202 at once for polling clients
+        dispatch_render_for_invoice(invoice_id)
+        timeout = current_app.config.get('PDF_RENDER_WAIT_SECONDS', 10)
+        wait = request.args.get('wait', type=float)
+        status = wait_for_render(invoice_id, timeout if wait is None else min(wait, timeout))
+        if status in RENDER_IN_PROGRESS:
+            if wait is not None or request.accept_mimetypes.best == 'application/json':
+                return jsonify(status=status, status_url=url_for('document_pdf_status', invoice_id=invoice_id)), 202
+            flash("The PDF is still being generated. Please try again in a moment.", "info")
+            return redirect(url_for('view_document', invoice_id=invoice_id))
+        invoice = db.session.get(Invoice, invoice_id)
+
+    if invoice and invoice.pdf_status == RENDER_FAILED:
+        flash("PDF generation failed for this document. Edit and save it to try again.", "error")
+        return redirect(url_for('view_document', invoice_id=invoice_id))
+
     if not invoice or not invoice.pdf_file:
         print(f"❌ Invoice {invoice_id} not found or no pdf_file")
         abort(404)
@@ -1612,16 +1597,77 @@ def download_document(invoice_id):
         flash("An error occurred while downloading the file.", "error")
         return redirect(url_for('view_document', invoice_id=invoice_id))
     
+@app.route('/documents/<int:invoice_id>/pdf_status')
+@login_required
+def document_pdf_status(invoice_id):
+    invoice = db.session.get(Invoice, invoice_id)
+    if not invoice:
+        abort(404)
+    status = invoice.pdf_status or ('ready' if invoice.pdf_file else None)
+    return jsonify(
+        status=status,
+        download_url=url_for('download_document', invoice_id=invoice_id) if status == 'ready' else None,
+    )
+
+
+@app.route('/documents/export')
+@login_required
+@role_required(['accountant', 'admin'])
+def export_documents():
+    """
+    Stream a ZIP of the filtered documents' PDFs that are already on disk.
+    Missing ones are queued for a background render and listed in the
+    archive's README.txt (and the X-Documents-Pending header) instead.
+    """
+    def parse_date(name):
+        value = request.args.get(name)
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+        except ValueError:
+            abort(400, f"{name} must be YYYY-MM-DD")
+
+    query = export_query(
+        date_from=parse_date('date_from'),
+        date_to=parse_date('date_to'),
+        client_id=request.args.get('client_id', type=int),
+        status=request.args.get('status') or None,
+        document_type=request.args.get('type') or None,
+        # Same rule as view_document: only admins see other users' documents
+        created_by=None if current_user.role == 'admin' else current_user.id,
+    )
+    invoices = db.session.scalars(query).all()
+    if not invoices:
+        flash("No documents match that filter.", "info")
+        return redirect(request.referrer or url_for('dashboard'))
+
+    pending = queue_missing(invoices)
+    entries = export_entries(invoices)
+    if not entries:
+        flash("Those documents are still being rendered. Try the export again shortly.", "info")
+        return redirect(request.referrer or url_for('dashboard'))
+
+    notes = None
+    if pending:
+        notes = "Still rendering, not included in this export:\n" + "".join(
+            f"{invoice.invoice_number}\n" for invoice in pending)
+    filename = f"documents-{datetime.now().strftime('%Y%m%d-%H%M%S')}.zip"
+    return Response(
+        iter_zip(entries, notes=notes),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Documents-Pending': str(len(pending)),
+        },
+    )
+
+
 @app.route("/search_documents")
+@login_required
 def search_documents():
     query = request.args.get("q", "").strip()
-    results = []
-    if query:
-        results = db.session.scalars(
-            db.select(Invoice).where(Invoice.invoice_number.contains(query))
-        ).all()
-    return render_template("search_results.html", results=results, query=query)
-
+    page = request.args.get("page", 1, type=int)
+    results = search_invoices(query, page=page, per_page=20)
+    return render_template("documents/search_results.html", results=results, query=query)
 
 
 @app.route("/preview_document", methods=["POST"])
@@ -1666,12 +1712,12 @@ def preview_document():
 
         item_data = {
             "description": desc,
-            "quantity": float(qty),
+            "quantity": int(qty),
             "comment": comment,
         }
         if document_type != "delivery_note":
-            item_data["unit_price"] = float(safe_decimal(item.form.unit_price.data))
-            item_data["total"] = float(qty * safe_decimal(item.form.unit_price.data))
+            # Totals are priced by the renderer (utils/pricing.py), same as saved documents
+            item_data["unit_price"] = safe_decimal(item.form.unit_price.data)
         items_list.append(item_data)
 
     form_data = {
@@ -1689,6 +1735,7 @@ def preview_document():
     }
 
     try:
+        from utils.pdf_generator import generate_invoice_pdf  # ReportLab: loaded on first render
         pdf_bytes = generate_invoice_pdf(form_data, preview=True, save_to_disk=False)
         return Response(
             pdf_bytes,
@@ -1764,7 +1811,8 @@ def test_pdf():
             {'description': 'Widget', 'quantity': 2, 'unit_price': 50.0}
         ]
     }
-    pdf_bytes = generate_invoice_pdf(form_data, preview=True, document_type='invoice')
+    from utils.pdf_generator import generate_invoice_pdf
+    pdf_bytes = generate_invoice_pdf(form_data, preview=True, document_type='invoice', save_to_disk=False)
     return Response(
         pdf_bytes,
         mimetype='application/pdf',
@@ -1869,6 +1917,7 @@ def upload_company_stamp():
 
                     print(f"📄 Saving signature to: {filepath}")
                     file.save(filepath)
+                    asset_cache.invalidate(filepath)
 
                     if os.path.exists(filepath):
                         print(f"✅ SUCCESS: Signature saved!")
@@ -1886,6 +1935,7 @@ def upload_company_stamp():
 
                     print(f"📄 Saving stamp to: {filepath}")
                     file.save(filepath)
+                    asset_cache.invalidate(filepath)
 
                     if os.path.exists(filepath):
                         print(f"✅ SUCCESS: Stamp saved!")
@@ -1955,6 +2005,7 @@ def upload_company_logo():
 
                     print(f"📄 Saving logo to: {filepath}")
                     file.save(filepath)
+                    asset_cache.invalidate(filepath)
 
                     if os.path.exists(filepath):
                         print(f"✅ SUCCESS: File saved!")
@@ -1981,7 +2032,7 @@ def upload_company_logo():
 
 @app.route('/company_logo')
 def company_logo():
-    settings = get_or_create_company_settings()
+    settings = cached_company_settings()
     if settings and settings.logo_image_path and os.path.exists(settings.logo_image_path):
         directory = os.path.dirname(settings.logo_image_path)
         filename = os.path.basename(settings.logo_image_path)
@@ -1991,7 +2042,7 @@ def company_logo():
 
 @app.route('/company_signature')
 def company_signature():
-    settings = get_or_create_company_settings()
+    settings = cached_company_settings()
     if settings and settings.signature_image_path and os.path.exists(settings.signature_image_path):
         directory = os.path.dirname(settings.signature_image_path)
         filename = os.path.basename(settings.signature_image_path)
@@ -2001,7 +2052,7 @@ def company_signature():
 
 @app.route('/company_stamp')
 def company_stamp():
-    settings = get_or_create_company_settings()
+    settings = cached_company_settings()
     if settings and settings.stamp_image_path and os.path.exists(settings.stamp_image_path):
         directory = os.path.dirname(settings.stamp_image_path)
         filename = os.path.basename(settings.stamp_image_path)
@@ -2012,9 +2063,10 @@ def company_stamp():
 @app.route('/local_market')
 @login_required
 def list_local_market():
-    items = LocalMarketItem.query.order_by(LocalMarketItem.name).all()
+    page = paginate_request(apply_search(LocalMarketItem.query, LocalMarketItem.name),
+                            {'name': LocalMarketItem.name}, 'name')
     delete_form = DeleteItemForm()
-    return render_template('local_market/list.html', items=items, delete_form=delete_form)
+    return render_template('local_market/list.html', items=page.items, page=page, delete_form=delete_form)
 
 
 @app.route('/local_market/add', methods=['GET', 'POST'])
@@ -2082,9 +2134,11 @@ def delete_local_market_item(item_id):
 @login_required
 def list_products_services():
     try:
-        products = OurProductService.query.all()
+        page = paginate_request(apply_search(OurProductService.query, OurProductService.name),
+                                {'name': OurProductService.name}, 'name')
         delete_form = DeleteItemForm()
-        return render_template('products_services/list.html', products=products, delete_form=delete_form)
+        return render_template('products_services/list.html', products=page.items, page=page,
+                               delete_form=delete_form)
     except Exception as e:
         print(f"❌ Error fetching products/services: {e}")
         flash("An error occurred while loading products/services.", "error")
@@ -2112,6 +2166,7 @@ def add_product_service():
             )
             db.session.add(new_product)
             db.session.commit()
+            invalidate('our_product_service')
             flash(f"✅ Product/Service '{new_product.name}' added successfully.", "success")
             return redirect(url_for('list_products_services'))
         except Exception as e:
@@ -2134,6 +2189,7 @@ def edit_product_service(product_id):
                 flash("Product/Service name is required.", "error")
                 return render_template('products_services/edit.html', product=product, form=form), 400
             db.session.commit()
+            invalidate('our_product_service')
             flash(f"✅ Product/Service '{product.name}' updated successfully.", "success")
             return redirect(url_for('list_products_services'))
         except ValueError as ve:
@@ -2156,9 +2212,14 @@ def delete_product_service(product_id):
     Only accessible to admin users.
     """
     product = OurProductService.query.get_or_404(product_id)
+    if has_stock_movements(product.id):
+        flash(f"❌ Product/Service '{product.name}' has stock history and cannot be deleted; "
+              "mark it inactive instead.", "error")
+        return redirect(url_for('list_products_services'))
     try:
         db.session.delete(product)
         db.session.commit()
+        invalidate('our_product_service')
         flash(f"🗑️ Product/Service '{product.name}' deleted successfully.", "success")
     except Exception as e:
         db.session.rollback()
@@ -2171,51 +2232,13 @@ def delete_product_service(product_id):
 # Routes: Business Analysis
 # ========================
 
-@app.route('/profitability_analysis')
-@login_required
-def profitability_analysis():
-    total_revenue = db.session.query(func.sum(Invoice.total_amount)) \
-        .filter_by(status='Paid', document_type='invoice').scalar() or 0.0
-    total_cogs = db.session.query(func.sum(OurProductService.cogs)).scalar() or 0.0
-    gross_profit = total_revenue - total_cogs
-    profit_margin = (gross_profit / total_revenue * 100) if total_revenue > 0 else 0.0
-
-    return render_template('analysis/profitability.html',
-                           total_revenue=total_revenue,
-                           total_cogs=total_cogs,
-                           gross_profit=gross_profit,
-                           profit_margin=round(profit_margin, 2))
-
-
-@app.route('/procurement_spending_analysis')
-@login_required
-def procurement_spending_analysis():
-    one_year_ago = datetime.now(timezone.utc) - timedelta(days=365)
-    total_spent = db.session.query(func.sum(ProcurementItem.total_cost)) \
-        .filter(ProcurementItem.purchase_date >= one_year_ago).scalar() or 0.0
-    return render_template('analysis/procurement.html', total_spent=total_spent)
-
-
-@app.route('/business_prediction')
-@login_required
-def business_prediction():
-    # Example: Use last 10 invoices for mock prediction
-    recent_invoices = Invoice.query.filter_by(document_type='invoice') \
-        .order_by(Invoice.date_created.desc()).limit(10).all()
-    predicted_revenue = sum(inv.total_amount for inv in recent_invoices) * 1.1  # +10% growth
-    return render_template('analysis/prediction.html',
-                           recent_invoices=recent_invoices,
-                           predicted_revenue=predicted_revenue)
-
-
-@app.route('/business_outlook')
-@login_required
-def business_outlook():
-    upcoming_invoices = Invoice.query.filter(
-        Invoice.status == 'Pending',
-        Invoice.document_type == 'invoice'
-    ).order_by(Invoice.due_date.asc()).limit(5).all()
-    return render_template('analysis/business_outlook.html', upcoming_invoices=upcoming_invoices)
+# views/analysis.py is imported on the first request to one of these (utils/lazy_views.py)
+add_lazy_routes(app, 'views.analysis', [
+    ('/profitability_analysis', 'profitability_analysis', {}),
+    ('/procurement_spending_analysis', 'procurement_spending_analysis', {}),
+    ('/business_prediction', 'business_prediction', {}),
+    ('/business_outlook', 'business_outlook', {}),
+])
 
 # ========================
 # Run the App
@@ -2224,13 +2247,17 @@ def business_outlook():
 
 if __name__ == '__main__':
     with app.app_context():
-        # ✅ Step 1: Create all tables first
-        db.create_all()
+        # ✅ Step 1: Create all tables first, then any columns/indexes added since
+        upgrade_schema()
         print("✅ Tables created")
 
         # ✅ Step 2: Now safe to query
         get_or_create_company_settings()
         print("✅ Company settings created or loaded")
+
+        # ✅ Step 3: Pick up PDF renders left unfinished by the last run
+        print(f"✅ Resumed {resume_pending_jobs()} pending PDF renders")
+
         from models_core import create_default_admin
         create_default_admin()
         ensure_directories()
@@ -0,0 +1,102 @@
+# benchmarks/bench_columnar_export.py
+"""
+Compare the typed columnar analytics export (utils.columnar_export) with the
+streaming CSV path (utils.csv_export) on the same invoice and line-item rows:
+rows per second and bytes on disk.
+
+    python benchmarks/bench_columnar_export.py --invoices 20000 --items 5
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--invoices', type=int, default=20000)
+parser.add_argument('--items', type=int, default=5, help="line items per invoice")
+args = parser.parse_args()
+
+from sqlalchemy import insert, select
+
+from models_core import create_app, db
+from models_core.models import Client, Invoice, InvoiceItem, User
+from utils.columnar_export import export_columnar
+from utils.csv_export import iter_csv, stream_rows
+
+
+def seed(invoices, items):
+    rng = random.Random(7)
+    user, client = User(username='bench', password='x', role='admin'), Client(name='ACME')
+    db.session.add_all([user, client])
+    db.session.flush()
+    start = datetime(2024, 1, 1)
+    db.session.execute(insert(Invoice), [
+        {'document_type': 'invoice', 'invoice_number': f"INV-{n:06d}", 'client_id': client.id,
+         'created_by': user.id, 'issue_date': date(2024, 1, 1) + timedelta(days=n % 365),
+         'subtotal': round(rng.uniform(10, 5000), 2), 'total_amount': round(rng.uniform(10, 5800), 2),
+         'vat_rate': 16.0, 'status': rng.choice(['Pending', 'Paid', 'Overdue']),
+         'created_at': start + timedelta(minutes=n), 'updated_at': start + timedelta(minutes=n)}
+        for n in range(invoices)
+    ])
+    db.session.execute(insert(InvoiceItem), [
+        {'invoice_id': n // items + 1, 'description': f"Item {n % 97}", 'quantity': 1 + n % 9,
+         'unit_price': round(rng.uniform(1, 500), 2), 'total_price': round(rng.uniform(1, 4500), 2),
+         'created_by': user.id}
+        for n in range(invoices * items)
+    ])
+    db.session.commit()
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def csv_export(out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    rows = 0
+    for model in (Invoice, InvoiceItem):
+        columns = list(model.__table__.columns)
+        with open(os.path.join(out_dir, f"{model.__table__.name}.csv"), 'w', newline='') as f:
+            for chunk in iter_csv([c.name for c in columns], stream_rows(select(*columns).order_by(model.id))):
+                f.write(chunk)
+                rows += chunk.count('\r\n')
+        rows -= 1  # header
+    return rows
+
+
+def measure(label, export, out_dir):
+    start = time.perf_counter()
+    rows = export(out_dir)
+    elapsed = time.perf_counter() - start
+    size = directory_size(out_dir)
+    print(f"{label:<28} {rows:>9} {rows / elapsed:>12.0f} {size / 1024:>10.0f} {size / rows:>8.1f}")
+
+
+def main(args):
+    app = create_app('testing')
+    scratch = tempfile.mkdtemp()
+    try:
+        with app.app_context():
+            db.create_all()
+            seed(args.invoices, args.items)
+            tables = ['invoice', 'invoice_item']
+            print(f"\n{args.invoices} invoices x {args.items} items")
+            print(f"{'export':<28} {'rows':>9} {'rows/s':>12} {'KiB':>10} {'B/row':>8}")
+            measure('csv (utils.csv_export)', csv_export, os.path.join(scratch, 'csv'))
+            measure('columnar, compressed',
+                    lambda out: sum(export_columnar(out, tables=tables).values()), os.path.join(scratch, 'npz'))
+            measure('columnar, uncompressed',
+                    lambda out: sum(export_columnar(out, tables=tables, compress=False).values()),
+                    os.path.join(scratch, 'npy'))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(args)
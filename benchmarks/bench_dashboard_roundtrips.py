@@ -0,0 +1,122 @@
+# benchmarks/bench_dashboard_roundtrips.py
+"""
+Count the database round-trips (and time) needed for the dashboard's invoice
+KPIs: the old one-query-per-figure code, the single-pass utils.invoice_stats
+engine, and the dashboard_metric rollup read.
+
+    python benchmarks/bench_dashboard_roundtrips.py --invoices 20000
+    python benchmarks/bench_dashboard_roundtrips.py --database-url postgresql://.../scratch
+
+--database-url must point at a scratch database: all tables are dropped.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--invoices', type=int, default=20000)
+parser.add_argument('--repeat', type=int, default=20)
+parser.add_argument('--database-url', help="scratch database to run against (default: in-memory SQLite)")
+args = parser.parse_args()
+if args.database_url:
+    # DevelopmentConfig reads DATABASE_URL when models_core is imported
+    os.environ['DATABASE_URL'] = args.database_url
+
+from sqlalchemy import event, func
+
+from models_core import create_app, db
+from models_core.models import Client, Invoice, Supplier, User
+from utils.dashboard_metrics import dashboard_summary, rebuild_dashboard_metrics
+from utils.invoice_stats import DOCUMENT_TYPES, STATUSES, client_revenue, invoice_kpis
+
+
+def legacy_kpis():
+    """The per-figure queries dashboard(), the APIs and profitability_analysis() used to run."""
+    now = datetime.now(timezone.utc)
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    Invoice.query.filter_by(status='Pending', document_type='invoice').count()
+    db.session.query(func.sum(Invoice.total_amount)).filter_by(status='Paid', document_type='invoice').scalar()
+    Invoice.query.filter_by(status='Overdue', document_type='invoice').count()
+    Invoice.query.filter_by(status='Pending', document_type='proforma').count()
+    Invoice.query.filter_by(document_type='delivery_note').count()
+    Invoice.query.filter(Invoice.date_created >= now - timedelta(days=7)).count()
+    db.session.query(Client.name, func.sum(Invoice.total_amount)).join(Invoice) \
+        .filter(Invoice.status == 'Paid').group_by(Client.id) \
+        .order_by(func.sum(Invoice.total_amount).desc()).first()
+    db.session.query(func.avg(Invoice.total_amount)).filter_by(document_type='invoice').scalar()
+    db.session.query(func.sum(Invoice.vat_amount)).filter(
+        Invoice.status == 'Paid', Invoice.document_type == 'invoice',
+        Invoice.date_created >= start_of_month).scalar()
+    db.session.query(Invoice.document_type, func.count(Invoice.id)) \
+        .filter(Invoice.document_type.in_(DOCUMENT_TYPES)).group_by(Invoice.document_type).all()
+    db.session.query(func.sum(Invoice.total_amount)).filter_by(status='Paid', document_type='invoice').scalar()
+
+
+def engine_kpis():
+    kpis = invoice_kpis()
+    client_revenue(limit=5)
+    return kpis
+
+
+def seed(invoices):
+    user = User(username='bench', password='x', role='admin')
+    clients = [Client(name=f"Client {i}") for i in range(50)]
+    db.session.add_all([user, Supplier(name='Supplier'), *clients])
+    db.session.flush()
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    db.session.bulk_insert_mappings(Invoice, [
+        {
+            'document_type': rng.choice(DOCUMENT_TYPES),
+            'invoice_number': f"BENCH-{i}",
+            'client_id': rng.choice(clients).id,
+            'created_by': user.id,
+            'status': rng.choice(STATUSES),
+            'total_amount': round(rng.uniform(10, 5000), 2),
+            'vat_amount': round(rng.uniform(1, 800), 2),
+            'date_created': now - timedelta(days=rng.randint(0, 730)),
+        }
+        for i in range(invoices)
+    ])
+    db.session.commit()
+
+
+def measure(label, fn, repeat):
+    statements = []
+    listener = lambda *args: statements.append(1)  # noqa: E731
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        fn()
+        round_trips = len(statements)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = (time.perf_counter() - start) / repeat
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    print(f"{label:<28} {round_trips:>11} {elapsed * 1000:>10.2f}")
+
+
+def main(args):
+    app = create_app('development' if args.database_url else 'testing')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.invoices)
+        rebuild_dashboard_metrics()
+
+        print(f"\n{args.invoices} invoices on {db.engine.dialect.name}")
+        print(f"{'path':<28} {'round-trips':>11} {'ms/call':>10}")
+        measure('legacy per-figure queries', legacy_kpis, args.repeat)
+        measure('invoice_kpis engine', engine_kpis, args.repeat)
+        measure('dashboard_metric rollup', dashboard_summary, args.repeat)
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main(args)
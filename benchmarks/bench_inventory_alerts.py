@@ -0,0 +1,85 @@
+# benchmarks/bench_inventory_alerts.py
+"""
+Time the dashboard's inventory alerts: the old load-everything-and-filter
+code against utils.inventory_alerts (SQL counts + top-N over partial indexes).
+
+    python benchmarks/bench_inventory_alerts.py --skus 100000
+    python benchmarks/bench_inventory_alerts.py --database-url postgresql://.../scratch
+
+--database-url must point at a scratch database: all tables are dropped.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--skus', type=int, default=100000)
+parser.add_argument('--alerting', type=float, default=0.02, help="share of SKUs at or under their reorder point")
+parser.add_argument('--repeat', type=int, default=10)
+parser.add_argument('--database-url', help="scratch database to run against (default: in-memory SQLite)")
+args = parser.parse_args()
+if args.database_url:
+    # DevelopmentConfig reads DATABASE_URL when models_core is imported
+    os.environ['DATABASE_URL'] = args.database_url
+
+from models_core import create_app, db
+from models_core.migrations import refresh_planner_statistics
+from models_core.models import OurProductService
+from utils.inventory_alerts import inventory_alerts
+
+
+def legacy_alerts():
+    """What get_inventory_alerts() did before: every row into Python, filtered twice."""
+    items = OurProductService.query.all()
+    low_stock = [i for i in items if i.quantity_on_hand and i.reorder_point and 0 < i.quantity_on_hand <= i.reorder_point]
+    out_of_stock = [i for i in items if i.quantity_on_hand == 0]
+    db.session.expunge_all()
+    return items, low_stock, out_of_stock
+
+
+def seed(skus, alerting):
+    rng = random.Random(42)
+    db.session.execute(OurProductService.__table__.insert(), [
+        {
+            'name': f"SKU {i}",
+            'quantity_on_hand': rng.choice([0, 1, 2, 3]) if rng.random() < alerting else rng.randint(6, 500),
+            'reorder_point': 5,
+            'status': 'IN_STOCK',
+        }
+        for i in range(skus)
+    ])
+    db.session.commit()
+    refresh_planner_statistics()
+
+
+def measure(label, fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:<28} {elapsed * 1000:>10.2f}")
+
+
+def main(args):
+    app = create_app('development' if args.database_url else 'testing')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.skus, args.alerting)
+
+        alerts = inventory_alerts()
+        print(f"\n{args.skus} SKUs on {db.engine.dialect.name}: "
+              f"{alerts.low_stock_count} low, {alerts.out_of_stock_count} out of stock")
+        print(f"{'path':<28} {'ms/call':>10}")
+        measure('load all + filter', legacy_alerts, args.repeat)
+        measure('SQL counts + top-N', inventory_alerts, args.repeat)
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main(args)
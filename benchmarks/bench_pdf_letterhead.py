@@ -0,0 +1,80 @@
+# benchmarks/bench_pdf_letterhead.py
+"""
+Compare generate_invoice_pdf() with the letterhead/table header stamped as
+form XObjects (utils.pdf_generator.USE_PAGE_FORMS = True) against redrawing
+them on every page: pages per second and output bytes per page.
+
+    python benchmarks/bench_pdf_letterhead.py --documents 50 --items 120
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--documents', type=int, default=50)
+parser.add_argument('--items', type=int, default=120, help="line items per document (~30 per page)")
+args = parser.parse_args()
+
+from PIL import Image
+
+import utils.pdf_generator as pdf_generator
+from models_core import create_app, db
+from models_core.models import get_or_create_company_settings
+
+PAGE = re.compile(rb'/Type /Page\b(?!s)')
+ASSET_DIR = 'bench_letterhead'
+
+
+def form_data(n, items):
+    return {
+        'doc_number': f"BENCH-{n}", 'client_name': 'ACME', 'client_address': 'Kinshasa',
+        'issue_date': '2025-09-01', 'due_date': '2025-10-01', 'po_number': 'N/A', 'vat_rate': 16.0,
+        'items': [{'description': f"Line item {i} " * 4, 'quantity': 1 + i % 5, 'unit_price': 9.5}
+                  for i in range(items)],
+    }
+
+
+def measure(label, use_forms, documents, items):
+    pdf_generator.USE_PAGE_FORMS = use_forms
+    pages = size = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # the generator is chatty
+        for n in range(documents):
+            pdf = pdf_generator.generate_invoice_pdf(form_data(n, items), save_to_disk=False)
+            pages += len(PAGE.findall(pdf))
+            size += len(pdf)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {pages:>6} {pages / elapsed:>10.1f} {size / pages:>10.0f}")
+
+
+def main(args):
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        asset_dir = os.path.join(app.static_folder, 'uploads', ASSET_DIR)
+        os.makedirs(asset_dir, exist_ok=True)
+        try:
+            Image.new('RGBA', (600, 200), (20, 40, 160, 255)).save(os.path.join(asset_dir, 'logo.png'))
+            settings = get_or_create_company_settings()
+            settings.logo_image_path = f"{ASSET_DIR}/logo.png"
+            settings.phone, settings.email, settings.website = '+243 000 000', 'info@example.com', 'example.com'
+            db.session.commit()
+
+            print(f"\n{args.documents} documents x {args.items} items")
+            print(f"{'mode':<24} {'pages':>6} {'pages/s':>10} {'bytes/page':>10}")
+            measure('redraw every page', False, args.documents, args.items)
+            measure('form XObject stamps', True, args.documents, args.items)
+        finally:
+            shutil.rmtree(asset_dir, ignore_errors=True)
+            pdf_generator.USE_PAGE_FORMS = True
+
+
+if __name__ == '__main__':
+    main(args)
@@ -0,0 +1,75 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of the web app: each run starts a fresh interpreter that
+imports ``app`` and serves one request through the test client, like the
+first request after a worker boots. Prints the median import and
+time-to-first-request, which heavy libraries were loaded by then, and the
+slowest imports from ``python -X importtime``.
+
+    python benchmarks/bench_startup.py --runs 5 --url /login
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--runs', type=int, default=5)
+parser.add_argument('--url', default='/login', help="first request to serve")
+parser.add_argument('--top', type=int, default=10, help="slowest imports to list")
+args = parser.parse_args()
+
+HEAVY = ('reportlab', 'numpy', 'scipy', 'sklearn', 'boto3')
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.config['WTF_CSRF_ENABLED'] = False
+status = app.app.test_client().get(sys.argv[1]).status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - start, 'first_request': served - start, 'status': status,
+                  'heavy': sorted(name for name in sys.argv[2:] if name in sys.modules)}))
+"""
+
+
+def run_once(url):
+    env = dict(os.environ, FLASK_ENV=os.environ.get('FLASK_ENV', 'testing'))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, url, *HEAVY],
+                          cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result, proc.stderr
+
+
+def slowest_imports(importtime_log, top):
+    """``(self microseconds, module)`` of the slowest imports in an ``-X importtime`` log."""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        rows.append((int(self_us), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(args):
+    results = []
+    for _ in range(args.runs):
+        result, log = run_once(args.url)
+        results.append(result)
+    print(f"\n{args.runs} cold starts, first request GET {args.url} -> {results[-1]['status']}")
+    print(f"{'import app':<24} {statistics.median(r['import'] for r in results) * 1000:>9.1f} ms")
+    print(f"{'time to first request':<24} {statistics.median(r['first_request'] for r in results) * 1000:>9.1f} ms")
+    print(f"heavy libraries loaded:  {', '.join(results[-1]['heavy']) or 'none'}")
+    print("\nslowest imports (self time, last run):")
+    for self_us, module in slowest_imports(log, args.top):
+        print(f"  {self_us / 1000:>8.1f} ms  {module}")
+
+
+if __name__ == '__main__':
+    main(args)
@@ -140,6 +140,7 @@ class ProcurementForm(FlaskForm):
     currency = StringField("Currency", default="USD")
     shipping_mode = SelectField("Shipping Mode", choices=[("sea", "Sea"), ("air", "Air"), ("land", "Land")])
     purchase_date = DateField("Purchase Date", format="%Y-%m-%d", validators=[DataRequired()])
+    quantity = IntegerField("Quantity", default=1, validators=[Optional(), NumberRange(min=1)])
     status = SelectField("Status", choices=[
         ("Ordered", "Ordered"),
         ("Shipped", "Shipped"),
@@ -167,14 +168,14 @@ class ClientForm(FlaskForm):
 
 class BidForm(FlaskForm):
     item_description = StringField("Item Description", validators=[DataRequired()])
-    our_bid_price = FloatField("Our Bid Price", validators=[DataRequired()])
+    our_bid_price = DecimalField("Our Bid Price", places=2, validators=[DataRequired()])
     currency = SelectField("Currency", choices=[
         ("USD", "USD"),
         ("EUR", "EUR"),
         ("CDF", "CDF"),
         ("ZAR", "ZAR")
     ], default="USD", validators=[DataRequired()])
-    estimated_budget = FloatField("Estimated Budget", validators=[Optional()])
+    estimated_budget = DecimalField("Estimated Budget", places=2, validators=[Optional()])
     project_type = StringField("Project Type", validators=[Optional()])
     location = StringField("Location", validators=[Optional()])
     status = SelectField("Status", choices=[
@@ -1,6 +1,4 @@
 # models_core/__init__.py
-print("✅ LOADING: models_core/__init__.py")
-
 import os
 from flask import Flask, request
 from flask_sqlalchemy import SQLAlchemy
@@ -61,11 +59,9 @@ def create_app(config_name=None):
     upload_folder = os.path.join(app.static_folder, 'uploads')
     app.config['UPLOAD_FOLDER'] = upload_folder  # No trailing comma!
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    print("📁 UPLOAD_FOLDER =", app.config['UPLOAD_FOLDER'])  # Debug print
 
     # Load config
     env = config_name or os.getenv('FLASK_ENV') or 'production'
-    print(f"🚀 [models_core] FINAL env = {repr(env)}")
 
     config_class = app_config.get(env)
     if not config_class:
@@ -75,15 +71,13 @@ def create_app(config_name=None):
     config_instance.validate()
     app.config.from_object(config_instance)
 
-    print(f"🔧 Loaded config: {env}")
-    print(f"📦 Database URI: {app.config.get('SQLALCHEMY_DATABASE_URI')}")
+    app.logger.debug("Loaded config: %s", env)
 
     if not app.config.get('SECRET_KEY'):
         app.config['SECRET_KEY'] = 'dev-key-please-change-12345'
 
     # ✅ Initialize extensions
     db.init_app(app)
-    print("✅ db.init_app(app) called — id(db) =", id(db))
 
     bcrypt.init_app(app)
     csrf.init_app(app)
@@ -125,8 +119,25 @@ from .models import (
     Attachment,
     InventoryItem,
     InventoryStatus,
+    DashboardMetric,
+    RevenueByMonth,
+    DataVersion,
+    StockMovement,
+    StockCheckpoint,
+    DocumentSequence,
+    RenderJob,
     get_or_create_company_settings,
 )
+# Registers the document search index hooks (create_all / flush)
+from . import search_index  # noqa: E402,F401
+# Registers the settings version bump / snapshot invalidation hooks
+from . import settings_cache  # noqa: E402,F401
+# Sets root_id on new originals
+from . import lineage  # noqa: E402,F401
+# Bumps the per-table change counters behind the API ETags
+from . import data_version  # noqa: E402,F401
+# Records stock adjustments made by editing quantity_on_hand
+from . import stock_ledger  # noqa: E402,F401
 
 # # models_core/__init__.py
 # print("✅ LOADING: models_core/__init__.py")
@@ -1,9 +1,9 @@
-
 # apex/cli.py
 
+import click
 from flask import Flask
 from .config import Config
-from .base import db  # assuming this is your SQLAlchemy instance
+from . import db  # the shared SQLAlchemy instance bound in create_app()
 
 def register_commands(app):
     @app.cli.command("reset-db")
@@ -12,3 +12,121 @@ def register_commands(app):
             db.drop_all()
             db.create_all()
             print("✅ Database reset complete.")
+
+    @app.cli.command("upgrade-db")
+    def upgrade_db():
+        """Create missing tables and indexes without touching existing data."""
+        from .migrations import upgrade_schema
+        with app.app_context():
+            changes = upgrade_schema()
+            print(f"✅ Database upgraded ({len(changes)} changes).")
+            for change in changes:
+                print(f"   + {change}")
+
+    @app.cli.command("render-pending-pdfs")
+    def render_pending_pdfs():
+        """Render every queued document PDF now, in this process."""
+        from utils.render_queue import resume_pending_jobs
+        app.config['PDF_RENDER_ASYNC'] = False
+        with app.app_context():
+            rendered = resume_pending_jobs()
+            print(f"✅ Rendered {rendered} queued PDFs.")
+
+    @app.cli.command("export-pdfs")
+    @click.option("--from", "date_from", type=click.DateTime(["%Y-%m-%d"]), help="First issue date (inclusive).")
+    @click.option("--to", "date_to", type=click.DateTime(["%Y-%m-%d"]), help="Last issue date (inclusive).")
+    @click.option("--client", "client_id", type=int, help="Client id.")
+    @click.option("--status", help="Document status, e.g. Paid.")
+    @click.option("--type", "document_type", help="invoice, proforma or delivery_note.")
+    @click.option("--workers", type=int, help="Render processes (default: PDF_EXPORT_WORKERS or CPU count).")
+    @click.option("--output", "-o", default="documents.zip", show_default=True, help="ZIP file to write.")
+    def export_pdfs(date_from, date_to, client_id, status, document_type, workers, output):
+        """Render missing PDFs in a process pool and write the matching documents to a ZIP."""
+        from utils.batch_export import export_entries, export_query, iter_zip, render_missing
+        with app.app_context():
+            invoices = db.session.scalars(export_query(
+                date_from=date_from.date() if date_from else None,
+                date_to=date_to.date() if date_to else None,
+                client_id=client_id, status=status, document_type=document_type,
+            )).all()
+            rendered, failed = render_missing(invoices, workers=workers)
+            entries = export_entries(invoices)
+            with open(output, 'wb') as f:
+                for chunk in iter_zip(entries):
+                    f.write(chunk)
+            print(f"✅ Exported {len(entries)} PDFs to {output} ({rendered} rendered, {failed} failed).")
+
+    @app.cli.command("export-analytics")
+    @click.option("--out", "out_dir", default="exports/analytics", show_default=True, help="Output directory.")
+    @click.option("--since-last", is_flag=True, help="Append only rows changed since the previous export.")
+    @click.option("--table", "tables", multiple=True, help="Limit to these tables (repeatable).")
+    @click.option("--no-compress", is_flag=True, help="Write uncompressed parts (faster, larger).")
+    def export_analytics(out_dir, since_last, tables, no_compress):
+        """Write invoices, items, bids, competitor bids and procurement to typed columnar files."""
+        from utils.columnar_export import EXPORT_TABLES, export_columnar
+        unknown = set(tables) - set(EXPORT_TABLES)
+        if unknown:
+            raise click.BadParameter(f"unknown table(s): {', '.join(sorted(unknown))}", param_hint="--table")
+        with app.app_context():
+            written = export_columnar(out_dir, tables=list(tables) or None, since_last=since_last,
+                                      compress=not no_compress)
+            for table, rows in written.items():
+                print(f"   {table}: {rows} rows")
+            print(f"✅ Analytics export written to {out_dir}.")
+
+    @app.cli.command("rebuild-search-index")
+    def rebuild_search_index_command():
+        """Drop and refill the document full-text search index."""
+        from .search_index import rebuild_search_index
+        with app.app_context():
+            indexed = rebuild_search_index()
+            print(f"✅ Search index rebuilt ({indexed} documents).")
+
+    @app.cli.command("rebuild-dashboard-metrics")
+    def rebuild_dashboard_metrics_command():
+        """Recompute the dashboard_metric rollup from the live tables."""
+        from utils.dashboard_metrics import rebuild_dashboard_metrics
+        with app.app_context():
+            db.create_all()
+            rows = rebuild_dashboard_metrics()
+            print(f"✅ Dashboard metrics rebuilt ({rows} rows).")
+
+    @app.cli.command("rebuild-revenue-rollup")
+    def rebuild_revenue_rollup_command():
+        """Recompute the revenue_by_month rollup from the invoice table."""
+        from utils.revenue_rollup import rebuild_revenue_by_month
+        with app.app_context():
+            db.create_all()
+            rows = rebuild_revenue_by_month()
+            print(f"✅ Monthly revenue rollup rebuilt ({rows} rows).")
+
+    @app.cli.command("stock-checkpoint")
+    def stock_checkpoint_command():
+        """Checkpoint the stock of every product that moved since its last checkpoint."""
+        from .stock_ledger import create_stock_checkpoints
+        with app.app_context():
+            written = create_stock_checkpoints()
+            print(f"✅ Stock checkpoints written ({written} products).")
+
+    @app.cli.command("rebuild-stock-balances")
+    def rebuild_stock_balances_command():
+        """Reset quantity_on_hand to the stock ledger total where they differ."""
+        from .stock_ledger import rebuild_stock_balances
+        with app.app_context():
+            fixed = rebuild_stock_balances()
+            for product_id, stored, total in fixed:
+                print(f"🔧 product {product_id}: {stored} -> {total}")
+            print(f"✅ Stock balances match the ledger ({len(fixed)} corrected).")
+
+    @app.cli.command("check-dashboard-metrics")
+    def check_dashboard_metrics_command():
+        """Compare the dashboard_metric rollup with the live aggregates."""
+        from utils.dashboard_metrics import check_dashboard_metrics
+        with app.app_context():
+            mismatches = check_dashboard_metrics()
+            if not mismatches:
+                print("✅ Dashboard metrics are consistent.")
+                return
+            for metric, dimension, stored, live in mismatches:
+                print(f"❌ {metric}[{dimension}]: stored={stored} live={live}")
+            raise SystemExit(1)
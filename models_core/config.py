@@ -50,6 +50,17 @@ class Config:
 
     # PDF Generation
     PDF_GENERATION_ENGINE = os.environ.get('PDF_GENERATION_ENGINE', 'weasyprint')
+    # Background rendering of saved documents (utils/render_queue.py)
+    PDF_RENDER_ASYNC = os.environ.get('PDF_RENDER_ASYNC', 'True').lower() == 'true'
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+    PDF_RENDER_WAIT_SECONDS = float(os.environ.get('PDF_RENDER_WAIT_SECONDS', 10))
+    # Content-addressed cache of rendered PDFs (utils/pdf_cache.py); the
+    # directory defaults to <instance>/pdf_cache
+    PDF_CACHE_ENABLED = os.environ.get('PDF_CACHE_ENABLED', 'True').lower() == 'true'
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR')
+    PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # Render processes for batch exports (utils/batch_export.py); 0 = CPU count
+    PDF_EXPORT_WORKERS = int(os.environ.get('PDF_EXPORT_WORKERS', 0))
 
     def validate(self):
         if not self.SECRET_KEY or len(self.SECRET_KEY) < 16:
@@ -72,6 +83,9 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
     PRESERVE_CONTEXT_ON_EXCEPTION = False
+    # The in-memory database is a single shared connection; render inline
+    PDF_RENDER_ASYNC = False
+    PDF_CACHE_ENABLED = False
 
 
 class ProductionConfig(Config):
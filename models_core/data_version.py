@@ -0,0 +1,77 @@
+# models_core/data_version.py
+"""
+Per-table change counters.
+
+``data_version`` holds one integer per table name. A transaction that
+inserts, updates or deletes rows of a table through the ORM adds one to its
+counter as it commits, on the same connection, so the bump commits with the
+change itself and is seen by every worker. The tables are collected flush by
+flush and bumped once, at commit: the counter row stays locked until then,
+so bumping earlier would serialize concurrent writers of a table for the
+whole length of their transactions. Reading the counters of a few tables is a
+single lookup on a tiny table, which makes them a cheap "has anything
+changed?" token, e.g. for the ETags in ``utils/http_cache.py``:
+
+    data_versions('invoice', 'client')   # {'invoice': 41, 'client': 7}
+
+SQL that bypasses the ORM (bulk UPDATEs, imports) should call
+``bump_data_version(connection, 'invoice', ...)`` itself.
+"""
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import DataVersion
+
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def bump_data_version(connection, *names):
+    """Add one to the counters of ``names`` on ``connection`` (rows are created on first use)."""
+    table = DataVersion.__table__
+    names = sorted(set(names))
+    if not names:
+        return
+    dialect = connection.dialect.name
+    if dialect in _INSERTS:
+        insert = _INSERTS[dialect](table).values([{'name': name, 'version': 1} for name in names])
+        connection.execute(insert.on_conflict_do_update(
+            index_elements=[table.c.name], set_={'version': table.c.version + 1},
+        ))
+        return
+    for name in names:
+        if connection.execute(update(table).where(table.c.name == name)
+                              .values(version=table.c.version + 1)).rowcount == 0:
+            connection.execute(table.insert().values(name=name, version=1))
+
+
+def data_versions(*names):
+    """``{name: version}`` for ``names``; tables never written through the ORM count as 0."""
+    rows = db.session.execute(select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(names)))
+    versions = dict.fromkeys(names, 0)
+    versions.update(rows.tuples().all())
+    return versions
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    names = {obj.__table__.name for obj in list(session.new) + list(session.deleted)}
+    names.update(obj.__table__.name for obj in session.dirty
+                 if session.is_modified(obj, include_collections=False))
+    names.discard(DataVersion.__tablename__)
+    session.info.setdefault('data_version_tables', set()).update(names)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_written_tables(session):
+    # before_commit runs ahead of the commit's own flush: flush now so its tables are counted
+    session.flush()
+    names = session.info.pop('data_version_tables', None)
+    if names:
+        bump_data_version(session.connection(), *names)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_written_tables(session):
+    session.info.pop('data_version_tables', None)
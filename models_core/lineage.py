@@ -0,0 +1,96 @@
+# models_core/lineage.py
+"""
+Document version chains.
+
+Every invoice row carries ``root_id``, the id of the first document of its
+chain (an original points at itself), and ``(root_id, version)`` is unique.
+Each lookup is then one query on ``ix_invoice_root_id_version`` instead of
+walking ``parent``/``versions`` a level at a time:
+
+    latest_version(root_id)      # newest row of the chain
+    version_history(root_id)     # every row, oldest first
+    select(Invoice).where(is_current_version())   # only the newest row of each chain
+
+New versions are added with ``save_new_version()``, which claims
+``max(version) + 1``. The unique index is what makes that safe: of two edits
+racing for the same number only one INSERT can succeed, and the loser retries
+with the next number. On SQLite the write lock is taken before reading the
+maximum (as in utils/doc_sequence.py), so the race does not even start.
+
+``root_id`` is filled in for originals right after their INSERT (the id is
+not known before) and for existing rows by
+``migrations.backfill_invoice_roots()``.
+"""
+from sqlalchemy import event, exists, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import db
+from .models import Invoice
+
+SAVE_ATTEMPTS = 5
+
+
+@event.listens_for(Invoice, 'after_insert')
+def _root_originals(mapper, connection, target):
+    if target.root_id is None:
+        table = Invoice.__table__
+        # Part of the INSERT, not an edit: leave updated_at (export watermarks) alone
+        connection.execute(update(table).where(table.c.id == target.id)
+                           .values(root_id=target.id, updated_at=table.c.updated_at))
+        set_committed_value(target, 'root_id', target.id)
+
+
+def chain_root_id(invoice):
+    """The chain ``invoice`` belongs to (rows not yet backfilled fall back to ``parent_id``)."""
+    return invoice.root_id or invoice.parent_id or invoice.id
+
+
+def latest_version(root_id):
+    return db.session.scalar(
+        select(Invoice).where(Invoice.root_id == root_id).order_by(Invoice.version.desc()).limit(1)
+    )
+
+
+def version_history(root_id):
+    return db.session.scalars(
+        select(Invoice).where(Invoice.root_id == root_id).order_by(Invoice.version)
+    ).all()
+
+
+def is_current_version():
+    """``WHERE`` clause keeping only the newest version of each chain (an indexed anti-join)."""
+    newer = aliased(Invoice)
+    return ~exists().where(newer.root_id == Invoice.root_id, newer.version > Invoice.version)
+
+
+def next_version(root_id):
+    return (db.session.scalar(select(func.max(Invoice.version)).where(Invoice.root_id == root_id)) or 0) + 1
+
+
+def _take_write_lock(connection):
+    if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def save_new_version(invoice, root_id, base_number):
+    """
+    Add ``invoice`` to the chain ``root_id`` as its next version and flush it.
+
+    Sets ``version``, ``root_id`` and ``invoice_number`` (``<base_number>-v<version>``).
+    The flush runs in a savepoint: if another transaction committed the same
+    version first, it is rolled back and the next number is tried.
+    """
+    _take_write_lock(db.session.connection())
+    for attempt in range(SAVE_ATTEMPTS):
+        invoice.root_id = root_id
+        invoice.version = next_version(root_id)
+        invoice.invoice_number = f"{base_number}-v{invoice.version}"
+        try:
+            with db.session.begin_nested():
+                db.session.add(invoice)
+            return invoice
+        except IntegrityError:
+            if attempt == SAVE_ATTEMPTS - 1:
+                raise
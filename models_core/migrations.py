@@ -0,0 +1,226 @@
+# models_core/migrations.py
+"""
+Forward-only, idempotent schema upgrades for existing databases.
+
+``db.create_all()`` only creates tables that are missing; it never touches a
+table that already exists, so columns and indexes added to a model later never
+reach a database created before them. ``upgrade_schema()`` fills that gap and
+is safe to run on every start-up.
+"""
+import re
+
+from sqlalchemy import Integer, bindparam, inspect, text
+
+from . import db
+from .money import Money
+from .stock_ledger import open_stock_ledger
+
+
+def add_missing_columns():
+    """
+    ``ALTER TABLE ... ADD COLUMN`` for model columns the database lacks. Only
+    nullable columns (or ones with a server default) can be added this way;
+    anything else needs a hand-written step. Returns "table.column" names.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} automatically")
+                ddl = f"{column.name} {column.type.compile(dialect=conn.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _index_names(inspector, table_name):
+    if inspector.dialect.name == 'sqlite':
+        # SQLite reflection skips expression indexes such as lower(name)
+        with db.engine.connect() as conn:
+            return set(conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table_name,)
+            ).scalars())
+    return {ix['name'] for ix in inspector.get_indexes(table_name)}
+
+
+def create_missing_indexes():
+    """Create every model index that the database does not have yet. Returns their names."""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = _index_names(inspector, table.name)
+        for index in table.indexes:
+            if index.name not in present:
+                index.create(db.engine)
+                created.append(index.name)
+    return created
+
+
+def _rebuild_sqlite_table(table_name, money_columns):
+    """
+    SQLite cannot change a column's type in place: copy the table into one
+    declaring BIGINT for ``money_columns`` (amounts scaled to minor units),
+    drop the old one and rename. Everything else in the CREATE TABLE is kept
+    as is; the indexes are recreated by ``create_missing_indexes()``.
+    """
+    new_name = f"{table_name}__money"
+    raw = db.engine.raw_connection()
+    try:
+        conn = raw.driver_connection
+        isolation_level, conn.isolation_level = conn.isolation_level, None
+        foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+        conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            conn.execute("BEGIN")
+            ddl = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+            ).fetchone()[0]
+            ddl = re.sub(rf'^CREATE TABLE "?{table_name}"?', f'CREATE TABLE "{new_name}"', ddl)
+            for column in money_columns:
+                ddl = re.sub(rf'(\s"?{column}"?\s+)[A-Z]+(\([\d\s,]*\))?', r'\1BIGINT', ddl, count=1)
+            columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+            column_list = ', '.join(f'"{c}"' for c in columns)
+            select_list = ', '.join(
+                f'CAST(ROUND("{c}" * 100) AS INTEGER)' if c in money_columns else f'"{c}"' for c in columns
+            )
+            conn.execute(ddl)
+            conn.execute(f'INSERT INTO "{new_name}" ({column_list}) SELECT {select_list} FROM "{table_name}"')
+            conn.execute(f'DROP TABLE "{table_name}"')
+            conn.execute(f'ALTER TABLE "{new_name}" RENAME TO "{table_name}"')
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+            conn.isolation_level = isolation_level
+    finally:
+        raw.close()
+
+
+def convert_money_columns():
+    """
+    Data migration for ``Money`` columns still stored as FLOAT/NUMERIC amounts:
+    turn them into BIGINT minor units (12.345 -> 1235). Columns that are
+    already integers are left alone, so this only ever runs once per column.
+    Returns "table.column" names.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    converted = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {col['name']: col['type'] for col in inspector.get_columns(table.name)}
+        legacy = [column.name for column in table.columns
+                  if isinstance(column.type, Money) and column.name in present
+                  and not isinstance(present[column.name], Integer)]
+        if not legacy:
+            continue
+        if db.engine.dialect.name == 'sqlite':
+            _rebuild_sqlite_table(table.name, legacy)
+        else:
+            with db.engine.begin() as conn:
+                for column in legacy:
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ALTER COLUMN {column} "
+                                         f"TYPE BIGINT USING round({column} * 100)::bigint")
+        converted += [f"{table.name}.{column}" for column in legacy]
+    return converted
+
+
+def backfill_invoice_roots():
+    """
+    Fill ``invoice.root_id`` for rows that predate it: originals point at
+    themselves, versions inherit their parent's root (repeated for deeper
+    chains). Chains that already hold the same version number twice, from
+    edits before the unique index existed, keep the oldest row at that number
+    and move the others to the end of the chain (their invoice_number suffix
+    is left alone). Must run before the ``(root_id, version)`` unique index is
+    created. Returns a description of the change, if any.
+    """
+    if 'root_id' not in {col['name'] for col in inspect(db.engine).get_columns('invoice')}:
+        return []
+    with db.engine.begin() as conn:
+        filled = conn.exec_driver_sql(
+            "UPDATE invoice SET root_id = id WHERE root_id IS NULL AND parent_id IS NULL"
+        ).rowcount
+        while True:
+            inherited = conn.exec_driver_sql(
+                "UPDATE invoice SET root_id = (SELECT parent.root_id FROM invoice AS parent "
+                "WHERE parent.id = invoice.parent_id) "
+                "WHERE root_id IS NULL AND parent_id IN (SELECT id FROM invoice WHERE root_id IS NOT NULL)"
+            ).rowcount
+            filled += inherited
+            if not inherited:
+                break
+        # Parent row gone: the document starts its own chain
+        filled += conn.exec_driver_sql("UPDATE invoice SET root_id = id WHERE root_id IS NULL").rowcount
+
+        duplicates = conn.exec_driver_sql(
+            "SELECT id, root_id FROM invoice AS row WHERE EXISTS (SELECT 1 FROM invoice AS other "
+            "WHERE other.root_id = row.root_id AND other.version = row.version AND other.id < row.id) "
+            "ORDER BY root_id, version, id"
+        ).all()
+        for row_id, root_id in duplicates:
+            conn.execute(text(
+                "UPDATE invoice SET version = (SELECT MAX(version) + 1 FROM invoice WHERE root_id = :root_id) "
+                "WHERE id = :id"
+            ), {'root_id': root_id, 'id': row_id})
+    if not (filled or duplicates):
+        return []
+    return [f"invoice.root_id ({filled} rows, {len(duplicates)} versions renumbered)"]
+
+
+# dashboard_metric rows nothing writes any more: paid revenue per month moved to revenue_by_month
+RETIRED_DASHBOARD_METRICS = ('paid_revenue_month', 'paid_vat_month')
+
+
+def drop_retired_dashboard_metrics():
+    """Delete the ``dashboard_metric`` rows of retired metrics. Returns a description of the change, if any."""
+    if 'dashboard_metric' not in inspect(db.engine).get_table_names():
+        return []
+    with db.engine.begin() as conn:
+        dropped = conn.execute(
+            text("DELETE FROM dashboard_metric WHERE metric IN :metrics").bindparams(
+                bindparam('metrics', expanding=True)),
+            {'metrics': list(RETIRED_DASHBOARD_METRICS)},
+        ).rowcount
+    return [f"dashboard_metric ({dropped} retired rows)"] if dropped else []
+
+
+def refresh_planner_statistics():
+    """
+    ``ANALYZE`` the database. Without statistics SQLite picks between indexes
+    heuristically and will not prefer a partial or covering index over a
+    plain equality match; PostgreSQL only re-analyzes on autovacuum.
+    """
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def upgrade_schema():
+    """Bring an existing database up to the current models. Returns a list of the changes made."""
+    db.create_all()
+    changes = (add_missing_columns() + convert_money_columns() + backfill_invoice_roots() + open_stock_ledger()
+               + drop_retired_dashboard_metrics())
+    # utils/ imports models_core, so the rollups are loaded here rather than at import time
+    from utils.dashboard_metrics import build_dashboard_metrics
+    from utils.revenue_rollup import build_revenue_by_month
+    changes += build_dashboard_metrics() + build_revenue_by_month()
+    indexes = create_missing_indexes()
+    if indexes:
+        refresh_planner_statistics()
+    return changes + indexes
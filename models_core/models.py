@@ -7,6 +7,7 @@ from enum import Enum as PyEnum
 from flask_login import UserMixin
 # Use shared db instance
 from models_core import db
+from models_core.money import Money, to_money
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(100), unique=True, nullable=False)
@@ -15,6 +16,20 @@ class User(db.Model, UserMixin):
     full_name = db.Column(db.String(100))
     def __repr__(self):
         return f"<User {self.username}>"
+
+
+def name_lookup_index(index_name, column):
+    """
+    Index for the typeahead lookups (utils/typeahead.py) on lower(name): a btree
+    that serves prefix range scans, and on PostgreSQL a pg_trgm GIN index that
+    serves prefix and substring ILIKE alike.
+    """
+    return db.Index(
+        index_name, db.func.lower(column).label('name_lower'),
+        postgresql_using='gin', postgresql_ops={'name_lower': 'gin_trgm_ops'},
+    )
+
+
 class Client(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -22,6 +37,10 @@ class Client(db.Model):
     email = db.Column(db.String(100))
     phone = db.Column(db.String(20))
     invoices = db.relationship('Invoice', back_populates='client')  # ← string, not backref
+
+    # Keyset pagination on the list views seeks on (sort column, id)
+    __table_args__ = (db.Index('ix_client_name_id', 'name', 'id'), name_lookup_index('ix_client_name_lower', name))
+
 class Invoice(db.Model):
     __tablename__ = 'invoice'
 
@@ -33,20 +52,24 @@ class Invoice(db.Model):
     date_created = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     issue_date = db.Column(db.Date, nullable=True)
     due_date = db.Column(db.Date, nullable=True)
-    subtotal = db.Column(db.Float, default=0.0)
-    total_amount = db.Column(db.Float, default=0.0)
-    vat_amount = db.Column(db.Float, default=0.0)
+    subtotal = db.Column(Money, default=0)
+    total_amount = db.Column(Money, default=0)
+    vat_amount = db.Column(Money, default=0)
     vat_rate = db.Column(db.Float, default=16.0)
+    currency = db.Column(db.String(10), nullable=False, default='USD', server_default='USD')
     status = db.Column(db.String(20), default='Pending')
     signing_person_name = db.Column(db.String(100))
     signing_person_function = db.Column(db.String(100))
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     pdf_file = db.Column(db.String(200), nullable=True)  # Will store "generated_pdfs/filename.pdf"
+    pdf_status = db.Column(db.String(20), nullable=True)  # pending / rendering / ready / failed (None: legacy)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     # Versioning
     version = db.Column(db.Integer, default=1, nullable=False)
     parent_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=True)
+    # First document of the chain (its own id for an original); set on insert, see utils/lineage.py
+    root_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=True)
 
     # Relationships
     client = db.relationship('Client', back_populates='invoices')
@@ -59,8 +82,30 @@ class Invoice(db.Model):
     )
 
     # Self-referential relationships (CORRECTED)
-    parent = db.relationship('Invoice', remote_side=[id], back_populates='versions')
-    versions = db.relationship('Invoice', back_populates='parent', cascade='all, delete-orphan')
+    parent = db.relationship('Invoice', remote_side=[id], foreign_keys=[parent_id], back_populates='versions')
+    versions = db.relationship('Invoice', foreign_keys=[parent_id], back_populates='parent',
+                               cascade='all, delete-orphan')
+
+    # One index per hot query shape (equality columns first, then the range/sort column)
+    __table_args__ = (
+        # Paid revenue for a period (monthly summary, revenue trend, dashboard rollup)
+        db.Index('ix_invoice_status_type_date_created', 'status', 'document_type', 'date_created'),
+        # Recent documents, optionally of one type, newest first
+        db.Index('ix_invoice_date_created', 'date_created'),
+        db.Index('ix_invoice_type_date_created', 'document_type', 'date_created'),
+        # Seeding the per-period number sequence
+        db.Index('ix_invoice_type_created_at', 'document_type', 'created_at'),
+        db.Index('ix_invoice_client_id', 'client_id'),
+        db.Index('ix_invoice_issue_date_id', 'issue_date', 'id'),
+        # Version chain lookups: (parent_id = ? OR id = ?) AND document_type = ?
+        db.Index('ix_invoice_parent_id_type_version', 'parent_id', 'document_type', 'version'),
+        # Lineage: latest version / full history of a chain, and one row per version number
+        db.Index('ix_invoice_root_id_version', 'root_id', 'version', unique=True),
+        # Only open invoices are ever listed by due date, so index just those rows
+        db.Index('ix_invoice_pending_due_date', 'due_date',
+                 sqlite_where=db.text("status = 'Pending' AND document_type = 'invoice'"),
+                 postgresql_where=db.text("status = 'Pending' AND document_type = 'invoice'")),
+    )
 
     def __repr__(self):
         return f"<Invoice {self.invoice_number} | {self.document_type.upper()} v{self.version}>"
@@ -72,11 +117,15 @@ class InvoiceItem(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     creator = db.relationship('User', backref='created_invoices')
     # ✅ Allow nulls for delivery notes
-    unit_price = db.Column(db.Float, nullable=True)
-    total_price = db.Column(db.Float, nullable=True)
+    unit_price = db.Column(Money, nullable=True)
+    total_price = db.Column(Money, nullable=True)
 
     comment = db.Column(db.Text)
     invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False)
+    # Stocked product this line issues (matched by name when the document is saved); None for services
+    product_id = db.Column(db.Integer, db.ForeignKey('our_product_service.id'), nullable=True)
+
+    __table_args__ = (db.Index('ix_invoice_item_invoice_id', 'invoice_id'),)
 
     def __repr__(self):
         return f"<InvoiceItem {self.description[:30]}... x{self.quantity}>"
@@ -95,6 +144,8 @@ class CompanySettings(db.Model):
     phone = db.Column(db.String(20))
     email = db.Column(db.String(100))
     website = db.Column(db.String(255))
+    # Bumped by every UPDATE of the row; read paths cache on it (models_core/settings_cache.py)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 def __repr__(self):
         return f"<CompanySettings {self.name}>"
 
@@ -107,22 +158,36 @@ class Supplier(db.Model):
     phone = db.Column(db.String(20))
     address = db.Column(db.Text)
 
+    __table_args__ = (db.Index('ix_supplier_name_id', 'name', 'id'), name_lookup_index('ix_supplier_name_lower', name))
+
 class ProcurementItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'))
-    purchase_price = db.Column(db.Float)
+    purchase_price = db.Column(Money)
     purchase_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     shipping_mode = db.Column(db.String(10), default='sea')
-    shipping_cost = db.Column(db.Float, default=0.0)
-    total_cost = db.Column(db.Float)
+    shipping_cost = db.Column(Money, default=0)
+    total_cost = db.Column(Money)
     expected_arrival_date = db.Column(db.DateTime)
     arrival_date = db.Column(db.DateTime)
     status = db.Column(db.String(20), default='Ordered')
     currency = db.Column(db.String(10), default='USD')
+    quantity = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Stocked product received on delivery (matched by name); see models_core/stock_ledger.py
+    product_id = db.Column(db.Integer, db.ForeignKey('our_product_service.id'), nullable=True)
+    # Incremental analytics exports pick up edits by it (utils/columnar_export.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_procurement_item_name_id', 'name', 'id'),
+        # Yearly spend sums total_cost over a purchase_date range straight from the index
+        db.Index('ix_procurement_item_purchase_date', 'purchase_date', 'total_cost'),
+        db.Index('ix_procurement_item_status', 'status'),
+    )
 
     def calculate_total_cost(self):
-        return (self.purchase_price or 0) + (self.shipping_cost or 0)
+        return to_money(self.purchase_price) + to_money(self.shipping_cost)
 
     def calculate_expected_arrival(self):
         if self.shipping_mode == 'sea':
@@ -141,32 +206,47 @@ class OurProductService(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    standard_price = db.Column(db.Float)
+    standard_price = db.Column(Money)
     currency = db.Column(db.String(3), default='USD')
-    cogs = db.Column(db.Float)
+    cogs = db.Column(Money)
     category = db.Column(db.String(100))
     is_active = db.Column(db.Boolean, default=True)
     quantity_on_hand = db.Column(db.Integer)
     reorder_point = db.Column(db.Integer)
-    unit_cost = db.Column(db.Float)
+    unit_cost = db.Column(Money)
     status = db.Column(db.String(50), nullable=False, default="IN_STOCK")
+
+    __table_args__ = (
+        db.Index('ix_our_product_service_name_id', 'name', 'id'),
+        name_lookup_index('ix_our_product_service_name_lower', name),
+        # Dashboard stock alerts (utils/inventory_alerts.py): only the alerting rows are indexed
+        db.Index('ix_our_product_service_low_stock', 'quantity_on_hand', 'name', 'id',
+                 sqlite_where=db.text("quantity_on_hand > 0 AND quantity_on_hand <= reorder_point"),
+                 postgresql_where=db.text("quantity_on_hand > 0 AND quantity_on_hand <= reorder_point")),
+        db.Index('ix_our_product_service_out_of_stock', 'name', 'id',
+                 sqlite_where=db.text("quantity_on_hand = 0"),
+                 postgresql_where=db.text("quantity_on_hand = 0")),
+    )
+
 class LocalMarketItem(db.Model):
     __tablename__ = 'local_market_items'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
-    recent_price = db.Column(db.Numeric(10, 2))
+    recent_price = db.Column(Money)
     currency = db.Column(db.String(10))
     source = db.Column(db.String(120))
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index('ix_local_market_items_name_id', 'name', 'id'),)
+
 class Bid(db.Model):
     __tablename__ = 'bid'
     id = db.Column(db.Integer, primary_key=True)
     item_description = db.Column(db.String(255), nullable=False)
-    our_bid_price = db.Column(db.Float, nullable=False)
+    our_bid_price = db.Column(Money, nullable=False)
     currency = db.Column(db.String(10), nullable=False, default='USD')
-    estimated_budget = db.Column(db.Float)
+    estimated_budget = db.Column(Money)
     project_type = db.Column(db.String(100))
     location = db.Column(db.String(100))
     status = db.Column(
@@ -185,6 +265,14 @@ class Bid(db.Model):
     competitor_id = db.Column(db.Integer, db.ForeignKey('competitors.id'))
     competitor_bids = db.relationship('CompetitorBid', backref='bid', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_bid_item_description_id', 'item_description', 'id'),
+        db.Index('ix_bid_our_bid_price_id', 'our_bid_price', 'id'),
+        db.Index('ix_bid_status_id', 'status', 'id'),
+        db.Index('ix_bid_currency_id', 'currency', 'id'),
+        db.Index('ix_bid_status_currency_id', 'status', 'currency', 'id'),
+    )
+
 
 class Competitor(db.Model):
     __tablename__ = 'competitors'
@@ -198,14 +286,22 @@ class Competitor(db.Model):
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
 
+    __table_args__ = (db.Index('ix_competitors_name_id', 'name', 'id'),)
+
 class CompetitorBid(db.Model):
     __tablename__ = 'competitor_bid'
     id = db.Column(db.Integer, primary_key=True)
     competitor_name = db.Column(db.String(100), nullable=False)
-    bid_price = db.Column(db.Float, nullable=False)
+    bid_price = db.Column(Money, nullable=False)
     notes = db.Column(db.String(255))
     bid_id = db.Column(db.Integer, db.ForeignKey('bid.id'), nullable=False)
 
+    __table_args__ = (
+        # Per-bid ranking window (PARTITION BY bid_id ORDER BY bid_price, id) and the FK join
+        db.Index('ix_competitor_bid_bid_id_price', 'bid_id', 'bid_price', 'id'),
+        db.Index('ix_competitor_bid_competitor_name', 'competitor_name'),
+    )
+
 class Attachment(db.Model):
     __tablename__ = 'attachments'
 
@@ -221,6 +317,8 @@ class Attachment(db.Model):
     # Relationship back to Invoice
     parent_invoice = db.relationship("Invoice", back_populates="attachments", foreign_keys=[invoice_id])
 
+    __table_args__ = (db.Index('ix_attachments_invoice_id', 'invoice_id'),)
+
     def __repr__(self):
         return f"<Attachment {self.filename} for Invoice {self.invoice_id}>"
     
@@ -239,7 +337,7 @@ class InventoryItem(db.Model):
     quantity = db.Column(db.Integer, default=0)
     incoming_quantity = db.Column(db.Integer, default=0)
     reorder_threshold = db.Column(db.Integer, default=10)
-    unit_price = db.Column(db.Numeric(10, 2), nullable=False)
+    unit_price = db.Column(Money, nullable=False)
     category = db.Column(db.String(100))
     location = db.Column(db.String(100))
 
@@ -260,7 +358,147 @@ class InventoryItem(db.Model):
     supplier = db.relationship('Supplier', backref='inventory_items')
 
     def total_value(self):
-        return self.quantity * float(self.unit_price)
+        return self.quantity * self.unit_price
+
+class DashboardMetric(db.Model):
+    """Pre-aggregated dashboard figure, e.g. metric='invoice_count', dimension='invoice:Pending'."""
+    __tablename__ = 'dashboard_metric'
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(50), nullable=False)
+    dimension = db.Column(db.String(100), nullable=False, default='')
+    # Counts and amounts alike, in exact hundredths, so summed deltas never drift
+    value = db.Column(Money, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'dimension', name='uq_dashboard_metric_metric_dimension'),
+        db.Index('ix_dashboard_metric_metric_value', 'metric', 'value'),
+    )
+
+    def __repr__(self):
+        return f"<DashboardMetric {self.metric}[{self.dimension}]={self.value}>"
+
+
+class RevenueByMonth(db.Model):
+    """Paid documents of one calendar month, per document type and currency (see utils/revenue_rollup.py)."""
+    __tablename__ = 'revenue_by_month'
+
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    document_type = db.Column(db.String(20), nullable=False)
+    currency = db.Column(db.String(10), nullable=False)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Money, nullable=False, default=0)
+    vat = db.Column(Money, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('year', 'month', 'document_type', 'currency', name='uq_revenue_by_month_period'),
+    )
+
+    def __repr__(self):
+        return f"<RevenueByMonth {self.year}-{self.month:02d} {self.document_type}/{self.currency}={self.revenue}>"
+
+
+class DataVersion(db.Model):
+    """Change counter of one table, bumped by every transaction that writes to it (see models_core/data_version.py)."""
+    __tablename__ = 'data_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('name', name='uq_data_version_name'),
+    )
+
+    def __repr__(self):
+        return f"<DataVersion {self.name}={self.version}>"
+
+
+class StockMovement(db.Model):
+    """One append-only stock ledger entry: +quantity received, -quantity issued (see models_core/stock_ledger.py)."""
+    __tablename__ = 'stock_movement'
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('our_product_service.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # opening / receipt / issue / adjustment
+    # What caused it: ('procurement_item', id), ('invoice', chain root id) or None for manual adjustments
+    source_type = db.Column(db.String(30))
+    source_id = db.Column(db.Integer)
+    occurred_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Replay of one product after a checkpoint
+        db.Index('ix_stock_movement_product_id_id', 'product_id', 'id'),
+        # Net quantity already posted for a source document
+        db.Index('ix_stock_movement_source', 'source_type', 'source_id', 'product_id'),
+    )
+
+    def __repr__(self):
+        return f"<StockMovement {self.kind} product={self.product_id} {self.quantity:+d}>"
+
+
+class StockCheckpoint(db.Model):
+    """On-hand quantity of a product once every movement up to ``movement_id`` is applied."""
+    __tablename__ = 'stock_checkpoint'
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('our_product_service.id'), nullable=False)
+    movement_id = db.Column(db.Integer, nullable=False)
+    as_of = db.Column(db.DateTime, nullable=False)
+    on_hand = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_stock_checkpoint_product_id_as_of', 'product_id', 'as_of'),
+    )
+
+    def __repr__(self):
+        return f"<StockCheckpoint product={self.product_id} {self.as_of:%Y-%m-%d %H:%M}={self.on_hand}>"
+
+
+class DocumentSequence(db.Model):
+    """Last number handed out for a document type within a period (e.g. 'invoice', '2025-09')."""
+    __tablename__ = 'document_sequence'
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_type = db.Column(db.String(20), nullable=False)
+    period = db.Column(db.String(10), nullable=False)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('document_type', 'period', name='uq_document_sequence_type_period'),
+    )
+
+    def __repr__(self):
+        return f"<DocumentSequence {self.document_type}/{self.period}={self.last_value}>"
+
+
+class RenderJob(db.Model):
+    """A queued PDF render for an invoice; the row survives restarts so unfinished jobs can be resumed."""
+    __tablename__ = 'render_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending / rendering / ready / failed
+    payload = db.Column(db.Text, nullable=False)  # JSON: document_type + form_data for generate_invoice_pdf
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    invoice = db.relationship('Invoice', backref=db.backref('render_jobs', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ix_render_job_status_id', 'status', 'id'),
+        db.Index('ix_render_job_invoice_id', 'invoice_id'),
+    )
+
+    def __repr__(self):
+        return f"<RenderJob {self.id} invoice={self.invoice_id} {self.status}>"
 # models_core/models.py
 
 # Move this BELOW all model definitions
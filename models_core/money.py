@@ -0,0 +1,74 @@
+# models_core/money.py
+"""
+Exact money columns.
+
+``Money`` stores an amount as a whole number of minor units (cents) in a
+BIGINT and hands it back as a ``Decimal`` with two places, so
+``SUM(total_amount)`` is an integer sum in the database on SQLite and
+PostgreSQL alike, and Python code never sees a binary float:
+
+    total_amount = db.Column(Money, default=0)
+    invoice.total_amount = Decimal('12.34')    # stored as 1234
+    invoice.total_amount                        # Decimal('12.34')
+
+Values bound against a money column (``Invoice.total_amount > 100``) are
+converted to minor units as well; factors in arithmetic
+(``price * 1.15``) are left alone and the product is money again.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from sqlalchemy import BigInteger, Numeric
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+_SCALING_OPERATORS = {operators.mul, operators.truediv, operators.floordiv, operators.mod}
+
+
+def to_money(value, default=ZERO):
+    """``value`` (Decimal, int, float or numeric string) rounded half-up to cents; ``default`` if unparseable."""
+    if value is None or value == '':
+        return default
+    try:
+        amount = value if isinstance(value, Decimal) else Decimal(str(value))
+        return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        return default
+
+
+class Money(TypeDecorator):
+    """An amount of money, stored as integer minor units and loaded as a two-place ``Decimal``."""
+    impl = BigInteger
+    cache_ok = True
+
+    class comparator_factory(TypeDecorator.Comparator):
+        def _adapt_expression(self, op, other_comparator):
+            # price + shipping, price * 1.15: still money, in minor units; price / cost is a ratio
+            if op in (operators.add, operators.sub):
+                return op, self.type
+            if op in _SCALING_OPERATORS:
+                return op, Numeric() if isinstance(other_comparator.type, Money) else self.type
+            return super()._adapt_expression(op, other_comparator)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        amount = to_money(value, default=None)
+        if amount is None:
+            raise ValueError(f"Not a money amount: {value!r}")
+        return int(amount.scaleb(2))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, int):
+            return Decimal(value).scaleb(-2)
+        # func.avg(..., type_=Money) comes back as a float (or Decimal) of minor units
+        return to_money(Decimal(str(value)).scaleb(-2))
+
+    def coerce_compared_value(self, op, value):
+        if op in _SCALING_OPERATORS:
+            return Numeric()
+        return self
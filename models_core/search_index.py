@@ -0,0 +1,236 @@
+# models_core/search_index.py
+"""
+Full-text index behind ``/search_documents``.
+
+One row per document in ``document_search`` with the searchable text:
+invoice number, PO number, client name and the line items' descriptions and
+comments.
+
+* SQLite: an FTS5 virtual table (rowid = invoice id), ranked with bm25.
+* PostgreSQL: a plain table with a weighted ``tsvector`` generated column under
+  a GIN index, plus pg_trgm GIN indexes so partial document numbers
+  ("OCT25-01") still hit an index.
+
+The table is created (and filled from the existing rows) by ``db.create_all()``
+/ ``upgrade_schema()`` through a metadata ``after_create`` hook. After that it
+is kept current from the ORM: every flush that touches an Invoice, an
+InvoiceItem or a client's name re-indexes the affected documents on the same
+connection, so the index commits or rolls back with the change itself. Bulk
+SQL that bypasses the ORM needs ``rebuild_search_index()`` (also the
+``rebuild-search-index`` CLI command).
+"""
+import re
+from collections import namedtuple
+
+from sqlalchemy import bindparam, event, inspect, text
+from sqlalchemy.orm import Session, joinedload
+
+from . import db
+from .models import Client, Invoice, InvoiceItem
+
+SEARCH_TABLE = 'document_search'
+
+# bm25 / setweight weights, in column order: number, PO, client, items
+_SQLITE_WEIGHTS = (10.0, 6.0, 3.0, 1.0)
+
+SearchPage = namedtuple('SearchPage', 'items total page per_page')
+
+
+# ========================
+# Schema
+# ========================
+
+def _index_exists(connection):
+    if connection.dialect.name == 'sqlite':
+        return connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (SEARCH_TABLE,)
+        ).first() is not None
+    if connection.dialect.name == 'postgresql':
+        return connection.exec_driver_sql(f"SELECT to_regclass('{SEARCH_TABLE}')").scalar() is not None
+    return False
+
+
+def create_search_index(connection):
+    """Create the index if missing and fill it. Returns True when it was created."""
+    if connection.dialect.name not in ('sqlite', 'postgresql') or _index_exists(connection):
+        return False
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            "invoice_number, po_number, client_name, items, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    else:
+        connection.exec_driver_sql(f"""
+            CREATE TABLE {SEARCH_TABLE} (
+                invoice_id integer PRIMARY KEY,
+                invoice_number text NOT NULL DEFAULT '',
+                po_number text NOT NULL DEFAULT '',
+                client_name text NOT NULL DEFAULT '',
+                items text NOT NULL DEFAULT '',
+                document tsvector GENERATED ALWAYS AS (
+                    setweight(to_tsvector('simple', invoice_number), 'A') ||
+                    setweight(to_tsvector('simple', po_number), 'A') ||
+                    setweight(to_tsvector('simple', client_name), 'B') ||
+                    setweight(to_tsvector('simple', items), 'C')
+                ) STORED
+            )""")
+        connection.exec_driver_sql(
+            f"CREATE INDEX ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING gin (document)")
+        connection.exec_driver_sql(
+            f"CREATE INDEX ix_{SEARCH_TABLE}_number_trgm ON {SEARCH_TABLE} "
+            "USING gin (invoice_number gin_trgm_ops, po_number gin_trgm_ops)")
+    _reindex(connection, None)
+    return True
+
+
+def drop_search_index(connection):
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+@event.listens_for(db.metadata, 'before_create')
+def _create_extensions(target, connection, **kw):
+    # pg_trgm backs this index and the typeahead name indexes (models.name_lookup_index)
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_with_tables(target, connection, **kw):
+    create_search_index(connection)
+
+
+@event.listens_for(db.metadata, 'after_drop')
+def _drop_with_tables(target, connection, **kw):
+    drop_search_index(connection)
+
+
+# ========================
+# Maintenance
+# ========================
+
+def _reindex(connection, invoice_ids):
+    """Rewrite the index rows of ``invoice_ids`` (None: every document) from the live tables."""
+    items = (
+        "(SELECT group_concat(coalesce(it.description, '') || ' ' || coalesce(it.comment, ''), ' ') "
+        "FROM invoice_item it WHERE it.invoice_id = i.id)"
+        if connection.dialect.name == 'sqlite' else
+        "(SELECT string_agg(coalesce(it.description, '') || ' ' || coalesce(it.comment, ''), ' ') "
+        "FROM invoice_item it WHERE it.invoice_id = i.id)"
+    )
+    key = 'rowid' if connection.dialect.name == 'sqlite' else 'invoice_id'
+    where = f"WHERE {{column}} IN :ids" if invoice_ids is not None else ""
+    delete = text(f"DELETE FROM {SEARCH_TABLE} {where.format(column=key)}")
+    insert = text(
+        f"INSERT INTO {SEARCH_TABLE} ({key}, invoice_number, po_number, client_name, items) "
+        f"SELECT i.id, coalesce(i.invoice_number, ''), coalesce(i.po_number, ''), coalesce(c.name, ''), "
+        f"coalesce({items}, '') "
+        f"FROM invoice i LEFT JOIN client c ON c.id = i.client_id {where.format(column='i.id')}"
+    )
+    params = {}
+    if invoice_ids is not None:
+        delete = delete.bindparams(bindparam('ids', expanding=True))
+        insert = insert.bindparams(bindparam('ids', expanding=True))
+        params = {'ids': list(invoice_ids)}
+    connection.execute(delete, params)
+    connection.execute(insert, params)
+
+
+def rebuild_search_index():
+    """Recreate and refill the index from scratch. Returns the number of indexed documents."""
+    with db.engine.begin() as connection:
+        drop_search_index(connection)
+        create_search_index(connection)
+        if not _index_exists(connection):
+            return 0
+        return connection.exec_driver_sql(f"SELECT count(*) FROM {SEARCH_TABLE}").scalar()
+
+
+def _name_changed(client):
+    return inspect(client).attrs.name.history.has_changes()
+
+
+@event.listens_for(Session, 'after_flush')
+def _index_flushed_documents(session, flush_context):
+    invoice_ids, client_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Invoice):
+            invoice_ids.add(obj.id)
+        elif isinstance(obj, InvoiceItem):
+            invoice_ids.add(obj.invoice_id)
+            # An item moved to another document leaves the old one stale too
+            history = inspect(obj).attrs.invoice_id.history
+            invoice_ids.update(history.deleted or ())
+        elif isinstance(obj, Client) and obj not in session.new and _name_changed(obj):
+            client_ids.add(obj.id)
+    invoice_ids.discard(None)
+    if not invoice_ids and not client_ids:
+        return
+
+    connection = session.connection()
+    if not _index_exists(connection):
+        return
+    if client_ids:
+        invoice_ids.update(connection.execute(
+            text("SELECT id FROM invoice WHERE client_id IN :ids").bindparams(bindparam('ids', expanding=True)),
+            {'ids': list(client_ids)},
+        ).scalars())
+    if invoice_ids:
+        _reindex(connection, invoice_ids)
+
+
+# ========================
+# Queries
+# ========================
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def search_invoices(query, page=1, per_page=20):
+    """Documents matching every word of ``query`` (prefix match), best first, one page at a time."""
+    terms = _terms(query or '')
+    page = max(page, 1)
+    if not terms:
+        return SearchPage([], 0, page, per_page)
+
+    connection = db.session.connection()
+    offset = (page - 1) * per_page
+    if not _index_exists(connection):
+        # No index (other databases, or not upgraded yet): number-only scan, as before
+        statement = db.select(Invoice).where(Invoice.invoice_number.contains(query.strip()))
+        total = db.session.scalar(db.select(db.func.count()).select_from(statement.subquery()))
+        items = db.session.scalars(statement.order_by(Invoice.id.desc()).limit(per_page).offset(offset)).all()
+        return SearchPage(items, total, page, per_page)
+
+    if connection.dialect.name == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(w) for w in _SQLITE_WEIGHTS)
+        total = connection.execute(
+            text(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match"), {'match': match}
+        ).scalar()
+        ids = connection.execute(text(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match "
+            f"ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid DESC LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'limit': per_page, 'offset': offset}).scalars().all()
+    else:
+        tsquery = ' & '.join(f"{term}:*" for term in terms)
+        condition = (
+            f"(document @@ to_tsquery('simple', :tsquery) "
+            f"OR invoice_number ILIKE :like OR po_number ILIKE :like)"
+        )
+        params = {'tsquery': tsquery, 'like': f"%{query.strip()}%"}
+        total = connection.execute(
+            text(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {condition}"), params
+        ).scalar()
+        ids = connection.execute(text(
+            f"SELECT invoice_id FROM {SEARCH_TABLE} WHERE {condition} "
+            f"ORDER BY ts_rank(document, to_tsquery('simple', :tsquery)) DESC, invoice_id DESC "
+            f"LIMIT :limit OFFSET :offset"
+        ), {**params, 'limit': per_page, 'offset': offset}).scalars().all()
+
+    by_id = {invoice.id: invoice for invoice in db.session.scalars(
+        db.select(Invoice).where(Invoice.id.in_(ids)).options(joinedload(Invoice.client))
+    )} if ids else {}
+    return SearchPage([by_id[i] for i in ids if i in by_id], total, page, per_page)
@@ -0,0 +1,81 @@
+# models_core/settings_cache.py
+"""
+Process-wide snapshot of the company settings row for read paths.
+
+``CompanySettings.version`` is bumped in the database by every UPDATE of the
+row (``CompanySettings.version + 1`` in the statement itself, so concurrent
+writers never reuse a number). ``company_settings()`` then costs:
+
+* nothing, when it already ran in this request (the result is kept on ``g``);
+* one primary-key sized query (``SELECT id, version``) per request otherwise,
+  and the full row only when the version differs from the snapshot this
+  process holds, i.e. after an admin saved the settings from any worker.
+
+Writes in this process drop the snapshot straight away (mapper events), so
+the admin sees their change on the next page. The snapshot is a detached
+``CompanySettings`` copy shared between threads: read it, never modify it.
+Routes that change the settings keep using ``get_or_create_company_settings()``.
+"""
+import threading
+
+from flask import g, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import object_session
+
+from . import db
+from .models import CompanySettings, get_or_create_company_settings
+
+_lock = threading.Lock()
+# {database url: (row id, version, detached CompanySettings)}
+_snapshots = {}
+
+
+def _detached_copy(row):
+    return CompanySettings(**{attr.key: getattr(row, attr.key) for attr in inspect(CompanySettings).column_attrs})
+
+
+def company_settings():
+    """The current company settings, read-only, fetched at most once per change (see module docstring)."""
+    if has_app_context() and 'company_settings' in g:
+        return g.company_settings
+    key = str(db.engine.url)
+    current = db.session.execute(select(CompanySettings.id, CompanySettings.version).limit(1)).first()
+    cached = _snapshots.get(key)
+    if current and cached and cached[:2] == tuple(current):
+        settings = cached[2]
+    else:
+        with _lock:
+            if current:
+                row = db.session.execute(
+                    select(CompanySettings).where(CompanySettings.id == current.id)
+                    .execution_options(populate_existing=True)
+                ).scalar_one()
+            else:
+                row = get_or_create_company_settings()
+            settings = _detached_copy(row)
+            _snapshots[key] = (row.id, row.version, settings)
+    if has_app_context():
+        g.company_settings = settings
+    return settings
+
+
+def invalidate_company_settings():
+    """Forget this process's snapshot (done automatically on ORM writes to the row)."""
+    if has_app_context():
+        _snapshots.pop(str(db.engine.url), None)
+        g.pop('company_settings', None)
+    else:
+        _snapshots.clear()
+
+
+@event.listens_for(CompanySettings, 'before_update')
+def _bump_version(mapper, connection, target):
+    if object_session(target).is_modified(target):
+        target.version = CompanySettings.version + 1
+
+
+@event.listens_for(CompanySettings, 'after_insert')
+@event.listens_for(CompanySettings, 'after_update')
+@event.listens_for(CompanySettings, 'after_delete')
+def _drop_snapshot(mapper, connection, target):
+    invalidate_company_settings()
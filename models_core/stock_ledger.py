@@ -0,0 +1,358 @@
+# models_core/stock_ledger.py
+"""
+Stock movement ledger.
+
+Every change to a product's stock is an append-only ``stock_movement`` row
+(+quantity in, -quantity out), and ``OurProductService.quantity_on_hand`` is
+the running balance: each movement is added to it in the same transaction,
+so "how many are on hand" stays a primary-key read and the stock alert
+indexes keep working. Movements come from:
+
+* receipts: procurement items once their status is Delivered/Arrived
+  (``sync_procurement_stock``);
+* issues: the lines of invoices and delivery notes, i.e. of the latest
+  version of each document chain, and none once it is Cancelled
+  (``sync_document_stock``). A sale is issued once: when a delivery note
+  carries the same client and PO number as an invoice, the goods leave
+  with the note and the invoice moves nothing (saving the note re-syncs
+  those invoices, so cancelling it hands the issue back to them);
+* adjustments: editing ``quantity_on_hand`` through the ORM (the inventory
+  and product forms) is recorded by a flush hook as the difference, and new
+  products open with their initial quantity.
+
+A sync compares what its source should have moved with the net quantity
+the ledger already holds for it and posts only the difference. Saving a
+document twice, editing it into a new version or cancelling it therefore
+corrects the stock instead of counting it again. The read and the posting
+happen under a lock on the source (SQLite's write lock; a transaction-level
+advisory lock on PostgreSQL), so two concurrent saves of one document cannot
+both post the same difference. Lines are tied to
+products by ``product_id``, filled in on first sync from an exact
+(case-insensitive) name match; lines that match nothing (services, free
+text) do not move stock.
+
+Movements are never deleted, so neither is a product that has any: it is
+marked inactive instead (``has_stock_movements``; the delete routes check
+it and a flush that would delete one raises ``ValueError``).
+
+``stock_on_hand_at(product_id, when)`` answers for any past moment: it starts
+from the latest ``stock_checkpoint`` at or before ``when`` and replays the
+movements after it. ``create_stock_checkpoints()`` (``flask stock-checkpoint``)
+should run periodically so that replay stays short.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, func, insert, inspect, literal, select, tuple_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from . import db
+from .lineage import chain_root_id, is_current_version, latest_version
+from .models import Invoice, InvoiceItem, OurProductService, ProcurementItem, StockCheckpoint, StockMovement
+
+OPENING, RECEIPT, ISSUE, ADJUSTMENT = 'opening', 'receipt', 'issue', 'adjustment'
+
+RECEIVED_STATUSES = ('Delivered', 'Arrived')
+ISSUING_DOCUMENT_TYPES = ('invoice', 'delivery_note')
+
+
+def _take_write_lock(connection):
+    if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def _lock_source(connection, source_type, source_id):
+    """Hold off other syncs of one source until this transaction ends."""
+    if connection.dialect.name == 'postgresql':
+        # Keyed on the source itself, whichever table it lives in
+        connection.execute(select(func.pg_advisory_xact_lock(func.hashtext(source_type), source_id)))
+    else:
+        _take_write_lock(connection)
+
+
+# ========================
+# Posting movements
+# ========================
+
+def _post(connection, movements):
+    """Append ``movements`` (dicts) and add them to the products' balances."""
+    if not movements:
+        return
+    now = datetime.utcnow()
+    connection.execute(insert(StockMovement.__table__), [dict(movement, occurred_at=now) for movement in movements])
+
+    deltas = defaultdict(int)
+    for movement in movements:
+        deltas[movement['product_id']] += movement['quantity']
+    table = OurProductService.__table__
+    for product_id, delta in sorted(deltas.items()):
+        balance = connection.execute(
+            update(table).where(table.c.id == product_id)
+            .values(quantity_on_hand=func.coalesce(table.c.quantity_on_hand, 0) + delta)
+            .returning(table.c.quantity_on_hand)
+        ).scalar()
+        # A loaded product would otherwise show (and later re-save) its old quantity
+        loaded = db.session.identity_map.get(identity_key(OurProductService, product_id))
+        if loaded is not None:
+            set_committed_value(loaded, 'quantity_on_hand', balance)
+
+
+def record_movement(product_id, quantity, kind=ADJUSTMENT, source_type=None, source_id=None):
+    """Post one movement and apply it to the product's balance. Does not commit."""
+    _post(db.session.connection(), [dict(product_id=product_id, quantity=quantity, kind=kind,
+                                         source_type=source_type, source_id=source_id)])
+
+
+def posted_quantities(source_type, source_id):
+    """``{product_id: net quantity}`` the ledger holds for one source."""
+    rows = db.session.execute(
+        select(StockMovement.product_id, func.sum(StockMovement.quantity))
+        .where(StockMovement.source_type == source_type, StockMovement.source_id == source_id)
+        .group_by(StockMovement.product_id)
+    )
+    return {product_id: quantity for product_id, quantity in rows if quantity}
+
+
+def sync_source(source_type, source_id, wanted, kind):
+    """
+    Post whatever brings the source's net movements to ``wanted``
+    (``{product_id: signed quantity}``). Returns the posted differences. Does not commit.
+    """
+    connection = db.session.connection()
+    # Read and post under one lock, so two saves of the same document cannot both post
+    _lock_source(connection, source_type, source_id)
+    posted = posted_quantities(source_type, source_id)
+    differences = {
+        product_id: wanted.get(product_id, 0) - posted.get(product_id, 0)
+        for product_id in sorted(set(wanted) | set(posted))
+    }
+    differences = {product_id: quantity for product_id, quantity in differences.items() if quantity}
+    _post(connection, [dict(product_id=product_id, quantity=quantity, kind=kind,
+                            source_type=source_type, source_id=source_id)
+                       for product_id, quantity in differences.items()])
+    return differences
+
+
+def has_stock_movements(product_id):
+    """Whether the ledger holds anything for ``product_id`` (which then cannot be deleted)."""
+    return db.session.scalar(
+        select(StockMovement.id).where(StockMovement.product_id == product_id).limit(1)
+    ) is not None
+
+
+def match_product_id(name):
+    """The product called ``name`` (case-insensitive), if any."""
+    if not name or not name.strip():
+        return None
+    return db.session.scalar(
+        select(OurProductService.id).where(func.lower(OurProductService.name) == name.strip().lower())
+        .order_by(OurProductService.id).limit(1)
+    )
+
+
+def _delivered_by_note(invoice):
+    """Whether a live delivery note covers the same sale (client and PO number) as ``invoice``."""
+    return db.session.scalar(
+        select(Invoice.id).where(Invoice.document_type == 'delivery_note', Invoice.client_id == invoice.client_id,
+                                 Invoice.po_number == invoice.po_number,
+                                 Invoice.status.is_distinct_from('Cancelled'), is_current_version())
+        .limit(1)
+    ) is not None
+
+
+def _issues_stock(document):
+    if document.document_type not in ISSUING_DOCUMENT_TYPES or document.status == 'Cancelled':
+        return False
+    if document.document_type == 'invoice' and document.po_number:
+        return not _delivered_by_note(document)
+    return True
+
+
+def _invoices_of_note(root_id):
+    """Current invoices sharing a client and PO number with any version of the delivery note ``root_id``."""
+    sales = select(Invoice.client_id, Invoice.po_number).where(Invoice.root_id == root_id,
+                                                                Invoice.po_number.is_not(None))
+    return db.session.scalars(
+        select(Invoice).where(Invoice.document_type == 'invoice', is_current_version(),
+                              tuple_(Invoice.client_id, Invoice.po_number).in_(sales))
+        .order_by(Invoice.id)
+    ).all()
+
+
+def sync_document_stock(invoice):
+    """Issue the lines of ``invoice``'s chain (its latest version) from stock. Does not commit."""
+    db.session.flush()
+    root_id = chain_root_id(invoice)
+    latest = latest_version(root_id) or invoice
+    wanted = defaultdict(int)
+    if _issues_stock(latest):
+        for item in latest.items:
+            if item.product_id is None:
+                item.product_id = match_product_id(item.description)
+            if item.product_id is not None:
+                wanted[item.product_id] -= item.quantity or 0
+    differences = sync_source('invoice', root_id, wanted, ISSUE)
+    if latest.document_type == 'delivery_note':
+        # The note takes the sale's issue over from its invoices, or hands it back
+        for sale_invoice in _invoices_of_note(root_id):
+            sync_document_stock(sale_invoice)
+    return differences
+
+
+def sync_procurement_stock(item):
+    """Receive ``item`` into stock once delivered (and take it back out if its status is reverted)."""
+    db.session.flush()
+    if item.product_id is None:
+        item.product_id = match_product_id(item.name)
+    wanted = {}
+    if item.product_id is not None and item.status in RECEIVED_STATUSES:
+        wanted[item.product_id] = item.quantity or 0
+    return sync_source('procurement_item', item.id, wanted, RECEIPT)
+
+
+# ========================
+# Balances & point-in-time stock
+# ========================
+
+def stock_on_hand(product_id):
+    """Current balance: one primary-key read."""
+    return db.session.scalar(select(OurProductService.quantity_on_hand).where(OurProductService.id == product_id)) or 0
+
+
+def stock_on_hand_at(product_id, when):
+    """Balance at ``when`` (naive UTC): the last checkpoint before it plus the movements since."""
+    checkpoint = db.session.execute(
+        select(StockCheckpoint.movement_id, StockCheckpoint.on_hand)
+        .where(StockCheckpoint.product_id == product_id, StockCheckpoint.as_of <= when)
+        .order_by(StockCheckpoint.as_of.desc(), StockCheckpoint.id.desc()).limit(1)
+    ).first()
+    after_id, on_hand = checkpoint or (0, 0)
+    replayed = db.session.scalar(
+        select(func.coalesce(func.sum(StockMovement.quantity), 0))
+        .where(StockMovement.product_id == product_id, StockMovement.id > after_id,
+               StockMovement.occurred_at <= when)
+    )
+    return on_hand + replayed
+
+
+def create_stock_checkpoints(now=None):
+    """
+    Checkpoint every product that moved since its last checkpoint, from that
+    checkpoint plus the new movements. Commits; returns the number written.
+    """
+    now = now or datetime.utcnow()
+    _take_write_lock(db.session.connection())
+    last = (
+        select(StockCheckpoint.product_id, func.max(StockCheckpoint.movement_id).label('movement_id'))
+        .group_by(StockCheckpoint.product_id).subquery()
+    )
+    base = dict(db.session.execute(
+        select(StockCheckpoint.product_id, StockCheckpoint.on_hand)
+        .join(last, (last.c.product_id == StockCheckpoint.product_id)
+              & (last.c.movement_id == StockCheckpoint.movement_id))
+    ).all())
+    moved = db.session.execute(
+        select(StockMovement.product_id, func.max(StockMovement.id), func.sum(StockMovement.quantity))
+        .outerjoin(last, last.c.product_id == StockMovement.product_id)
+        .where(StockMovement.id > func.coalesce(last.c.movement_id, 0), StockMovement.occurred_at <= now)
+        .group_by(StockMovement.product_id)
+    ).all()
+    db.session.add_all(
+        StockCheckpoint(product_id=product_id, movement_id=movement_id, as_of=now,
+                        on_hand=base.get(product_id, 0) + quantity)
+        for product_id, movement_id, quantity in moved
+    )
+    db.session.commit()
+    return len(moved)
+
+
+def check_stock_balances():
+    """``[(product_id, stored balance, ledger total)]`` for products whose balance drifted from the ledger."""
+    ledger = (
+        select(StockMovement.product_id, func.sum(StockMovement.quantity).label('quantity'))
+        .group_by(StockMovement.product_id).subquery()
+    )
+    rows = db.session.execute(
+        select(OurProductService.id, OurProductService.quantity_on_hand, func.coalesce(ledger.c.quantity, 0))
+        .outerjoin(ledger, ledger.c.product_id == OurProductService.id)
+        .order_by(OurProductService.id)
+    )
+    return [(product_id, stored, total) for product_id, stored, total in rows if (stored or 0) != total]
+
+
+def rebuild_stock_balances():
+    """Reset drifted balances (bulk SQL, imports) to their ledger totals. Commits; returns the products fixed."""
+    mismatches = check_stock_balances()
+    for product_id, _, total in mismatches:
+        db.session.execute(update(OurProductService).where(OurProductService.id == product_id)
+                           .values(quantity_on_hand=total).execution_options(synchronize_session=False))
+    db.session.commit()
+    return mismatches
+
+
+def open_stock_ledger():
+    """
+    Opening movement for every product that has stock but no ledger entries
+    yet, so balances from before the ledger add up. Returns a description.
+    """
+    products, movements = OurProductService.__table__, StockMovement.__table__
+    with db.engine.begin() as conn:
+        opened = conn.execute(movements.insert().from_select(
+            ['product_id', 'quantity', 'kind', 'occurred_at'],
+            select(products.c.id, products.c.quantity_on_hand, literal(OPENING), func.current_timestamp())
+            .where(products.c.quantity_on_hand != 0,
+                   ~select(movements.c.id).where(movements.c.product_id == products.c.id).exists())
+        )).rowcount
+    return [f"stock_movement ({opened} opening balances)"] if opened else []
+
+
+# ========================
+# Hooks: quantity edits through the ORM
+# ========================
+
+@event.listens_for(Session, 'before_flush')
+def _collect_quantity_edits(session, flush_context, instances):
+    edits = []
+    for product in session.new:
+        if isinstance(product, OurProductService) and product.quantity_on_hand:
+            edits.append((product, product.quantity_on_hand, OPENING))
+    for product in session.dirty:
+        if not isinstance(product, OurProductService):
+            continue
+        history = inspect(product).attrs.quantity_on_hand.history
+        if not history.added:
+            continue
+        if history.deleted:
+            old = history.deleted[0]
+        else:  # set without being loaded first
+            old = session.connection().execute(
+                select(OurProductService.quantity_on_hand).where(OurProductService.id == product.id)
+            ).scalar()
+        delta = (history.added[0] or 0) - (old or 0)
+        if delta:
+            edits.append((product, delta, ADJUSTMENT))
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, OurProductService)]
+    if deleted:
+        connection = session.connection()
+        moved = connection.execute(
+            select(StockMovement.product_id).where(StockMovement.product_id.in_(deleted)).limit(1)
+        ).scalar()
+        if moved is not None:
+            raise ValueError(f"Product {moved} has stock movements; mark it inactive instead of deleting it")
+        # Never stocked: documents and purchases that named it just lose the link
+        for table in (InvoiceItem.__table__, ProcurementItem.__table__):
+            connection.execute(update(table).where(table.c.product_id.in_(deleted)).values(product_id=None))
+    session.info['stock_edits'] = edits
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_quantity_edits(session, flush_context):
+    edits = session.info.pop('stock_edits', None)
+    if edits:
+        # The flush already wrote the new quantity_on_hand: only the ledger rows are missing
+        session.connection().execute(insert(StockMovement.__table__), [
+            dict(product_id=product.id, quantity=quantity, kind=kind, occurred_at=datetime.utcnow())
+            for product, quantity, kind in edits
+        ])
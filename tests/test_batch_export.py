@@ -0,0 +1,90 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from datetime import date
+
+from models_core import create_app, db
+from models_core.models import Client, Invoice, InvoiceItem, User
+from utils.batch_export import export_entries, export_query, iter_zip, queue_missing, render_missing
+
+
+class BatchExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.static = tempfile.mkdtemp()
+        self.app.static_folder = self.static
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.user, self.acme, self.other = User(username='admin', password='x', role='admin'), \
+            Client(name='ACME', address='Kinshasa'), Client(name='Other')
+        db.session.add_all([self.user, self.acme, self.other])
+        db.session.flush()
+        for n, (client, issued, status) in enumerate([
+            (self.acme, date(2025, 8, 30), 'Paid'),
+            (self.acme, date(2025, 9, 2), 'Paid'),
+            (self.acme, date(2025, 9, 20), 'Pending'),
+            (self.other, date(2025, 9, 5), 'Paid'),
+        ]):
+            invoice = Invoice(document_type='invoice', invoice_number=f"TEST-BX-{n}", client_id=client.id,
+                              issue_date=issued, status=status, created_by=self.user.id, vat_rate=16.0)
+            invoice.items.append(InvoiceItem(description='Widget', quantity=2, unit_price=5.0, total_price=10.0,
+                                             created_by=self.user.id))
+            db.session.add(invoice)
+        db.session.commit()
+
+    def tearDown(self):
+        shutil.rmtree(self.static, ignore_errors=True)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_filter_selects_by_date_client_and_status(self):
+        query = export_query(date_from=date(2025, 9, 1), date_to=date(2025, 9, 30), client_id=self.acme.id,
+                             status='Paid', document_type='invoice')
+        self.assertEqual([i.invoice_number for i in db.session.scalars(query)], ['TEST-BX-1'])
+
+    def test_missing_pdfs_render_in_process_pool_and_stream_as_zip(self):
+        invoices = db.session.scalars(export_query(client_id=self.acme.id)).all()
+
+        self.assertEqual(render_missing(invoices, workers=2), (3, 0))
+        self.assertEqual({i.pdf_status for i in invoices}, {'ready'})
+        self.assertEqual(render_missing(invoices, workers=2), (0, 0))
+
+        chunks = list(iter_zip(export_entries(invoices)))
+        self.assertGreater(len(chunks), 1)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+            self.assertEqual(archive.namelist(), ['TEST-BX-0.pdf', 'TEST-BX-1.pdf', 'TEST-BX-2.pdf'])
+            path = os.path.join(self.static, 'generated_pdfs', 'TEST-BX-0.pdf')
+            with open(path, 'rb') as f:
+                self.assertEqual(archive.read('TEST-BX-0.pdf'), f.read())
+
+    def test_renders_in_flight_are_left_to_their_job(self):
+        invoices = db.session.scalars(export_query(client_id=self.acme.id)).all()
+        invoices[0].pdf_status = 'rendering'
+        db.session.commit()
+
+        self.assertEqual(render_missing(invoices, workers=1), (2, 0))
+        self.assertEqual(invoices[0].pdf_status, 'rendering')
+        self.assertEqual([name for name, _ in export_entries(invoices)], ['TEST-BX-1.pdf', 'TEST-BX-2.pdf'])
+
+    def test_queue_missing_hands_renders_to_the_queue_and_reports_what_is_left(self):
+        invoices = db.session.scalars(export_query(client_id=self.acme.id)).all()
+        invoices[0].pdf_status = 'rendering'
+        db.session.commit()
+
+        # Testing renders inline (PDF_RENDER_ASYNC=False), so only the in-flight one is left
+        pending = queue_missing(invoices)
+        self.assertEqual([i.invoice_number for i in pending], ['TEST-BX-0'])
+        self.assertEqual([i.pdf_status for i in invoices], ['rendering', 'ready', 'ready'])
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(iter_zip(export_entries(invoices), notes='TEST-BX-0\n')))) as archive:
+            self.assertEqual(archive.namelist(), ['TEST-BX-1.pdf', 'TEST-BX-2.pdf', 'README.txt'])
+            self.assertEqual(archive.read('README.txt'), b'TEST-BX-0\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from sqlalchemy import event
+
+from models_core import create_app, db
+from models_core.models import Bid, CompetitorBid
+from utils.bid_analytics import get_bid_insights
+
+
+class BidAnalyticsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _bid(self, price, competitor_prices, status='Pending', currency='USD'):
+        bid = Bid(item_description=f"Item {price}", our_bid_price=price, status=status, currency=currency)
+        bid.competitor_bids = [
+            CompetitorBid(competitor_name=f"Comp {p}", bid_price=p) for p in competitor_prices
+        ]
+        db.session.add(bid)
+        return bid
+
+    def test_lowest_competitor_and_threshold(self):
+        self._bid(120.0, [110.0, 100.0, 130.0])
+        self._bid(100.0, [95.0])
+        self._bid(50.0, [])
+        db.session.commit()
+
+        rows = get_bid_insights()
+
+        self.assertEqual([row.lowest_price for row in rows], [100.0, 95.0, None])
+        self.assertEqual(rows[0].lowest_competitor, 'Comp 100.0')
+        self.assertEqual([row.price_too_high for row in rows], [True, False, False])
+
+    def test_filters(self):
+        self._bid(10.0, [5.0], status='Won', currency='EUR')
+        self._bid(20.0, [5.0], status='Pending', currency='USD')
+        db.session.commit()
+
+        rows = get_bid_insights(status='Won', currency='EUR')
+
+        self.assertEqual([row.bid.our_bid_price for row in rows], [10.0])
+
+    def test_query_count_is_constant(self):
+        for i in range(25):
+            self._bid(100.0 + i, [90.0, 95.0 + i])
+        db.session.commit()
+        db.session.expunge_all()
+
+        statements = []
+        listener = lambda *args: statements.append(1)  # noqa: E731
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            rows = get_bid_insights()
+            [(row.bid.item_description, row.lowest_price, row.price_too_high) for row in rows]
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(len(statements), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
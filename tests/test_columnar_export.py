@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from models_core import create_app, db
+from models_core.models import Bid, Client, CompetitorBid, Invoice, InvoiceItem, ProcurementItem, User
+from utils.columnar_export import FULL_EXPORT_EVERY, OVERLAP, export_columnar, read_table
+
+
+class ColumnarExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.out = tempfile.mkdtemp()
+        self.user, client = User(username='admin', password='x', role='admin'), Client(name='ACME')
+        db.session.add_all([self.user, client])
+        db.session.flush()
+        self.t0 = datetime(2025, 9, 1, 12, 0)
+        for n in range(5):
+            invoice = Invoice(document_type='invoice', invoice_number=f"INV-{n}", client_id=client.id,
+                              created_by=self.user.id, issue_date=date(2025, 9, n + 1), total_amount=10.5 * n,
+                              created_at=self.t0, updated_at=self.t0)
+            invoice.items.append(InvoiceItem(description='Widget', quantity=n + 1, created_by=self.user.id,
+                                             unit_price=None if n == 0 else 2.5))
+            db.session.add(invoice)
+        bid = Bid(item_description='Pump', our_bid_price=100.0, created_at=self.t0, updated_at=self.t0)
+        bid.competitor_bids.append(CompetitorBid(competitor_name='Rival', bid_price=95.0))
+        db.session.add_all([bid, ProcurementItem(name='Valve', purchase_price=3.0, purchase_date=self.t0,
+                                                 shipping_mode='air')])
+        db.session.commit()
+
+    def tearDown(self):
+        shutil.rmtree(self.out, ignore_errors=True)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_full_export_keeps_types_and_nulls(self):
+        written = export_columnar(self.out, batch_size=2)
+
+        self.assertEqual(written, {'invoice': 5, 'invoice_item': 5, 'bid': 1, 'competitor_bid': 1,
+                                   'procurement_item': 1})
+        with open(os.path.join(self.out, 'manifest.json')) as f:
+            invoice_entry = json.load(f)['tables']['invoice']
+        self.assertEqual(len(invoice_entry['parts']), 3)
+        total_column = next(c for c in invoice_entry['columns'] if c['name'] == 'total_amount')
+        self.assertEqual((total_column['type'], total_column['scale']), ('int64', 2))
+
+        invoices = read_table(self.out, 'invoice')
+        self.assertEqual(invoices['id'].dtype, np.int64)
+        self.assertEqual(invoices['total_amount'].dtype, np.int64)
+        self.assertEqual(list(invoices['total_amount']), [0, 1050, 2100, 3150, 4200])
+        self.assertEqual(invoices['vat_rate'].dtype, np.float64)
+        self.assertEqual(invoices['issue_date'][0], np.datetime64('2025-09-01'))
+        self.assertEqual(invoices['created_at'].dtype, np.dtype('datetime64[us]'))
+        self.assertEqual(list(invoices['invoice_number']), [f"INV-{n}" for n in range(5)])
+        items = read_table(self.out, 'invoice_item')
+        self.assertTrue(items['unit_price'].mask[0])
+        self.assertEqual(int(items['unit_price'][1:].sum()), 1000)
+
+    def test_since_last_exports_changes_with_an_overlap(self):
+        for n, invoice in enumerate(db.session.scalars(db.select(Invoice).order_by(Invoice.id))):
+            invoice.updated_at = self.t0 + timedelta(hours=n)
+        db.session.commit()
+        export_columnar(self.out)
+        # The newest rows sit within OVERLAP of the watermark and are read again
+        written = export_columnar(self.out, since_last=True)
+        self.assertEqual((written['invoice'], written['bid'], written['procurement_item']), (1, 1, 1))
+
+        # Stamped before the watermark but committed after the last run, like a slow transaction
+        invoice = db.session.scalar(db.select(Invoice).where(Invoice.invoice_number == 'INV-1'))
+        invoice.total_amount, invoice.updated_at = 999.0, self.t0 + timedelta(hours=4) - OVERLAP / 2
+        db.session.scalar(db.select(ProcurementItem)).status = 'Delivered'
+        db.session.add(ProcurementItem(name='Gasket', purchase_date=self.t0, shipping_mode='sea'))
+        db.session.commit()
+
+        written = export_columnar(self.out, since_last=True)
+
+        self.assertEqual((written['invoice'], written['invoice_item'], written['procurement_item']), (2, 2, 2))
+        invoices = read_table(self.out, 'invoice')
+        self.assertEqual(len(invoices['id']), 5)
+        self.assertEqual(invoices['total_amount'][invoices['id'] == invoice.id][0], 99900)
+        procurement = read_table(self.out, 'procurement_item')
+        self.assertEqual((list(procurement['name']), list(procurement['status'])),
+                         (['Valve', 'Gasket'], ['Delivered', 'Ordered']))
+
+    def test_stale_full_export_is_redone_and_drops_deleted_rows(self):
+        export_columnar(self.out)
+        db.session.delete(db.session.scalar(db.select(Invoice).where(Invoice.invoice_number == 'INV-0')))
+        db.session.commit()
+        self.assertEqual(len(read_table(self.out, 'invoice')['id']), 5)
+
+        path = os.path.join(self.out, 'manifest.json')
+        with open(path) as f:
+            manifest = json.load(f)
+        manifest['tables']['invoice']['full_export_at'] = (datetime.utcnow() - FULL_EXPORT_EVERY).isoformat()
+        with open(path, 'w') as f:
+            json.dump(manifest, f)
+
+        self.assertEqual(export_columnar(self.out, since_last=True)['invoice'], 4)
+        self.assertEqual(list(read_table(self.out, 'invoice')['invoice_number']), [f"INV-{n}" for n in range(1, 5)])
+
+    def test_manifest_in_an_older_format_is_replaced(self):
+        export_columnar(self.out)
+        path = os.path.join(self.out, 'manifest.json')
+        with open(path) as f:
+            manifest = json.load(f)
+        manifest['format'] = 'apex-columnar/1'
+        with open(path, 'w') as f:
+            json.dump(manifest, f)
+
+        self.assertEqual(export_columnar(self.out, since_last=True)['invoice'], 5)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.out, 'invoice'))), ['part-00000.npz'])
+        self.assertEqual(len(read_table(self.out, 'invoice')['id']), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import csv
+import unittest
+from decimal import Decimal
+from io import StringIO
+
+from sqlalchemy import event, select
+
+from models_core import create_app, db
+from models_core.models import InventoryItem, Supplier
+from utils.csv_export import csv_response, iter_csv, stream_rows
+
+
+class CsvExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.test_request_context('/dashboard/export_inventory')
+        self.ctx.push()
+        db.create_all()
+        supplier = Supplier(name='Acme Supply')
+        db.session.add(supplier)
+        db.session.add_all(
+            InventoryItem(product_name=f"Part {n}", sku=f"SKU-{n:04d}", unit_price=Decimal('1.00'),
+                          supplier=supplier if n % 2 else None)
+            for n in range(1200)
+        )
+        db.session.commit()
+        db.session.expunge_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_header_first_then_fixed_size_chunks(self):
+        chunks = list(iter_csv(['n'], ([n] for n in range(1200)), chunk_rows=500))
+
+        self.assertEqual(chunks[0], 'n\r\n')
+        self.assertEqual([chunk.count('\r\n') for chunk in chunks[1:]], [500, 500, 200])
+
+    def test_streamed_rows_join_supplier_in_one_query(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            rows = stream_rows(
+                select(InventoryItem.sku, Supplier.name).outerjoin(InventoryItem.supplier).order_by(InventoryItem.id),
+                yield_per=100,
+            )
+            response = csv_response('inventory.csv', ['SKU', 'Supplier'], rows)
+            body = ''.join(chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in response.response)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        self.assertEqual(len(statements), 1)
+        parsed = list(csv.reader(StringIO(body)))
+        self.assertEqual(len(parsed), 1201)
+        self.assertEqual(parsed[1:3], [['SKU-0000', ''], ['SKU-0001', 'Acme Supply']])
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment;filename=inventory.csv')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from sqlalchemy import func, select
+
+from models_core import create_app, db
+from models_core.config import TestingConfig
+from models_core.models import Bid, Client, DashboardMetric, Invoice, Supplier, User
+from utils.dashboard_metrics import (
+    BID_COUNT,
+    DOCUMENTS_CREATED_DAY,
+    build_dashboard_metrics,
+    bump_metric,
+    check_dashboard_metrics,
+    dashboard_summary,
+    invoice_snapshot,
+    rebuild_dashboard_metrics,
+    record_invoice_change,
+)
+
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+
+class DashboardMetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.user = User(username='admin', password='x', role='admin')
+        self.client = Client(name='ACME')
+        db.session.add_all([self.user, self.client])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _invoice(self, document_type='invoice', status='Pending', total=100.0, vat=16.0):
+        invoice = Invoice(
+            document_type=document_type, invoice_number=f"T-{document_type}-{status}-{total}",
+            client_id=self.client.id, created_by=self.user.id,
+            total_amount=total, vat_amount=vat, status=status,
+        )
+        db.session.add(invoice)
+        db.session.flush()
+        return invoice
+
+    def test_rebuild_matches_live_aggregates(self):
+        self._invoice(status='Paid', total=116.0)
+        self._invoice(status='Pending', total=58.0)
+        self._invoice(document_type='proforma', status='Pending')
+        db.session.add(Supplier(name='Supplier'))
+        db.session.commit()
+
+        rebuild_dashboard_metrics()
+
+        self.assertEqual(check_dashboard_metrics(), [])
+        summary = dashboard_summary()
+        self.assertEqual(summary['pending_invoices'], 1)
+        self.assertEqual(summary['pending_proformas'], 1)
+        self.assertEqual(summary['total_revenue'], Decimal('116.00'))
+        self.assertEqual(summary['avg_invoice_value'], Decimal('87.00'))
+        self.assertEqual(summary['top_client_name'], 'ACME')
+        self.assertEqual(summary['total_suppliers'], 1)
+        self.assertEqual(summary['recent_activity_count'], 3)
+
+    def test_incremental_updates_stay_consistent(self):
+        rebuild_dashboard_metrics()
+
+        invoice = self._invoice(total=200.0, vat=32.0)
+        record_invoice_change(invoice)
+        db.session.commit()
+
+        before = invoice_snapshot(invoice)
+        invoice.status = 'Paid'
+        record_invoice_change(invoice, before)
+        db.session.add(Bid(item_description='Pump', our_bid_price=10.0, status='Won'))
+        bump_metric(BID_COUNT, 'Won')
+        db.session.commit()
+
+        self.assertEqual(check_dashboard_metrics(), [])
+        summary = dashboard_summary()
+        self.assertEqual(summary['pending_invoices'], 0)
+        self.assertEqual(summary['total_revenue'], Decimal('200.00'))
+        self.assertEqual(summary['total_bids'], 1)
+
+    def test_money_deltas_add_up_exactly(self):
+        rebuild_dashboard_metrics()
+        for total in (0.1, 0.2, 0.7):
+            invoice = self._invoice(status='Paid', total=total, vat=0.0)
+            record_invoice_change(invoice)
+        db.session.commit()
+
+        # 0.1 + 0.2 + 0.7 is 0.9999999999999999 in floats
+        self.assertEqual(dashboard_summary()['total_revenue'], Decimal('1.00'))
+        self.assertEqual(check_dashboard_metrics(), [])
+
+    def test_unbuilt_rollup_is_read_live_and_built_by_the_upgrade(self):
+        self._invoice(status='Paid', total=116.0)
+        db.session.commit()
+
+        summary = dashboard_summary()
+        self.assertEqual((summary['total_revenue'], summary['top_client_name']), (Decimal('116.00'), 'ACME'))
+        self.assertEqual(db.session.scalar(select(func.count(DashboardMetric.id))), 0)
+
+        self.assertTrue(build_dashboard_metrics())
+        self.assertEqual(build_dashboard_metrics(), [])
+        self.assertEqual(dashboard_summary(), summary)
+
+    def test_day_buckets_outside_the_activity_window_are_pruned(self):
+        rebuild_dashboard_metrics()
+        old_days = [(datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d') for days in (8, 30, 400)]
+        db.session.add_all(DashboardMetric(metric=DOCUMENTS_CREATED_DAY, dimension=day, value=2) for day in old_days)
+        db.session.commit()
+        self.assertEqual(check_dashboard_metrics(), [])
+
+        # The first document of the day clears them out
+        record_invoice_change(self._invoice())
+        db.session.commit()
+        days = db.session.scalars(select(DashboardMetric.dimension)
+                                  .where(DashboardMetric.metric == DOCUMENTS_CREATED_DAY)).all()
+        self.assertEqual(days, [datetime.utcnow().strftime('%Y-%m-%d')])
+        self.assertEqual(dashboard_summary()['recent_activity_count'], 1)
+        self.assertEqual(check_dashboard_metrics(), [])
+
+    def test_check_reports_drift(self):
+        rebuild_dashboard_metrics()
+        self._invoice(status='Overdue')
+        db.session.commit()
+
+        mismatches = check_dashboard_metrics()
+        self.assertIn(('invoice_count', 'invoice:Overdue', 0, 1), mismatches)
+
+
+class ConcurrentDeltasTestCase(unittest.TestCase):
+    THREADS = 8
+    DATABASE_URL = None
+
+    def setUp(self):
+        self.path = None
+        url = self.DATABASE_URL
+        if url is None:
+            fd, self.path = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            # A file database so every thread gets its own connection
+            url = f"sqlite:///{self.path}"
+        with mock.patch.object(TestingConfig, 'SQLALCHEMY_DATABASE_URI', url):
+            self.app = create_app('testing')
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        if self.path:
+            os.remove(self.path)
+
+    def test_first_deltas_to_a_new_row_all_count(self):
+        errors = []
+        start = threading.Barrier(self.THREADS)
+
+        def worker():
+            with self.app.app_context():
+                try:
+                    start.wait()
+                    bump_metric(BID_COUNT, 'Shortlisted')
+                    db.session.commit()
+                except Exception as exc:  # surfaced below; a thread can't fail the test itself
+                    errors.append(exc)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        with self.app.app_context():
+            rows = db.session.scalars(select(DashboardMetric.value).where(DashboardMetric.metric == BID_COUNT)).all()
+            self.assertEqual(rows, [self.THREADS])
+
+
+@unittest.skipUnless(POSTGRES_URL, 'set TEST_POSTGRES_URL to check concurrent upserts on PostgreSQL')
+class PostgresConcurrentDeltasTestCase(ConcurrentDeltasTestCase):
+    DATABASE_URL = POSTGRES_URL
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from models_core import create_app, db
+from models_core.config import TestingConfig
+from models_core.models import Client, DocumentSequence, Invoice, User
+from utils.doc_sequence import next_monthly_sequence, next_sequence
+
+
+class DocumentSequenceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_sequences_are_per_type_and_period(self):
+        self.assertEqual([next_sequence('invoice', '2025-09') for _ in range(3)], [1, 2, 3])
+        self.assertEqual(next_sequence('proforma', '2025-09'), 1)
+        self.assertEqual(next_sequence('invoice', '2025-10'), 1)
+        db.session.commit()
+        row = DocumentSequence.query.filter_by(document_type='invoice', period='2025-09').one()
+        self.assertEqual(row.last_value, 3)
+
+    def test_rollback_returns_the_number(self):
+        next_sequence('invoice', '2025-09')
+        db.session.commit()
+        next_sequence('invoice', '2025-09')
+        db.session.rollback()
+        self.assertEqual(next_sequence('invoice', '2025-09'), 2)
+
+    def test_new_period_continues_after_existing_documents(self):
+        user, client = User(username='admin', password='x', role='admin'), Client(name='ACME')
+        db.session.add_all([user, client])
+        db.session.flush()
+        for i in range(4):
+            db.session.add(Invoice(document_type='invoice', invoice_number=f"OLD-{i}", client_id=client.id,
+                                   created_by=user.id, created_at=datetime(2025, 9, 2 + i)))
+        db.session.commit()
+
+        self.assertEqual(next_monthly_sequence('invoice', datetime(2025, 9, 20)), 5)
+        self.assertEqual(next_monthly_sequence('invoice', datetime(2025, 9, 21)), 6)
+
+
+class DocumentSequenceStressTestCase(unittest.TestCase):
+    THREADS = 8
+    PER_THREAD = 25
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        # A file database so every thread gets its own connection
+        with mock.patch.object(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{self.path}"):
+            self.app = create_app('testing')
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        os.remove(self.path)
+
+    def test_concurrent_allocations_never_collide(self):
+        allocated, errors = [], []
+        start = threading.Barrier(self.THREADS)
+
+        def worker():
+            with self.app.app_context():
+                start.wait()
+                try:
+                    for _ in range(self.PER_THREAD):
+                        allocated.append(next_sequence('invoice', '2025-09'))
+                        db.session.commit()
+                except Exception as exc:  # surfaced below; a thread can't fail the test itself
+                    errors.append(exc)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        total = self.THREADS * self.PER_THREAD
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(allocated), list(range(1, total + 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
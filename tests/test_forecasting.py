@@ -0,0 +1,137 @@
+import time
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+from sqlalchemy import event
+
+from models_core import create_app, db
+from models_core.models import Client, Invoice, User
+from utils import forecasting
+from utils.forecasting import fit_revenue_model, monthly_revenue, revenue_forecast
+
+TODAY = date(2026, 1, 15)
+
+
+def seasonal_series(months, rng=None):
+    steps = np.arange(months)
+    values = 1000 + 25 * steps + 300 * np.sin(2 * np.pi * steps / 12)
+    return values + (rng.normal(0, 20, months) if rng is not None else 0)
+
+
+class FitTestCase(unittest.TestCase):
+    def test_recovers_trend_and_season(self):
+        model = fit_revenue_model(seasonal_series(60), date(2021, 1, 1))
+        self.assertAlmostEqual(model.monthly_trend, 25, places=6)
+        self.assertAlmostEqual(model.sigma, 0, places=6)
+        months, mean, lower, upper = model.predict(12)
+        self.assertEqual(months[0], date(2026, 1, 1))
+        np.testing.assert_allclose(mean, seasonal_series(72)[60:], atol=1e-6)
+
+    def test_intervals_cover_held_out_months(self):
+        rng = np.random.default_rng(18)
+        values = seasonal_series(72, rng)
+        model = fit_revenue_model(values[:60], date(2021, 1, 1))
+        _, mean, lower, upper = model.predict(12, level=0.99)
+        self.assertTrue(np.all(lower < values[60:]) and np.all(values[60:] < upper))
+        _, _, narrow_lower, narrow_upper = model.predict(12, level=0.5)
+        self.assertTrue(np.all(upper - lower > narrow_upper - narrow_lower))
+
+    def test_short_series_skip_the_season(self):
+        self.assertEqual(fit_revenue_model([100.0] * 18).harmonics, 0)
+        self.assertFalse(fit_revenue_model([100.0, 120.0]).trend)
+        _, mean, lower, upper = fit_revenue_model([100.0]).predict(2)
+        np.testing.assert_allclose((mean, lower, upper), [[100.0, 100.0]] * 3)
+
+    def test_five_years_fit_in_under_100ms(self):
+        values = seasonal_series(60, np.random.default_rng(1))
+        fit_revenue_model(values).predict(12)  # first call pays for importing scipy.stats
+        start = time.perf_counter()
+        for _ in range(10):
+            fit_revenue_model(values).predict(12)
+        self.assertLess((time.perf_counter() - start) / 10, 0.1)
+
+
+class RevenueForecastTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        forecasting._fitted.clear()
+        self.user = User(username='admin', password='x', role='admin')
+        self.client = Client(name='ACME')
+        db.session.add_all([self.user, self.client])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _invoice(self, number, created, total, status='Paid', document_type='invoice'):
+        db.session.add(Invoice(invoice_number=number, client_id=self.client.id, created_by=self.user.id,
+                               date_created=created, total_amount=total, status=status,
+                               document_type=document_type))
+
+    def test_monthly_series_groups_paid_invoices_and_fills_gaps(self):
+        self._invoice('INV-1', datetime(2025, 9, 3), Decimal('100.10'))
+        self._invoice('INV-2', datetime(2025, 9, 28), Decimal('50.00'))
+        self._invoice('INV-3', datetime(2025, 11, 1), Decimal('70.00'))
+        self._invoice('INV-4', datetime(2025, 10, 5), Decimal('999.00'), status='Pending')
+        self._invoice('QUO-1', datetime(2025, 10, 5), Decimal('999.00'), document_type='quotation')
+        self._invoice('INV-5', datetime(2026, 1, 2), Decimal('999.00'))  # current month: incomplete
+        db.session.commit()
+
+        self.assertEqual(monthly_revenue(TODAY), [
+            (date(2025, 9, 1), Decimal('150.10')),
+            (date(2025, 10, 1), Decimal('0.00')),
+            (date(2025, 11, 1), Decimal('70.00')),
+            (date(2025, 12, 1), Decimal('0.00')),
+        ])
+
+    def test_forecast_is_cached_until_invoices_change(self):
+        for n, value in enumerate(seasonal_series(36)):
+            self._invoice(f"INV-{n}", datetime(2023 + n // 12, n % 12 + 1, 10), round(value, 2))
+        db.session.commit()
+
+        with mock.patch.object(forecasting, 'monthly_revenue', wraps=forecasting.monthly_revenue) as series:
+            forecast = revenue_forecast(horizon=3, today=TODAY)
+            statements = []
+            record = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                again = revenue_forecast(horizon=6, today=TODAY)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            self.assertIs(again.model, forecast.model)
+            # A cache hit is one lookup of the invoice table's change counter
+            self.assertEqual(len(statements), 1)
+            self.assertIn('data_version', statements[0])
+            db.session.add(Client(name='Globex'))
+            db.session.commit()
+            self.assertIs(revenue_forecast(today=TODAY).model, forecast.model)
+            self.assertEqual(series.call_count, 1)
+
+            self._invoice('INV-new', datetime(2025, 12, 20), 5000)
+            db.session.commit()
+            refitted = revenue_forecast(today=TODAY)
+            self.assertEqual(series.call_count, 2)
+
+        self.assertIsNot(refitted.model, forecast.model)
+        self.assertEqual(len(forecast.history), 36)
+        self.assertEqual([point.month for point in forecast.points],
+                         [date(2026, 1, 1), date(2026, 2, 1), date(2026, 3, 1)])
+        point = forecast.points[0]
+        self.assertAlmostEqual(float(point.revenue), seasonal_series(37)[36], delta=0.01)
+        self.assertTrue(point.lower <= point.revenue <= point.upper)
+
+    def test_no_paid_invoices_means_no_forecast(self):
+        forecast = revenue_forecast(today=TODAY)
+        self.assertEqual((forecast.history, forecast.points), ([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+
+from flask import jsonify
+from sqlalchemy import event, select
+
+from models_core import create_app, db
+from models_core.data_version import data_versions
+from models_core.models import Client, Invoice, User
+from utils.http_cache import etag_cached
+
+
+class DataVersionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_commits_bump_the_tables_they_write(self):
+        self.assertEqual(data_versions('client', 'invoice'), {'client': 0, 'invoice': 0})
+        client = Client(name='ACME')
+        db.session.add_all([client, User(username='admin', password='x', role='admin')])
+        db.session.commit()
+        self.assertEqual(data_versions('client', 'invoice', 'user'), {'client': 1, 'invoice': 0, 'user': 1})
+
+        self.assertEqual(client.name, 'ACME')
+        client.name = 'ACME'  # same value: no write
+        db.session.commit()
+        client.phone = '+243 000'
+        db.session.commit()
+        db.session.delete(client)
+        db.session.commit()
+        self.assertEqual(data_versions('client'), {'client': 3})
+
+    def test_one_bump_per_transaction_at_commit(self):
+        client = Client(name='ACME')
+        db.session.add(client)
+        db.session.flush()
+        client.phone = '+243 000'
+        db.session.flush()
+        client.email = 'acme@example.com'
+        # Nothing is bumped (or locked) before the commit
+        self.assertEqual(data_versions('client'), {'client': 0})
+        db.session.commit()
+        self.assertEqual(data_versions('client'), {'client': 1})
+
+    def test_a_rolled_back_change_keeps_the_version(self):
+        db.session.add(Client(name='ACME'))
+        db.session.flush()
+        db.session.rollback()
+        db.session.add(User(username='admin', password='x', role='admin'))
+        db.session.commit()
+        self.assertEqual(data_versions('client', 'user'), {'client': 0, 'user': 1})
+
+
+class EtagCachedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.calls = []
+
+        @self.app.route('/api/clients')
+        @etag_cached('client')
+        def clients():
+            self.calls.append(1)
+            return jsonify(names=db.session.scalars(select(Client.name).order_by(Client.id)).all())
+
+        @self.app.route('/api/live')
+        @etag_cached('client', max_age=30)
+        def live():
+            return jsonify(ok=True), 202
+
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(Client(name='ACME'))
+        db.session.commit()
+        self.http = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_unchanged_data_answers_304_without_running_the_view(self):
+        first = self.http.get('/api/clients')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers['Cache-Control'], 'private, no-cache')
+        etag = first.headers['ETag']
+
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            again = self.http.get('/api/clients', headers={'If-None-Match': etag})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual((again.status_code, again.data, again.headers['ETag']), (304, b'', etag))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(len(statements), 1)
+        self.assertIn('data_version', statements[0])
+
+    def test_a_write_changes_the_etag(self):
+        etag = self.http.get('/api/clients').headers['ETag']
+        db.session.add(Client(name='Globex'))
+        db.session.commit()
+
+        fresh = self.http.get('/api/clients', headers={'If-None-Match': etag})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.json['names'], ['ACME', 'Globex'])
+        self.assertNotEqual(fresh.headers['ETag'], etag)
+        # Writes to other tables leave it alone
+        db.session.add(User(username='admin', password='x', role='admin'))
+        db.session.commit()
+        db.session.add(Invoice(invoice_number='INV-1', client_id=1, created_by=1))
+        db.session.commit()
+        self.assertEqual(self.http.get('/api/clients', headers={'If-None-Match': fresh.headers['ETag']}).status_code,
+                         304)
+
+    def test_only_ok_responses_are_tagged(self):
+        response = self.http.get('/api/live')
+        self.assertEqual(response.status_code, 202)
+        self.assertNotIn('ETag', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from sqlalchemy import event
+
+from models_core import create_app, db
+from models_core.models import OurProductService
+from utils.inventory_alerts import StockAlert, inventory_alerts
+
+
+class InventoryAlertsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _add(self, *items):
+        db.session.add_all(OurProductService(name=name, quantity_on_hand=quantity, reorder_point=reorder)
+                           for name, quantity, reorder in items)
+        db.session.commit()
+
+    def test_sets_match_the_stock_rules(self):
+        self._add(('Pump', 0, 5), ('Valve', 3, 5), ('Hose', 5, 5), ('Seal', 6, 5),
+                  ('Gauge', 2, None), ('Filter', None, 5), ('Belt', 0, None), ('Gasket', 1, 0))
+        alerts = inventory_alerts()
+
+        self.assertEqual((alerts.low_stock_count, alerts.out_of_stock_count), (2, 2))
+        self.assertEqual([item.name for item in alerts.low_stock], ['Valve', 'Hose'])
+        self.assertEqual([item.name for item in alerts.out_of_stock], ['Belt', 'Pump'])
+        self.assertIsInstance(alerts.low_stock[0], StockAlert)
+        self.assertEqual(alerts.low_stock[0][1:], ('Valve', 3, 5))
+
+    def test_lists_are_capped_but_counts_are_exact(self):
+        self._add(*[(f"SKU {n:02d}", n % 4, 3) for n in range(40)])
+        alerts = inventory_alerts(limit=5)
+
+        self.assertEqual((alerts.low_stock_count, alerts.out_of_stock_count), (30, 10))
+        self.assertEqual([item.quantity_on_hand for item in alerts.low_stock], [1] * 5)
+        self.assertEqual([item.name for item in alerts.out_of_stock], [f"SKU {n:02d}" for n in range(0, 20, 4)])
+
+    def test_three_queries_whatever_the_catalogue_size(self):
+        self._add(*[(f"SKU {n}", n % 7, 3) for n in range(500)])
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            inventory_alerts()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from decimal import Decimal
+
+from models_core import create_app, db
+from models_core.models import Client, Invoice, User
+from utils.invoice_stats import client_revenue, invoice_kpis
+
+
+class InvoiceStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        user = User(username='admin', password='x', role='admin')
+        self.acme, self.globex = Client(name='ACME'), Client(name='Globex')
+        db.session.add_all([user, self.acme, self.globex])
+        db.session.flush()
+        rows = [
+            ('invoice', 'Paid', self.acme, 100.1, 16.0),
+            ('invoice', 'Paid', self.globex, 300.2, 48.0),
+            ('invoice', 'Pending', self.acme, 50.0, 8.0),
+            ('proforma', 'Pending', self.acme, 70.0, 0.0),
+            ('delivery_note', 'Pending', self.acme, 0.0, 0.0),
+            ('invoice', 'Disputed', self.acme, 10.0, 1.0),
+        ]
+        for i, (document_type, status, client, total, vat) in enumerate(rows):
+            db.session.add(Invoice(
+                document_type=document_type, invoice_number=f"T-{i}", client_id=client.id,
+                created_by=user.id, status=status, total_amount=total, vat_amount=vat,
+            ))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_matrix_matches_per_filter_queries(self):
+        kpis = invoice_kpis()
+        for document_type in ('invoice', 'proforma', 'delivery_note'):
+            for status in ('Pending', 'Paid'):
+                expected = Invoice.query.filter_by(document_type=document_type, status=status).count()
+                self.assertEqual(kpis.count(document_type, status), expected)
+        self.assertEqual(kpis.count('invoice'), 4)
+        self.assertEqual(kpis.count('invoice', 'Other'), 1)
+        # 100.1 + 300.2 is 400.29999999999995 in floats
+        self.assertEqual(kpis.total('invoice', 'Paid'), Decimal('400.30'))
+        self.assertEqual(kpis.vat(status='Paid'), Decimal('64.00'))
+        self.assertEqual(kpis.average('invoice'), Decimal('115.08'))
+        self.assertEqual(kpis.total('invoice', 'Other'), Decimal('10.00'))
+
+    def test_criteria_and_client_ranking(self):
+        self.assertEqual(invoice_kpis(Invoice.client_id == self.globex.id).count(), 1)
+        ranking = client_revenue(limit=5)
+        self.assertEqual([row.name for row in ranking], ['Globex', 'ACME'])
+        self.assertEqual(ranking[0].amount, Decimal('300.20'))
+
+
+if __name__ == '__main__':
+    unittest.main()
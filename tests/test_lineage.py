@@ -0,0 +1,154 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import IntegrityError
+
+from models_core import create_app, db, lineage
+from models_core.config import TestingConfig
+from models_core.lineage import is_current_version, latest_version, save_new_version, version_history
+from models_core.migrations import backfill_invoice_roots, create_missing_indexes
+from models_core.models import Client, Invoice, InvoiceItem, User
+
+
+def add_original(number='INV-1'):
+    user = db.session.scalar(select(User)) or User(username='admin', password='x', role='admin')
+    client = db.session.scalar(select(Client)) or Client(name='ACME')
+    db.session.add_all([user, client])
+    db.session.flush()
+    invoice = Invoice(invoice_number=number, client_id=client.id, created_by=user.id)
+    db.session.add(invoice)
+    db.session.commit()
+    return invoice
+
+
+def new_version(original):
+    invoice = Invoice(client_id=original.client_id, created_by=original.created_by, parent_id=original.id)
+    invoice.items.append(InvoiceItem(description='Pump', quantity=1, created_by=original.created_by))
+    return save_new_version(invoice, original.id, original.invoice_number)
+
+
+class LineageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_chain_queries(self):
+        first, other = add_original('INV-1'), add_original('INV-2')
+        self.assertEqual((first.root_id, first.version), (first.id, 1))
+        second = new_version(first)
+        third = new_version(first)
+        db.session.commit()
+
+        self.assertEqual((third.root_id, third.version, third.invoice_number), (first.id, 3, 'INV-1-v3'))
+        self.assertEqual(latest_version(first.id), third)
+        self.assertEqual(version_history(first.id), [first, second, third])
+        current = db.session.scalars(select(Invoice).where(is_current_version()).order_by(Invoice.id)).all()
+        self.assertEqual(current, [other, third])
+
+    def test_a_taken_version_is_retried_with_the_next_number(self):
+        original = add_original()
+        new_version(original)
+        db.session.commit()
+
+        # Another edit read max(version) before this one committed: it first tries v2 again
+        stale = iter([2])
+        real = lineage.next_version
+        with mock.patch.object(lineage, 'next_version', side_effect=lambda root_id: next(stale, None) or real(root_id)):
+            retried = new_version(original)
+        db.session.commit()
+
+        self.assertEqual((retried.version, retried.invoice_number), (3, 'INV-1-v3'))
+        self.assertEqual(len(retried.items), 1)
+        self.assertEqual([invoice.version for invoice in version_history(original.id)], [1, 2, 3])
+
+    def test_the_unique_index_rejects_a_duplicate_version(self):
+        original = add_original()
+        db.session.add(Invoice(invoice_number='INV-1-v1', client_id=original.client_id,
+                               created_by=original.created_by, root_id=original.id, version=1))
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+
+    def test_backfill_existing_rows(self):
+        root = add_original()
+        child = Invoice(invoice_number='INV-1-v2', client_id=root.client_id, created_by=root.created_by,
+                        parent_id=root.id, version=2, root_id=root.id)
+        db.session.add(child)
+        db.session.commit()
+        # A database from before the lineage: no root_id, no unique index, a version taken twice
+        db.session.execute(text("DROP INDEX ix_invoice_root_id_version"))
+        db.session.execute(text("UPDATE invoice SET root_id = NULL"))
+        db.session.execute(text(
+            "INSERT INTO invoice (document_type, invoice_number, client_id, created_by, created_at, version, parent_id) "
+            "VALUES ('invoice', 'INV-1-v2', :client, :user, CURRENT_TIMESTAMP, 2, :root)"
+        ), {'client': root.client_id, 'user': root.created_by, 'root': root.id})
+        db.session.commit()
+
+        self.assertEqual(backfill_invoice_roots(), ['invoice.root_id (3 rows, 1 versions renumbered)'])
+        self.assertEqual(backfill_invoice_roots(), [])
+        self.assertEqual(create_missing_indexes(), ['ix_invoice_root_id_version'])
+
+        rows = db.session.execute(select(Invoice.id, Invoice.root_id, Invoice.version).order_by(Invoice.id)).all()
+        self.assertEqual([tuple(row) for row in rows], [(1, 1, 1), (2, 1, 2), (3, 1, 3)])
+
+
+class ConcurrentEditTestCase(unittest.TestCase):
+    THREADS = 6
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        # A file database so every thread gets its own connection
+        with mock.patch.object(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{self.path}"):
+            self.app = create_app('testing')
+        with self.app.app_context():
+            db.create_all()
+            self.root_id = add_original().id
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        os.remove(self.path)
+
+    def test_simultaneous_edits_never_share_a_version(self):
+        claimed, errors = [], []
+        start = threading.Barrier(self.THREADS)
+
+        def edit():
+            with self.app.app_context():
+                start.wait()
+                try:
+                    invoice = new_version(db.session.get(Invoice, self.root_id))
+                    db.session.commit()
+                    claimed.append(invoice.version)
+                except Exception as exc:  # surfaced below; a thread can't fail the test itself
+                    errors.append(exc)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=edit) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(claimed), list(range(2, self.THREADS + 2)))
+        with self.app.app_context():
+            indexes = {ix['name']: ix['unique'] for ix in inspect(db.engine).get_indexes('invoice')}
+            self.assertTrue(indexes['ix_invoice_root_id_version'])
+
+
+if __name__ == '__main__':
+    unittest.main()
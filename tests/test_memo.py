@@ -0,0 +1,75 @@
+import unittest
+
+from models_core import create_app, db
+from models_core.models import Client
+from utils.memo import MemoCache, cache_stats, invalidate, memoize
+
+
+class MemoCacheTestCase(unittest.TestCase):
+    def test_entries_expire_after_the_ttl(self):
+        cache = MemoCache('test', ttl=10, maxsize=4)
+        cache.put('a', [1, 2], now=100)
+        self.assertEqual(cache.get('a', now=109), (True, [1, 2]))
+        self.assertEqual(cache.get('a', now=110), (False, None))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['expirations'], stats['entries'], stats['bytes']),
+                         (1, 1, 1, 0, 0))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = MemoCache('test', ttl=60, maxsize=2)
+        cache.put('a', 'A', now=0)
+        cache.put('b', 'B', now=0)
+        cache.get('a', now=1)
+        cache.put('c', 'C', now=2)
+        self.assertEqual([cache.get(key, now=3)[0] for key in 'abc'], [True, False, True])
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_size_accounting_follows_replacements(self):
+        cache = MemoCache('test', ttl=60, maxsize=2)
+        cache.put('a', 'x' * 1000)
+        big = cache.stats()['bytes']
+        self.assertGreater(big, 1000)
+        cache.put('a', 'x')
+        self.assertLess(cache.stats()['bytes'], big)
+        cache.clear()
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+
+class MemoizeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        @memoize(ttl=60, maxsize=8, tags=('client',))
+        def client_names(prefix=''):
+            return tuple(c.name for c in Client.query.order_by(Client.name) if c.name.startswith(prefix))
+        self.client_names = client_names
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_results_are_reused_until_invalidated(self):
+        db.session.add(Client(name='ACME'))
+        db.session.commit()
+        self.assertEqual(self.client_names(), ('ACME',))
+
+        db.session.add(Client(name='Globex'))
+        db.session.commit()
+        self.assertEqual(self.client_names(), ('ACME',))
+        self.assertEqual(self.client_names(prefix='G'), ('Globex',))
+
+        invalidate('supplier')
+        self.assertEqual(self.client_names(), ('ACME',))
+        invalidate('client')
+        self.assertEqual(self.client_names(), ('ACME', 'Globex'))
+
+        stats = cache_stats()[self.client_names.cache.name]
+        self.assertEqual((stats['hits'], stats['misses'], stats['invalidations']), (2, 3, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import func, inspect, select, text
+
+from models_core import create_app, db
+from models_core.migrations import convert_money_columns
+from models_core.models import Bid, Client, Invoice, InvoiceItem, User
+from models_core.money import Money, to_money
+
+
+class MoneyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.user = User(username='admin', password='x', role='admin')
+        self.client = Client(name='ACME')
+        db.session.add_all([self.user, self.client])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _invoice(self, number, total, status='Paid'):
+        invoice = Invoice(invoice_number=number, client_id=self.client.id, created_by=self.user.id,
+                          total_amount=total, status=status)
+        db.session.add(invoice)
+        return invoice
+
+    def test_to_money_rounds_half_up_to_cents(self):
+        self.assertEqual(to_money('2.675'), Decimal('2.68'))
+        self.assertEqual(to_money(0.1), Decimal('0.10'))
+        self.assertEqual(to_money(None), Decimal('0.00'))
+        self.assertIsNone(to_money('abc', default=None))
+
+    def test_amounts_are_stored_as_minor_units_and_sum_exactly(self):
+        for n in range(10):
+            self._invoice(f"INV-{n}", 0.1)
+        db.session.commit()
+
+        self.assertEqual(db.session.scalars(text("SELECT DISTINCT total_amount FROM invoice")).all(), [10])
+        total = db.session.scalar(select(func.sum(Invoice.total_amount)))
+        self.assertEqual(total, Decimal('1.00'))
+        self.assertIsInstance(db.session.scalar(select(Invoice.total_amount)), Decimal)
+
+    def test_comparisons_bind_minor_units_and_factors_stay_plain(self):
+        self._invoice('INV-1', Decimal('99.99'))
+        self._invoice('INV-2', Decimal('100.01'))
+        db.session.add(Bid(item_description='Pump', our_bid_price=Decimal('100.00')))
+        db.session.commit()
+
+        self.assertEqual(db.session.scalars(select(Invoice.invoice_number).where(Invoice.total_amount > 100)).all(),
+                         ['INV-2'])
+        self.assertEqual(db.session.scalar(select(Bid.id).where(Bid.our_bid_price * 1.15 > Decimal('114.99'))), 1)
+        self.assertIsNone(db.session.scalar(select(Bid.id).where(Bid.our_bid_price * 1.15 > 115.01)))
+        self.assertEqual(db.session.scalar(select(Bid.our_bid_price * 1.15)), Decimal('115.00'))
+        self.assertEqual(db.session.scalar(select(func.avg(Invoice.total_amount, type_=Money))), Decimal('100.00'))
+
+    def test_legacy_float_columns_are_converted_once(self):
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE invoice_item")
+            conn.exec_driver_sql(
+                "CREATE TABLE invoice_item (id INTEGER NOT NULL, description VARCHAR(200) NOT NULL, "
+                "quantity INTEGER NOT NULL, created_by INTEGER NOT NULL, unit_price FLOAT, total_price FLOAT, "
+                "comment TEXT, invoice_id INTEGER NOT NULL, PRIMARY KEY (id))"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO invoice_item VALUES (1, 'Pump', 3, 1, 19.99, 59.97, NULL, 1), "
+                "(2, 'Note', 1, 1, NULL, NULL, 'no price', 1)"
+            )
+
+        self.assertEqual(convert_money_columns(), ['invoice_item.unit_price', 'invoice_item.total_price'])
+        self.assertEqual(convert_money_columns(), [])
+
+        types = {col['name']: str(col['type']) for col in inspect(db.engine).get_columns('invoice_item')}
+        self.assertEqual((types['unit_price'], types['total_price'], types['description']),
+                         ('BIGINT', 'BIGINT', 'VARCHAR(200)'))
+        rows = db.session.execute(select(InvoiceItem.unit_price, InvoiceItem.total_price, InvoiceItem.comment)
+                                  .order_by(InvoiceItem.id)).all()
+        self.assertEqual(rows, [(Decimal('19.99'), Decimal('59.97'), None), (None, None, 'no price')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+from sqlalchemy import event
+
+from models_core import create_app, db
+from models_core.migrations import create_missing_indexes
+from models_core.models import Client
+from utils.pagination import decode_cursor, keyset_paginate, paginate_request
+
+
+class KeysetPaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        # Duplicate names make sure the id tie-breaker keeps pages stable
+        db.session.add_all([Client(name=f"Client {i % 7:02d}") for i in range(30)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _walk(self, direction):
+        seen, page = [], keyset_paginate(Client.query, Client.name, Client.id, direction, per_page=8)
+        while True:
+            seen.extend(c.id for c in page.items)
+            if not page.has_next:
+                return seen, page
+            page = keyset_paginate(Client.query, Client.name, Client.id, direction, per_page=8,
+                                   after=page.next_cursor)
+
+    def test_forward_walk_matches_offset_order(self):
+        for direction, order in (('asc', (Client.name, Client.id)),
+                                 ('desc', (Client.name.desc(), Client.id.desc()))):
+            seen, last = self._walk(direction)
+            self.assertEqual(seen, [c.id for c in Client.query.order_by(*order)])
+            self.assertEqual(len(last.items), 6)
+            self.assertTrue(last.has_prev)
+
+    def test_prev_cursor_returns_previous_page(self):
+        first = keyset_paginate(Client.query, Client.name, Client.id, per_page=8)
+        second = keyset_paginate(Client.query, Client.name, Client.id, per_page=8, after=first.next_cursor)
+        back = keyset_paginate(Client.query, Client.name, Client.id, per_page=8, before=second.prev_cursor)
+
+        self.assertFalse(first.has_prev)
+        self.assertEqual([c.id for c in back.items], [c.id for c in first.items])
+        self.assertFalse(back.has_prev)
+        self.assertTrue(back.has_next)
+
+    def test_deep_page_is_a_single_bounded_query(self):
+        _, last = self._walk('asc')
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            keyset_paginate(Client.query, Client.name, Client.id, per_page=8, before=last.prev_cursor)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        self.assertEqual(len(statements), 1)
+        # Seeks straight to the page instead of skipping the earlier rows
+        self.assertIn('WHERE (client.name, client.id) <', statements[0])
+
+    def test_request_args_sort_filter_and_bad_cursor(self):
+        url = '/clients?sort=bogus&dir=desc&per_page=5&q=Client 03&after=not-a-cursor'
+        with self.app.test_request_context(url):
+            page = paginate_request(Client.query.filter(Client.name == 'Client 03'),
+                                    {'name': Client.name}, 'name')
+        self.assertEqual(page.sort, 'name')
+        self.assertEqual(page.direction, 'desc')
+        self.assertEqual(len(page.items), 4)
+        self.assertFalse(page.has_prev)
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        self.assertEqual(page.link_args(after='x'),
+                         {'q': 'Client 03', 'sort': 'name', 'dir': 'desc', 'per_page': 5, 'after': 'x'})
+
+    def test_missing_indexes_are_created(self):
+        db.session.execute(db.text('DROP INDEX ix_client_name_id'))
+        db.session.commit()
+        self.assertEqual(create_missing_indexes(), ['ix_client_name_id'])
+        self.assertEqual(create_missing_indexes(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
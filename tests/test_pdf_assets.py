@@ -0,0 +1,65 @@
+import os
+import shutil
+import unittest
+
+from PIL import Image
+
+from models_core import create_app, db
+from models_core.models import get_or_create_company_settings
+from utils.pdf_assets import asset_cache
+from utils.pdf_generator import generate_invoice_pdf
+
+ASSET_DIR = 'test_pdf_assets'
+
+
+class PdfAssetCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.dir = os.path.join(self.app.static_folder, 'uploads', ASSET_DIR)
+        os.makedirs(self.dir, exist_ok=True)
+        for name, mode in (('logo.png', 'RGBA'), ('signature.png', 'RGBA'), ('stamp.png', 'RGB')):
+            Image.new(mode, (40, 20), (200, 30, 30)).save(os.path.join(self.dir, name))
+        asset_cache.invalidate()
+        asset_cache.hits = asset_cache.loads = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+        asset_cache.invalidate()
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_hundred_renders_decode_each_asset_once(self):
+        settings = get_or_create_company_settings()
+        settings.logo_image_path = f"{ASSET_DIR}/logo.png"
+        settings.signature_image_path = f"{ASSET_DIR}/signature.png"
+        settings.stamp_image_path = f"{ASSET_DIR}/stamp.png"
+        db.session.commit()
+        form_data = {'doc_number': 'T-1', 'items': [{'description': 'Widget', 'quantity': 1, 'unit_price': 5}]}
+
+        for _ in range(100):
+            pdf = generate_invoice_pdf(form_data, save_to_disk=False)
+
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertEqual(asset_cache.loads, 3)
+        self.assertEqual(asset_cache.hits, 297)
+
+    def test_rewritten_file_is_reloaded(self):
+        path = os.path.join(self.dir, 'logo.png')
+        first = asset_cache.get_image(path)
+        self.assertIs(asset_cache.get_image(path), first)
+
+        Image.new('RGB', (80, 20)).save(path)
+        second = asset_cache.get_image(path)
+
+        self.assertIsNot(second, first)
+        self.assertEqual(second.getSize(), (80, 20))
+        os.remove(path)
+        self.assertIsNone(asset_cache.get_image(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
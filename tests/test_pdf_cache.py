@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from models_core import create_app, db
+from models_core.models import get_or_create_company_settings
+from utils.pdf_cache import RenderCache, get_render_cache
+from utils.pdf_generator import generate_invoice_pdf
+
+
+def form_data(doc_number='TEST-PC-001', unit_price=10.0):
+    return {
+        'doc_number': doc_number, 'client_name': 'ACME', 'client_address': 'Kinshasa',
+        'issue_date': '2025-09-01', 'due_date': '2025-10-01', 'po_number': 'N/A', 'vat_rate': 16.0,
+        'items': [{'description': 'Widget', 'quantity': 2, 'unit_price': unit_price, 'comment': ''}],
+    }
+
+
+class PdfRenderCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.app = create_app('testing')
+        self.app.config.update(PDF_CACHE_ENABLED=True, PDF_CACHE_DIR=self.dir)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.cache = get_render_cache()
+        self.written = []
+
+    def tearDown(self):
+        for doc_number in self.written:
+            path = os.path.join(self.app.static_folder, 'generated_pdfs', f"{doc_number}.pdf")
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(self.dir, ignore_errors=True)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_repeat_render_is_a_hit(self):
+        first = generate_invoice_pdf(form_data(), save_to_disk=False)
+        second = generate_invoice_pdf(form_data(), save_to_disk=False)
+
+        self.assertEqual(second, first)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_equivalent_numbers_share_a_key(self):
+        key = RenderCache.key_for(form_data(unit_price=10), 'invoice', False, None)
+        self.assertEqual(RenderCache.key_for(form_data(unit_price=Decimal('10.00')), 'invoice', False, None), key)
+        self.assertNotEqual(RenderCache.key_for(form_data(unit_price=10), 'invoice', True, None), key)
+        self.assertNotEqual(RenderCache.key_for(form_data(unit_price=10), 'quotation', False, None), key)
+
+    def test_input_or_settings_change_misses(self):
+        generate_invoice_pdf(form_data(), save_to_disk=False)
+        generate_invoice_pdf(form_data(unit_price=11.0), save_to_disk=False)
+        settings = get_or_create_company_settings()
+        settings.phone = '+243 000'
+        db.session.commit()
+        generate_invoice_pdf(form_data(), save_to_disk=False)
+
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 3))
+
+    def test_identical_pdfs_are_stored_once_and_linked(self):
+        self.written.append('TEST-PC-002')
+        data = form_data('TEST-PC-002')
+        generate_invoice_pdf(data, save_to_disk=False)
+        # save_to_disk is not part of the key: the saved file is the cached object
+        rel_path = generate_invoice_pdf(data)
+
+        path = os.path.join(self.app.static_folder, rel_path)
+        self.assertEqual(self.cache.stats()['objects'], 1)
+        self.assertGreater(os.stat(path).st_nlink, 1)
+
+        self.cache.put('another-key', open(path, 'rb').read())
+        self.assertEqual(self.cache.stats()['objects'], 1)
+
+    def test_lru_eviction_keeps_budget(self):
+        cache = RenderCache(os.path.join(self.dir, 'small'), max_bytes=3500)
+        for n in range(3):
+            cache.put(f"key-{n}", bytes([n]) * 1000)
+            os.utime(cache._lookup(f"key-{n}"), ns=(n * 10**9, n * 10**9))
+        cache.get('key-0')  # touched: now the most recent
+
+        cache.put('key-3', b'\x03' * 1000)
+
+        self.assertLessEqual(cache.stats()['bytes'], 3500)
+        self.assertIsNotNone(cache.get('key-0'))
+        self.assertIsNone(cache.get('key-1'))
+        self.assertIsNotNone(cache.get('key-3'))
+
+    def test_puts_under_budget_do_not_walk_the_cache(self):
+        cache = RenderCache(os.path.join(self.dir, 'walks'), max_bytes=10_000)
+        cache.put('key-0', b'\x00' * 1000)  # first put in the process: one walk to learn the size
+        with mock.patch('utils.pdf_cache.os.walk', wraps=os.walk) as walk:
+            for n in range(1, 8):
+                cache.put(f"key-{n}", bytes([n]) * 1000)
+            self.assertEqual(walk.call_count, 0)
+            cache.put('key-8', b'\x08' * 3000)  # over budget: walk and evict
+            self.assertEqual(walk.call_count, 2)
+        self.assertLessEqual(cache.stats()['bytes'], 9000)
+
+    def test_eviction_removes_key_files_and_spares_linked_objects(self):
+        cache = RenderCache(os.path.join(self.dir, 'keys'), max_bytes=2600)
+        cache.put('key-0', b'\x00' * 1000)
+        cache.put('key-0b', b'\x00' * 1000)  # same object, second key
+        os.utime(cache._lookup('key-0'), ns=(0, 0))
+        saved = os.path.join(self.dir, 'saved.pdf')
+        self.assertTrue(cache.link('key-0', saved))  # oldest, but a saved document shares its disk blocks
+        cache.put('key-1', b'\x01' * 1000)
+        os.utime(cache._lookup('key-1'), ns=(10**9, 10**9))
+        cache.put('key-2', b'\x02' * 1000)
+        cache.put('key-3', b'\x03' * 1000)
+
+        self.assertIsNotNone(cache.get('key-0'))
+        self.assertIsNone(cache.get('key-1'))
+        self.assertFalse(os.path.exists(cache._key_path('key-1')))
+        stats = cache.stats()
+        self.assertEqual((stats['objects'], stats['linked'], stats['keys']), (3, 1, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
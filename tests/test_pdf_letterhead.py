@@ -0,0 +1,52 @@
+import re
+import unittest
+
+import utils.pdf_generator as pdf_generator
+from models_core import create_app, db
+from models_core.models import get_or_create_company_settings
+
+PAGE = re.compile(rb'/Type /Page\b(?!s)')
+
+
+class PdfLetterheadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.form_data = {
+            'doc_number': 'T-1',
+            'items': [{'description': f"Item {i}", 'quantity': 1, 'unit_price': 2} for i in range(90)],
+        }
+
+    def tearDown(self):
+        pdf_generator.USE_PAGE_FORMS = True
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_pages_stamp_shared_forms(self):
+        pdf = pdf_generator.generate_invoice_pdf(self.form_data, save_to_disk=False)
+        pdf_generator.USE_PAGE_FORMS = False
+        redrawn = pdf_generator.generate_invoice_pdf(self.form_data, save_to_disk=False)
+
+        pages = len(PAGE.findall(pdf))
+        self.assertGreater(pages, 1)
+        self.assertEqual(len(PAGE.findall(redrawn)), pages)
+        # Two forms (letterhead, table header) no matter how many pages
+        self.assertEqual(pdf.count(b'/Subtype /Form'), 2)
+        self.assertEqual(redrawn.count(b'/Subtype /Form'), 0)
+
+    def test_letterhead_is_cached_per_settings_version(self):
+        settings = get_or_create_company_settings()
+        first = pdf_generator.letterhead_for(settings)
+        self.assertIs(pdf_generator.letterhead_for(settings), first)
+
+        settings.phone = '+243 000'
+        changed = pdf_generator.letterhead_for(settings)
+        self.assertIsNot(changed, first)
+        self.assertIn('📞 +243 000', changed.contact_lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import random
+import unittest
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+from utils.pricing import price_lines, to_cents
+
+
+class PricingTestCase(unittest.TestCase):
+    def test_line_and_document_totals(self):
+        priced = price_lines([3, 1], ['19.99', Decimal('5')], vat_rate=16)
+
+        self.assertEqual(list(priced.lines()), [(3, Decimal('19.99'), Decimal('59.97')),
+                                                (1, Decimal('5.00'), Decimal('5.00'))])
+        self.assertEqual((priced.subtotal, priced.vat_amount, priced.total_amount),
+                         (Decimal('64.97'), Decimal('10.40'), Decimal('75.37')))
+
+    def test_vat_is_rounded_once_half_up(self):
+        # 16% of 0.50 is exactly 0.08; 16.5% of 0.10 is 0.0165
+        self.assertEqual(price_lines([1], ['0.50'], 16).vat_amount, Decimal('0.08'))
+        self.assertEqual(price_lines([1], ['0.10'], Decimal('16.5')).vat_amount, Decimal('0.02'))
+        self.assertEqual(price_lines([1, 1, 1], ['0.03', '0.03', '0.04'], 5).vat_amount, Decimal('0.01'))
+
+    def test_inputs_are_normalized_to_whole_units_and_cents(self):
+        self.assertEqual(to_cents(['0.125', None, '', 2.675, Decimal('1.005')]).tolist(), [13, 0, 0, 268, 101])
+        self.assertEqual(to_cents(np.array([19.99, 0.1])).tolist(), [1999, 10])
+        priced = price_lines([Decimal('2.9'), '4'], [1, 1])
+        self.assertEqual(priced.quantities.tolist(), [2, 4])
+        self.assertEqual(priced.subtotal, Decimal('6.00'))
+
+    def test_matches_a_decimal_reference_on_large_invoices(self):
+        rng = random.Random(17)
+        quantities = [rng.randint(1, 500) for _ in range(5000)]
+        prices = [Decimal(rng.randint(0, 10_000_000)) / 100 for _ in range(5000)]
+
+        priced = price_lines(quantities, prices, Decimal('16'))
+
+        subtotal = sum((q * p for q, p in zip(quantities, prices)), Decimal('0.00'))
+        vat = (subtotal * Decimal('0.16')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        self.assertEqual((priced.subtotal, priced.vat_amount, priced.total_amount), (subtotal, vat, subtotal + vat))
+        self.assertEqual([line[2] for line in priced.lines()], [q * p for q, p in zip(quantities, prices)])
+
+    def test_empty_and_mismatched_batches(self):
+        self.assertEqual(price_lines([], [], 16).total_amount, Decimal('0.00'))
+        with self.assertRaises(ValueError):
+            price_lines([1, 2], ['1.00'])
+
+
+if __name__ == '__main__':
+    unittest.main()
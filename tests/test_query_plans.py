@@ -0,0 +1,183 @@
+"""
+Query-plan regression tests: each hot query must be served by the index that
+was added for it. Runs on SQLite; set TEST_POSTGRES_URL to also check the
+PostgreSQL plans (EXPLAIN (FORMAT JSON) with sequential scans disabled).
+"""
+import json
+import os
+import random
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from sqlalchemy import and_, func, select
+
+from models_core import create_app, db
+from models_core.config import TestingConfig
+from models_core.lineage import is_current_version
+from models_core.migrations import refresh_planner_statistics
+from models_core.models import (
+    Bid, Client, CompetitorBid, Invoice, InvoiceItem, OurProductService, ProcurementItem, User,
+)
+from utils.inventory_alerts import LOW_STOCK, OUT_OF_STOCK
+
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+SINCE = datetime(2025, 1, 1)
+
+
+def hot_queries():
+    """(name, statement, index expected in its plan) for the queries the app runs most."""
+    ranked = select(
+        CompetitorBid.bid_id,
+        CompetitorBid.bid_price,
+        func.row_number().over(partition_by=CompetitorBid.bid_id,
+                               order_by=(CompetitorBid.bid_price, CompetitorBid.id)).label('price_rank'),
+    ).subquery()
+    return [
+        ('paid revenue since', select(func.sum(Invoice.total_amount)).where(
+            Invoice.status == 'Paid', Invoice.document_type == 'invoice', Invoice.date_created >= SINCE),
+         'ix_invoice_status_type_date_created'),
+        ('recent documents', select(Invoice.id).order_by(Invoice.date_created.desc()).limit(10),
+         'ix_invoice_date_created'),
+        ('recent invoices', select(Invoice.id).where(Invoice.document_type == 'invoice')
+         .order_by(Invoice.date_created.desc()).limit(10),
+         'ix_invoice_type_date_created'),
+        ('sequence seed', select(func.count(Invoice.id)).where(
+            Invoice.document_type == 'quotation', Invoice.created_at >= SINCE),
+         'ix_invoice_type_created_at'),
+        ('client documents', select(Invoice.id).where(Invoice.client_id == 3), 'ix_invoice_client_id'),
+        ('export by issue date', select(Invoice.id).where(
+            Invoice.issue_date >= date(2025, 3, 1), Invoice.issue_date <= date(2025, 3, 7))
+         .order_by(Invoice.issue_date, Invoice.id),
+         'ix_invoice_issue_date_id'),
+        ('version chain', select(Invoice.id).where(
+            (Invoice.parent_id == 5) | (Invoice.id == 5), Invoice.document_type == 'invoice'),
+         'ix_invoice_parent_id_type_version'),
+        ('latest version', select(Invoice.id).where(Invoice.root_id == 5).order_by(Invoice.version.desc()).limit(1),
+         'ix_invoice_root_id_version'),
+        ('current versions only', select(Invoice.id).where(Invoice.client_id == 3, is_current_version()),
+         'ix_invoice_root_id_version'),
+        ('pending by due date', select(Invoice.id).where(
+            Invoice.status == 'Pending', Invoice.document_type == 'invoice').order_by(Invoice.due_date).limit(5),
+         'ix_invoice_pending_due_date'),
+        ('document items', select(InvoiceItem.id).where(InvoiceItem.invoice_id == 7), 'ix_invoice_item_invoice_id'),
+        ('lowest competitor per bid', select(Bid.id, ranked.c.bid_price).join(
+            ranked, and_(ranked.c.bid_id == Bid.id, ranked.c.price_rank == 1)),
+         'ix_competitor_bid_bid_id_price'),
+        ('top competitors', select(CompetitorBid.competitor_name, func.count(CompetitorBid.id))
+         .group_by(CompetitorBid.competitor_name),
+         'ix_competitor_bid_competitor_name'),
+        ('yearly procurement spend', select(func.sum(ProcurementItem.total_cost)).where(
+            ProcurementItem.purchase_date >= datetime(2025, 10, 1)),
+         'ix_procurement_item_purchase_date'),
+        ('bids by status and currency', select(Bid.id).where(
+            Bid.status == 'Won', Bid.currency == 'EUR', Bid.id > 10).order_by(Bid.id).limit(20),
+         'ix_bid_status_currency_id'),
+        ('bids by currency', select(Bid.id).where(Bid.currency == 'EUR', Bid.id > 10).order_by(Bid.id).limit(20),
+         'ix_bid_currency_id'),
+        ('low stock count', select(func.count()).select_from(OurProductService).where(LOW_STOCK),
+         'ix_our_product_service_low_stock'),
+        ('most urgent low stock', select(OurProductService.name).where(LOW_STOCK)
+         .order_by(OurProductService.quantity_on_hand, OurProductService.name, OurProductService.id).limit(10),
+         'ix_our_product_service_low_stock'),
+        ('out of stock', select(OurProductService.name).where(OUT_OF_STOCK)
+         .order_by(OurProductService.name, OurProductService.id).limit(10),
+         'ix_our_product_service_out_of_stock'),
+    ]
+
+
+def seed(rng):
+    """A few thousand rows with a production-like mix (mostly paid invoices, few pending)."""
+    user = User(username='admin', password='x', role='admin')
+    clients = [Client(name=f"Client {n}") for n in range(30)]
+    db.session.add(user)
+    db.session.add_all(clients)
+    db.session.commit()
+    db.session.execute(Invoice.__table__.insert(), [dict(
+        document_type=rng.choice(['invoice'] * 6 + ['quotation', 'proforma', 'delivery_note']),
+        invoice_number=f"DOC-{n}",
+        client_id=rng.choice(clients).id,
+        date_created=SINCE + timedelta(hours=n),
+        created_at=SINCE + timedelta(hours=n),
+        issue_date=(SINCE + timedelta(hours=n)).date(),
+        due_date=(SINCE + timedelta(hours=n, days=30)).date(),
+        status=rng.choice(['Paid'] * 8 + ['Pending', 'Cancelled']),
+        total_amount=rng.uniform(10, 1000),
+        created_by=user.id,
+        version=1,
+        root_id=n + 1,
+    ) for n in range(4000)])
+    db.session.execute(InvoiceItem.__table__.insert(), [dict(
+        description='Item', quantity=1, unit_price=1.0, total_price=1.0, created_by=user.id, invoice_id=n // 2 + 1,
+    ) for n in range(8000)])
+    db.session.execute(Bid.__table__.insert(), [dict(
+        item_description=f"Bid {n}", our_bid_price=100.0,
+        currency=rng.choice(['USD'] * 4 + ['EUR', 'CDF']), status=rng.choice(['Pending', 'Won', 'Lost']),
+    ) for n in range(1000)])
+    db.session.execute(CompetitorBid.__table__.insert(), [dict(
+        competitor_name=f"Competitor {rng.randrange(40)}", bid_price=rng.uniform(50, 150), bid_id=n // 4 + 1,
+    ) for n in range(4000)])
+    db.session.execute(ProcurementItem.__table__.insert(), [dict(
+        name=f"Part {n}", purchase_date=SINCE + timedelta(hours=2 * n), total_cost=rng.uniform(1, 100),
+        status=rng.choice(['Ordered', 'Shipped', 'Arrived']),
+    ) for n in range(4000)])
+    # Mostly well-stocked, a few percent at or under their reorder point
+    db.session.execute(OurProductService.__table__.insert(), [dict(
+        name=f"SKU {n}", quantity_on_hand=rng.choice([0] + [3] * 2 + [50] * 47), reorder_point=5,
+    ) for n in range(4000)])
+    db.session.commit()
+    refresh_planner_statistics()
+
+
+def _bound_values(compiled):
+    """The statement's parameters exactly as the DBAPI receives them (after bind processors)."""
+    params = compiled.construct_params()
+    processors = compiled._bind_processors
+    values = {key: processors[key](value) if key in processors else value for key, value in params.items()}
+    return tuple(values[key] for key in compiled.positiontup) if compiled.positional else values
+
+
+def query_plan(statement):
+    """The plan as one string, explained with bound parameters just like the app runs it."""
+    connection = db.session.connection()
+    compiled = statement.compile(connection)
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", _bound_values(compiled)).scalar()
+        return json.dumps(rows if not isinstance(rows, str) else json.loads(rows))
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", _bound_values(compiled))
+    return ' | '.join(row[-1] for row in rows)
+
+
+class QueryPlanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        seed(random.Random(15))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_hot_queries_use_their_indexes(self):
+        for name, statement, index in hot_queries():
+            with self.subTest(name):
+                plan = query_plan(statement)
+                self.assertIn(index, plan)
+                db.session.rollback()
+
+
+@unittest.skipUnless(POSTGRES_URL, 'set TEST_POSTGRES_URL to check PostgreSQL plans')
+class PostgresQueryPlanTestCase(QueryPlanTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(TestingConfig, 'SQLALCHEMY_DATABASE_URI', POSTGRES_URL)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+
+if __name__ == '__main__':
+    unittest.main()
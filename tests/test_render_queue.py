@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from models_core import create_app, db
+from models_core.config import TestingConfig
+from models_core.data_version import data_versions
+from models_core.models import Client, Invoice, RenderJob, User
+from utils.render_queue import dispatch, queue_render, resume_pending_jobs, run_job, wait_for_render
+
+
+def form_data(doc_number):
+    return {
+        'doc_number': doc_number, 'client_name': 'ACME', 'client_address': 'Kinshasa',
+        'issue_date': '2025-09-01', 'due_date': '2025-10-01', 'po_number': 'N/A', 'vat_rate': 16.0,
+        'items': [{'description': 'Widget', 'quantity': 2, 'unit_price': 10.0, 'total_price': 20.0,
+                   'comment': ''}],
+    }
+
+
+class RenderQueueTestCase(unittest.TestCase):
+    database_uri = None
+
+    def setUp(self):
+        if self.database_uri:
+            with mock.patch.object(TestingConfig, 'SQLALCHEMY_DATABASE_URI', self.database_uri):
+                self.app = create_app('testing')
+        else:
+            self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.user, self.client = User(username='admin', password='x', role='admin'), Client(name='ACME')
+        db.session.add_all([self.user, self.client])
+        db.session.commit()
+        self.written = []
+
+    def tearDown(self):
+        for doc_number in self.written:
+            path = os.path.join(self.app.static_folder, 'generated_pdfs', f"{doc_number}.pdf")
+            if os.path.exists(path):
+                os.remove(path)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _queue(self, doc_number, data=None):
+        invoice = Invoice(document_type='invoice', invoice_number=doc_number, client_id=self.client.id,
+                          created_by=self.user.id)
+        db.session.add(invoice)
+        job = queue_render(invoice, data if data is not None else form_data(doc_number), 'invoice')
+        db.session.commit()
+        self.written.append(doc_number)
+        return invoice, job
+
+
+class InlineRenderQueueTestCase(RenderQueueTestCase):
+    def test_inline_dispatch_renders_and_marks_ready(self):
+        invoice, job = self._queue('TEST-RQ-001')
+        self.assertEqual(invoice.pdf_status, 'pending')
+
+        dispatch(job.id)
+
+        self.assertEqual(invoice.pdf_status, 'ready')
+        self.assertEqual(invoice.pdf_file, 'generated_pdfs/TEST-RQ-001.pdf')
+        self.assertEqual((job.status, job.attempts), ('ready', 1))
+        self.assertTrue(os.path.exists(os.path.join(self.app.static_folder, invoice.pdf_file)))
+
+    def test_rendering_is_not_an_edit_of_the_document(self):
+        invoice, job = self._queue('TEST-RQ-006')
+        before = (db.session.get(Invoice, invoice.id).updated_at, data_versions('invoice'))
+
+        dispatch(job.id)
+        db.session.expire_all()
+
+        self.assertEqual(invoice.pdf_status, 'ready')
+        self.assertEqual((invoice.updated_at, data_versions('invoice')), before)
+
+    def test_failure_is_recorded_and_job_is_claimed_once(self):
+        invoice, job = self._queue('TEST-RQ-002', data={'doc_number': 'TEST-RQ-002'})
+
+        self.assertEqual(run_job(job.id), 'failed')
+        self.assertIsNone(run_job(job.id))
+        self.assertEqual(invoice.pdf_status, 'failed')
+        self.assertIn('KeyError', job.error)
+
+    def test_resume_requeues_stale_jobs_only(self):
+        _, stale = self._queue('TEST-RQ-003')
+        _, busy = self._queue('TEST-RQ-004')
+        stale.status, stale.started_at = 'rendering', datetime.utcnow() - timedelta(hours=1)
+        busy.status, busy.started_at = 'rendering', datetime.utcnow()
+        db.session.commit()
+
+        self.assertEqual(resume_pending_jobs(), 1)
+        self.assertEqual(db.session.get(RenderJob, stale.id).status, 'ready')
+        self.assertEqual(db.session.get(RenderJob, busy.id).status, 'rendering')
+
+
+class BackgroundRenderQueueTestCase(RenderQueueTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.database_uri = f"sqlite:///{self.path}"
+        super().setUp()
+        self.app.config['PDF_RENDER_ASYNC'] = True
+
+    def tearDown(self):
+        super().tearDown()
+        with self.app.app_context():
+            db.engine.dispose()
+        os.remove(self.path)
+
+    def test_worker_pool_renders_and_download_can_wait(self):
+        invoice, job = self._queue('TEST-RQ-005')
+        dispatch(job.id)
+
+        self.assertEqual(wait_for_render(invoice.id, timeout=30), 'ready')
+        self.assertEqual(db.session.get(Invoice, invoice.id).pdf_file, 'generated_pdfs/TEST-RQ-005.pdf')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import event, func, select
+
+from models_core import create_app, db
+from models_core.models import Client, Invoice, RevenueByMonth, User
+from utils.dashboard_metrics import invoice_snapshot, record_invoice_change
+from utils.revenue_rollup import (
+    build_revenue_by_month,
+    live_revenue_by_month,
+    monthly_revenue,
+    rebuild_revenue_by_month,
+    stored_revenue_by_month,
+)
+
+
+class RevenueRollupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.user = User(username='admin', password='x', role='admin')
+        self.client = Client(name='ACME')
+        db.session.add_all([self.user, self.client])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _create(self, created, total, status='Paid', document_type='invoice', currency='USD'):
+        invoice = Invoice(
+            document_type=document_type, invoice_number=f"T-{created:%Y%m}-{total}",
+            client_id=self.client.id, created_by=self.user.id, date_created=created,
+            total_amount=Decimal(total), vat_amount=Decimal(total) * Decimal('0.16'),
+            status=status, currency=currency,
+        )
+        db.session.add(invoice)
+        db.session.flush()
+        record_invoice_change(invoice)
+        db.session.commit()
+        return invoice
+
+    def _set_status(self, invoice, status):
+        before = invoice_snapshot(invoice)
+        invoice.status = status
+        record_invoice_change(invoice, before)
+        db.session.commit()
+
+    def test_rollup_follows_creates_edits_and_status_changes(self):
+        rebuild_revenue_by_month()
+        september = self._create(datetime(2026, 9, 3), '100.10')
+        self._create(datetime(2026, 9, 20), '50.05')
+        self._create(datetime(2026, 9, 21), '70.00', currency='EUR')
+        self._create(datetime(2026, 9, 22), '30.00', document_type='proforma')
+        october = self._create(datetime(2026, 10, 1), '999.99', status='Pending')
+
+        self._set_status(october, 'Paid')
+        self._set_status(september, 'Cancelled')
+        # An edit saves a new paid version with other totals
+        edited = self._create(datetime(2026, 10, 2), '1200.00')
+        self._set_status(edited, 'Paid')
+
+        self.assertEqual(stored_revenue_by_month(), live_revenue_by_month())
+        self.assertEqual(stored_revenue_by_month()[(2026, 10, 'invoice', 'USD')],
+                         (2, Decimal('2199.99'), Decimal('352.00')))
+        rows = monthly_revenue(since=datetime(2026, 9, 15))
+        self.assertEqual([(row.year, row.month, row.revenue, row.invoice_count) for row in rows],
+                         [(2026, 9, Decimal('120.05'), 2), (2026, 10, Decimal('2199.99'), 2)])
+        self.assertEqual([row.revenue for row in monthly_revenue(datetime(2026, 9, 1), currency='EUR')],
+                         [Decimal('70.00')])
+
+    def test_unbuilt_rollup_is_read_live_and_built_by_the_upgrade(self):
+        # A database from before the rollup: changes are not tracked and reads never write
+        self._create(datetime(2026, 8, 5), '10.00')
+        self._create(datetime(2026, 9, 5), '20.00', status='Pending')
+        self.assertEqual([(row.month, row.revenue) for row in monthly_revenue(datetime(2026, 1, 1))],
+                         [(8, Decimal('10.00'))])
+        self.assertEqual(db.session.scalar(select(func.count(RevenueByMonth.id))), 0)
+
+        self.assertEqual(build_revenue_by_month(), ['revenue_by_month (1 rows)'])
+        self.assertEqual(build_revenue_by_month(), [])
+        self._create(datetime(2026, 9, 6), '5.00')
+        self.assertEqual(stored_revenue_by_month(), live_revenue_by_month())
+        self.assertEqual([(row.month, row.revenue) for row in monthly_revenue(datetime(2026, 1, 1))],
+                         [(8, Decimal('10.00')), (9, Decimal('5.00'))])
+
+    def test_reads_do_not_touch_the_invoice_table(self):
+        rebuild_revenue_by_month()
+        self._create(datetime(2026, 9, 5), '10.00')
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            monthly_revenue(datetime(2026, 1, 1))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertTrue(statements)
+        self.assertFalse([s for s in statements if 'FROM invoice' in s])
+
+    def test_rebuild_matches_live_aggregation(self):
+        for month in range(1, 13):
+            self._create(datetime(2025, month, 10), f"{month}.01", status='Paid' if month % 3 else 'Sent')
+        self.assertEqual(rebuild_revenue_by_month(), 8)
+        self.assertEqual(stored_revenue_by_month(), live_revenue_by_month())
+        self.assertEqual(db.session.scalar(select(RevenueByMonth.revenue).where(RevenueByMonth.month == 2)),
+                         Decimal('2.01'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+from sqlalchemy import text
+
+from models_core import create_app, db
+from models_core.models import Client, Invoice, InvoiceItem, User
+from models_core.search_index import SEARCH_TABLE, create_search_index, rebuild_search_index, search_invoices
+
+
+class SearchIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.user = User(username='admin', password='x', role='admin')
+        self.acme, self.globex = Client(name='ACME Mining'), Client(name='Globex')
+        db.session.add_all([self.user, self.acme, self.globex])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _invoice(self, number, client, items=(), po_number=None):
+        invoice = Invoice(document_type='invoice', invoice_number=number, client_id=client.id,
+                          po_number=po_number, created_by=self.user.id)
+        for description, comment in items:
+            invoice.items.append(InvoiceItem(description=description, comment=comment, quantity=1,
+                                             created_by=self.user.id))
+        db.session.add(invoice)
+        db.session.commit()
+        return invoice
+
+    def _numbers(self, query, **kwargs):
+        return [invoice.invoice_number for invoice in search_invoices(query, **kwargs).items]
+
+    def test_matches_number_po_client_and_items_ranked(self):
+        self._invoice('APEX-INV-WTOE-OCT25-001', self.acme, [('Hydraulic pump', 'spare seals')])
+        self._invoice('APEX-INV-WTOE-OCT25-002', self.globex, [('Pump housing', None)], po_number='PO-7781')
+        self._invoice('APEX-INV-WTOE-OCT25-003', self.globex, [('Cable', 'for OCT25 pump')])
+
+        self.assertEqual(self._numbers('OCT25-002'), ['APEX-INV-WTOE-OCT25-002'])
+        self.assertEqual(self._numbers('7781'), ['APEX-INV-WTOE-OCT25-002'])
+        self.assertEqual(self._numbers('acme'), ['APEX-INV-WTOE-OCT25-001'])
+        self.assertEqual(self._numbers('seal'), ['APEX-INV-WTOE-OCT25-001'])
+        self.assertCountEqual(self._numbers('globex pump'), ['APEX-INV-WTOE-OCT25-002', 'APEX-INV-WTOE-OCT25-003'])
+        # A hit in the document number outranks the same word in the line items
+        self._invoice('APEX-PUMP-004', self.globex, [('Cable', None)])
+        self.assertEqual(self._numbers('pump')[0], 'APEX-PUMP-004')
+        self.assertEqual(search_invoices('   ').total, 0)
+
+    def test_index_follows_edits_renames_and_deletes(self):
+        invoice = self._invoice('INV-1', self.acme, [('Drill bit', None)])
+
+        invoice.items[0].description = 'Grinding wheel'
+        db.session.commit()
+        self.assertEqual(self._numbers('drill'), [])
+        self.assertEqual(self._numbers('grinding'), ['INV-1'])
+
+        self.acme.name = 'Initech'
+        db.session.commit()
+        self.assertEqual(self._numbers('initech'), ['INV-1'])
+        self.assertEqual(self._numbers('acme'), [])
+
+        db.session.delete(invoice)
+        db.session.commit()
+        self.assertEqual(self._numbers('grinding'), [])
+
+    def test_rolled_back_change_leaves_index_untouched(self):
+        invoice = self._invoice('INV-1', self.acme, [('Drill bit', None)])
+        invoice.po_number = 'PO-9'
+        db.session.flush()
+        self.assertEqual(self._numbers('po 9'), ['INV-1'])
+
+        db.session.rollback()
+        self.assertEqual(self._numbers('po 9'), [])
+
+    def test_existing_rows_are_backfilled_and_pages_are_stable(self):
+        for n in range(25):
+            self._invoice(f"INV-{n:03d}", self.acme, [('Valve', None)])
+        with db.engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE {SEARCH_TABLE}"))
+            self.assertTrue(create_search_index(connection))
+        self.assertEqual(rebuild_search_index(), 25)
+
+        first, second = search_invoices('valve', per_page=20), search_invoices('valve', page=2, per_page=20)
+        self.assertEqual((first.total, len(first.items), len(second.items)), (25, 20, 5))
+        self.assertFalse({i.id for i in first.items} & {i.id for i in second.items})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from sqlalchemy import event, text
+
+from models_core import create_app, db
+from models_core.models import CompanySettings, get_or_create_company_settings
+from models_core.settings_cache import company_settings
+
+
+class SettingsCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        get_or_create_company_settings()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._record)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._record)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if 'company_settings' in statement:
+            self.statements.append(statement.split()[0] + (' row' if 'company_settings.name' in statement else ''))
+
+    def request(self):
+        # Every request runs in its own app context, and so with a fresh ``g``
+        with self.app.app_context():
+            try:
+                return company_settings(), company_settings()
+            finally:
+                db.session.remove()
+
+    def test_row_is_read_once_then_only_the_version_is_checked(self):
+        first, again = self.request()
+        self.assertIs(again, first)
+        self.assertEqual(self.statements, ['SELECT', 'SELECT row'])
+
+        self.statements.clear()
+        self.assertIs(self.request()[0], first)
+        self.assertEqual(self.statements, ['SELECT'])
+
+    def test_orm_writes_bump_the_version_and_refresh(self):
+        before = self.request()[0]
+        settings = get_or_create_company_settings()
+        settings.phone = '+243 000'
+        db.session.commit()
+        self.assertEqual(settings.version, 2)
+
+        settings.phone = '+243 000'  # no actual change: no new version
+        db.session.commit()
+        self.assertEqual(settings.version, 2)
+
+        after = self.request()[0]
+        self.assertIsNot(after, before)
+        self.assertEqual((after.phone, after.version), ('+243 000', 2))
+
+    def test_writes_from_another_process_are_seen_through_the_version(self):
+        cached = self.request()[0]
+        # What another worker's save looks like from here: new values and a new version, no local events
+        db.session.execute(text("UPDATE company_settings SET name = 'APEX BNN SARL', version = version + 1"))
+        db.session.commit()
+        self.assertEqual(cached.name, 'APEX BNN')
+        self.assertEqual(self.request()[0].name, 'APEX BNN SARL')
+
+    def test_snapshot_is_detached(self):
+        settings = self.request()[0]
+        self.assertIsInstance(settings, CompanySettings)
+        self.assertNotIn(settings, db.session)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('reportlab', 'numpy', 'scipy', 'sklearn', 'boto3', 'views.analysis')
+
+# Runs in a fresh interpreter: sys.modules must not be shared with the other tests
+CHILD = """
+import json, sys
+import app
+client = app.app.test_client()
+loaded = {}
+client.get('/login')
+loaded['first request'] = [name for name in sys.argv[1:] if name in sys.modules]
+with app.app.test_request_context():
+    url = app.url_for('business_prediction')
+loaded['lazy page'] = [url, client.get(url).status_code, 'views.analysis' in sys.modules]
+print(json.dumps(loaded))
+"""
+
+
+class StartupImportTestCase(unittest.TestCase):
+    def test_heavy_libraries_load_on_first_use(self):
+        env = dict(os.environ, FLASK_ENV='testing')
+        proc = subprocess.run([sys.executable, '-c', CHILD, *HEAVY], cwd=ROOT, env=env,
+                              capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(loaded['first request'], [])
+        # Still the plain endpoint name; the view module is imported by the first request to it
+        self.assertEqual(loaded['lazy page'], ['/business_prediction', 302, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,293 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from sqlalchemy import event, func, select, text
+
+from models_core import create_app, db, stock_ledger
+from models_core.config import TestingConfig
+from models_core.lineage import save_new_version
+from models_core.models import Client, Invoice, InvoiceItem, OurProductService, ProcurementItem, StockMovement, User
+from models_core.stock_ledger import (
+    check_stock_balances,
+    create_stock_checkpoints,
+    has_stock_movements,
+    open_stock_ledger,
+    rebuild_stock_balances,
+    stock_on_hand,
+    stock_on_hand_at,
+    sync_document_stock,
+    sync_procurement_stock,
+)
+
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+
+class StockLedgerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.user = User(username='admin', password='x', role='admin')
+        self.client = Client(name='ACME')
+        self.pump = OurProductService(name='Pump', quantity_on_hand=10, reorder_point=2)
+        db.session.add_all([self.user, self.client, self.pump])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def movements(self):
+        return db.session.execute(
+            select(StockMovement.kind, StockMovement.quantity).order_by(StockMovement.id)
+        ).tuples().all()
+
+    def _document(self, document_type='invoice', quantity=3, description='pump ', po_number=None):
+        invoice = Invoice(document_type=document_type, invoice_number='DOC-1', po_number=po_number,
+                          client_id=self.client.id, created_by=self.user.id)
+        invoice.items.append(InvoiceItem(description=description, quantity=quantity, created_by=self.user.id))
+        invoice.items.append(InvoiceItem(description='Installation', quantity=1, created_by=self.user.id))
+        db.session.add(invoice)
+        sync_document_stock(invoice)
+        db.session.commit()
+        return invoice
+
+    def test_form_edits_are_recorded_as_adjustments(self):
+        self.pump.quantity_on_hand = 7
+        db.session.commit()
+        self.assertEqual(self.movements(), [('opening', 10), ('adjustment', -3)])
+        self.assertEqual(check_stock_balances(), [])
+
+    def test_documents_issue_stock_and_edits_or_cancelling_correct_it(self):
+        invoice = self._document(quantity=3)
+        self.assertEqual(stock_on_hand(self.pump.id), 7)
+        self.assertEqual(invoice.items[0].product_id, self.pump.id)
+        self.assertIsNone(invoice.items[1].product_id)
+
+        # Saving again posts nothing; a new version with 5 pumps issues 2 more
+        sync_document_stock(invoice)
+        edited = Invoice(document_type='invoice', client_id=self.client.id, created_by=self.user.id,
+                         parent_id=invoice.id)
+        edited.items.append(InvoiceItem(description='Pump', quantity=5, created_by=self.user.id))
+        save_new_version(edited, invoice.id, invoice.invoice_number)
+        sync_document_stock(edited)
+        db.session.commit()
+        self.assertEqual(self.pump.quantity_on_hand, 5)
+
+        edited.status = 'Cancelled'
+        sync_document_stock(edited)
+        db.session.commit()
+        self.assertEqual(self.pump.quantity_on_hand, 10)
+        self.assertEqual(self.movements(), [('opening', 10), ('issue', -3), ('issue', -2), ('issue', 5)])
+        self.assertEqual(check_stock_balances(), [])
+
+    def test_two_syncs_in_one_flush_cycle_post_once(self):
+        invoice = Invoice(document_type='invoice', invoice_number='DOC-1',
+                          client_id=self.client.id, created_by=self.user.id)
+        invoice.items.append(InvoiceItem(description='Pump', quantity=3, created_by=self.user.id))
+        db.session.add(invoice)
+        self.assertEqual(sync_document_stock(invoice), {self.pump.id: -3})
+        self.assertEqual(sync_document_stock(invoice), {})
+        db.session.commit()
+        self.assertEqual(self.movements(), [('opening', 10), ('issue', -3)])
+        self.assertEqual(stock_on_hand(self.pump.id), 7)
+
+    def test_a_sale_with_invoice_and_delivery_note_issues_once(self):
+        invoice = self._document(quantity=3, po_number='PO-7')
+        self.assertEqual(stock_on_hand(self.pump.id), 7)
+
+        # The note for the same PO takes the issue over; one for another PO is a separate sale
+        note = self._document(document_type='delivery_note', quantity=3, po_number='PO-7')
+        self.assertEqual(stock_on_hand(self.pump.id), 7)
+        self._document(document_type='delivery_note', quantity=1, po_number='PO-8')
+        self.assertEqual(stock_on_hand(self.pump.id), 6)
+
+        # Re-saving the invoice does not issue it again; cancelling the note hands the issue back
+        sync_document_stock(invoice)
+        db.session.commit()
+        self.assertEqual(stock_on_hand(self.pump.id), 6)
+        note.status = 'Cancelled'
+        sync_document_stock(note)
+        db.session.commit()
+        self.assertEqual(stock_on_hand(self.pump.id), 6)
+        self.assertEqual(self.movements(), [('opening', 10), ('issue', -3), ('issue', -3), ('issue', 3),
+                                            ('issue', -1), ('issue', 3), ('issue', -3)])
+        self.assertEqual(check_stock_balances(), [])
+
+    def test_quotations_do_not_move_stock(self):
+        self._document(document_type='quotation')
+        self.assertEqual(stock_on_hand(self.pump.id), 10)
+
+    def test_procurement_is_received_on_delivery(self):
+        item = ProcurementItem(name='PUMP', quantity=4, status='Ordered', purchase_date=datetime(2026, 9, 1))
+        db.session.add(item)
+        sync_procurement_stock(item)
+        self.assertEqual(stock_on_hand(self.pump.id), 10)
+
+        item.status = 'Delivered'
+        sync_procurement_stock(item)
+        db.session.commit()
+        self.assertEqual((item.product_id, stock_on_hand(self.pump.id)), (self.pump.id, 14))
+
+        item.quantity = 6
+        sync_procurement_stock(item)
+        db.session.commit()
+        self.assertEqual(self.movements(), [('opening', 10), ('receipt', 4), ('receipt', 2)])
+
+    def test_products_with_movements_are_kept(self):
+        self._document(quantity=3)
+        db.session.delete(self.pump)
+        with self.assertRaises(ValueError):
+            db.session.flush()
+        db.session.rollback()
+        self.assertTrue(has_stock_movements(self.pump.id))
+        self.assertEqual(self.movements(), [('opening', 10), ('issue', -3)])
+
+        # A product that never held stock can go; an order that named it loses the link
+        hose = OurProductService(name='Hose', quantity_on_hand=0)
+        order = ProcurementItem(name='Hose', quantity=5, status='Ordered', purchase_date=datetime(2026, 9, 1))
+        db.session.add_all([hose, order])
+        sync_procurement_stock(order)
+        db.session.commit()
+        self.assertEqual((order.product_id, has_stock_movements(hose.id)), (hose.id, False))
+        db.session.delete(hose)
+        db.session.commit()
+        db.session.refresh(order)
+        self.assertIsNone(order.product_id)
+
+    def test_on_hand_is_one_query_however_long_the_history(self):
+        for _ in range(5):
+            self._document(quantity=1)
+        product_id = self.pump.id
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            self.assertEqual(stock_on_hand(product_id), 5)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 1)
+
+    def test_point_in_time_replays_from_checkpoints(self):
+        start = datetime.utcnow() - timedelta(days=3)
+        # Three days of history: +10 opening, -3 the next day, -2 the day after
+        invoice = self._document(quantity=3)
+        self.pump.quantity_on_hand = 5
+        db.session.commit()
+        for movement_id, days in zip(db.session.scalars(select(StockMovement.id).order_by(StockMovement.id)), range(3)):
+            db.session.execute(text("UPDATE stock_movement SET occurred_at = :at WHERE id = :id"),
+                               {'at': start + timedelta(days=days), 'id': movement_id})
+        db.session.commit()
+
+        self.assertEqual(create_stock_checkpoints(now=start + timedelta(days=1, hours=1)), 1)
+        self.assertEqual(create_stock_checkpoints(now=start + timedelta(days=1, hours=2)), 0)
+        self.assertEqual(create_stock_checkpoints(), 1)
+
+        expected = {-1: 0, 0: 10, 1: 7, 2: 5}
+        for day, on_hand in expected.items():
+            with self.subTest(day=day):
+                self.assertEqual(stock_on_hand_at(self.pump.id, start + timedelta(days=day, hours=12)), on_hand)
+        self.assertEqual(invoice.items[0].product_id, self.pump.id)
+
+    def test_existing_stock_gets_opening_balances_and_drift_is_repaired(self):
+        db.session.execute(text("DELETE FROM stock_movement"))
+        db.session.execute(text("INSERT INTO our_product_service (name, quantity_on_hand, status) "
+                                "VALUES ('Valve', 4, 'IN_STOCK'), ('Hose', 0, 'IN_STOCK')"))
+        db.session.commit()
+        self.assertEqual(open_stock_ledger(), ['stock_movement (2 opening balances)'])
+        self.assertEqual(open_stock_ledger(), [])
+
+        db.session.execute(text("UPDATE our_product_service SET quantity_on_hand = 99 WHERE name = 'Valve'"))
+        db.session.commit()
+        self.assertEqual(len(rebuild_stock_balances()), 1)
+        self.assertEqual(db.session.scalar(select(func.sum(OurProductService.quantity_on_hand))), 14)
+        self.assertEqual(check_stock_balances(), [])
+
+
+class ConcurrentSyncTestCase(unittest.TestCase):
+    THREADS = 6
+    DATABASE_URL = None
+
+    def setUp(self):
+        self.path = None
+        url = self.DATABASE_URL
+        if url is None:
+            fd, self.path = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            # A file database so every thread gets its own connection
+            url = f"sqlite:///{self.path}"
+        with mock.patch.object(TestingConfig, 'SQLALCHEMY_DATABASE_URI', url):
+            self.app = create_app('testing')
+        with self.app.app_context():
+            db.create_all()
+            user, client = User(username='admin', password='x', role='admin'), Client(name='ACME')
+            pump = OurProductService(name='Pump', quantity_on_hand=10)
+            db.session.add_all([user, client, pump])
+            db.session.flush()
+            invoice = Invoice(document_type='invoice', invoice_number='DOC-1', client_id=client.id,
+                              created_by=user.id)
+            # Already linked: matching the line would write, and that write alone would serialize the saves
+            invoice.items.append(InvoiceItem(description='Pump', quantity=3, created_by=user.id, product_id=pump.id))
+            db.session.add(invoice)
+            db.session.commit()
+            self.invoice_id, self.pump_id = invoice.id, pump.id
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        if self.path:
+            os.remove(self.path)
+
+    def test_concurrent_saves_of_one_document_issue_once(self):
+        errors = []
+        start = threading.Barrier(self.THREADS)
+        read_posted = stock_ledger.posted_quantities
+
+        def slow_read(*args):
+            # Give every other save time to read the same (empty) postings, were it not locked out
+            posted = read_posted(*args)
+            time.sleep(0.05)
+            return posted
+
+        def worker():
+            with self.app.app_context():
+                try:
+                    invoice = db.session.get(Invoice, self.invoice_id)
+                    start.wait()
+                    sync_document_stock(invoice)
+                    db.session.commit()
+                except Exception as exc:  # surfaced below; a thread can't fail the test itself
+                    errors.append(exc)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        with mock.patch.object(stock_ledger, 'posted_quantities', slow_read):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        with self.app.app_context():
+            issued = db.session.scalars(select(StockMovement.quantity).where(StockMovement.kind == 'issue')).all()
+            self.assertEqual(issued, [-3])
+            self.assertEqual(stock_on_hand(self.pump_id), 7)
+
+
+@unittest.skipUnless(POSTGRES_URL, 'set TEST_POSTGRES_URL to check the PostgreSQL lock')
+class PostgresConcurrentSyncTestCase(ConcurrentSyncTestCase):
+    DATABASE_URL = POSTGRES_URL
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from sqlalchemy import and_, func, select
+
+from models_core import create_app, db
+from models_core.models import Client, OurProductService, Supplier
+from utils.typeahead import selected_choice, typeahead
+
+
+class TypeaheadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add_all(Client(name=name) for name in (
+            'Acme Mining', 'ACME Logistics', 'Kinshasa Acme Supplies', 'Globex', 'Acme_Test', 'Bacme',
+        ))
+        db.session.add_all([
+            OurProductService(name='Pump service', is_active=True),
+            OurProductService(name='Pump rental', is_active=False),
+            Supplier(name='Pumps & Co'),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def labels(self, kind, term, **kwargs):
+        return [row['label'] for row in typeahead(kind, term, **kwargs)]
+
+    def test_prefix_matches_come_before_substring_matches(self):
+        self.assertEqual(self.labels('clients', 'acme'),
+                         ['ACME Logistics', 'Acme Mining', 'Acme_Test', 'Bacme', 'Kinshasa Acme Supplies'])
+        self.assertEqual(self.labels('clients', 'acme', limit=2), ['ACME Logistics', 'Acme Mining'])
+        self.assertEqual(self.labels('clients', 'acme_'), ['Acme_Test'])
+        self.assertEqual(self.labels('clients', '  '), [])
+
+    def test_products_skip_inactive_and_suppliers_are_searchable(self):
+        self.assertEqual(self.labels('products', 'pump'), ['Pump service'])
+        self.assertEqual(self.labels('suppliers', 'PUMP'), ['Pumps & Co'])
+
+    def test_prefix_lookup_uses_lower_name_index(self):
+        key = func.lower(Client.name)
+        statement = select(Client.id).where(and_(key >= 'acme', key < 'acmf')).limit(10)
+        sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(str(row) for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")))
+        self.assertIn('ix_client_name_lower', plan)
+
+    def test_selected_choice_renders_only_the_chosen_row(self):
+        client = db.session.scalar(select(Client).where(Client.name == 'Globex'))
+        self.assertEqual(selected_choice(Client, str(client.id)), [(client.id, 'Globex')])
+        self.assertEqual(selected_choice(Client, -1), [])
+        self.assertEqual(selected_choice(Client, 'x'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+# utils/batch_export.py
+"""
+Batch export of document PDFs as one ZIP.
+
+    invoices = db.session.scalars(export_query(date_from=..., client_id=...)).all()
+    render_missing(invoices)                 # process pool, only what is not on disk
+    for chunk in iter_zip(export_entries(invoices)):
+        ...                                  # bytes, as the archive is written
+
+Missing PDFs (never rendered, or deleted from ``static/generated_pdfs``) are
+rebuilt from the database rows and rendered in a ``ProcessPoolExecutor``:
+drawing is CPU-bound, so threads would serialize on the GIL. The workers never
+touch the database or the app -- each gets the form data plus a plain snapshot
+of the company settings. That is for the ``export-pdfs`` CLI command; the
+``/documents/export`` endpoint must answer quickly, so it hands missing PDFs to
+the background render queue (``queue_missing``) and zips only the ones
+already on disk. Documents whose render job is still in flight are left to
+that job either way, so two renders never write the same file.
+
+``iter_zip`` writes the archive to an unseekable sink and yields each chunk as
+it is produced (entries use data descriptors), so neither the endpoint nor the
+CLI holds the ZIP in memory.
+"""
+import io
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from types import SimpleNamespace
+
+from flask import current_app
+from sqlalchemy import select
+
+from models_core import db
+from models_core.models import Invoice
+from models_core.settings_cache import company_settings
+from utils.render_queue import (
+    FAILED, IN_PROGRESS, PENDING, READY, dispatch, dispatch_for_invoice, document_form_data, queue_render,
+    set_render_state,
+)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def export_query(date_from=None, date_to=None, client_id=None, status=None, document_type=None, created_by=None):
+    """Select the documents to export; dates are inclusive and match ``issue_date``."""
+    query = select(Invoice)
+    if date_from:
+        query = query.where(Invoice.issue_date >= date_from)
+    if date_to:
+        query = query.where(Invoice.issue_date <= date_to)
+    if client_id:
+        query = query.where(Invoice.client_id == client_id)
+    if status:
+        query = query.where(Invoice.status == status)
+    if document_type:
+        query = query.where(Invoice.document_type == document_type)
+    if created_by:
+        query = query.where(Invoice.created_by == created_by)
+    return query.order_by(Invoice.issue_date, Invoice.id)
+
+
+def pdf_path(invoice):
+    """Absolute path of the invoice's stored PDF, or None if it has none on disk."""
+    if not invoice.pdf_file or not str(invoice.pdf_file).startswith('generated_pdfs/'):
+        return None
+    path = os.path.join(current_app.static_folder, invoice.pdf_file)
+    return path if os.path.exists(path) else None
+
+
+def settings_snapshot(settings):
+    """Picklable copy of the company settings for the render workers."""
+    if not settings:
+        return None
+    return {column.name: getattr(settings, column.name) for column in settings.__table__.columns}
+
+
+def _render_to_file(form_data, document_type, settings, filepath):
+    """Worker entry point: render and write atomically. Runs without an app context."""
+    from utils.pdf_generator import render_invoice_pdf
+    pdf_bytes = render_invoice_pdf(form_data, False, document_type, SimpleNamespace(**settings) if settings else None)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filepath), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(pdf_bytes)
+    os.replace(tmp, filepath)
+    return len(pdf_bytes)
+
+
+def _missing(invoices):
+    """Invoices without a PDF on disk whose render is not already queued or running."""
+    return [invoice for invoice in invoices if invoice.pdf_status not in IN_PROGRESS and pdf_path(invoice) is None]
+
+
+def render_missing(invoices, workers=None):
+    """Render every invoice without a PDF on disk (and no render in flight). Returns (rendered, failed) counts."""
+    missing = _missing(invoices)
+    if not missing:
+        return 0, 0
+    settings = settings_snapshot(company_settings())
+    pdf_dir = os.path.join(current_app.static_folder, 'generated_pdfs')
+    os.makedirs(pdf_dir, exist_ok=True)
+    workers = workers or current_app.config.get('PDF_EXPORT_WORKERS') or os.cpu_count() or 1
+
+    rendered = failed = 0
+    with ProcessPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+        futures = {
+            executor.submit(_render_to_file, document_form_data(invoice), invoice.document_type, settings,
+                            os.path.join(pdf_dir, f"{invoice.invoice_number}.pdf")): invoice
+            for invoice in missing
+        }
+        for future in as_completed(futures):
+            invoice = futures[future]
+            try:
+                future.result()
+            except Exception:
+                current_app.logger.exception("Batch export could not render %s", invoice.invoice_number)
+                set_render_state(invoice, FAILED)
+                failed += 1
+            else:
+                set_render_state(invoice, READY, f"generated_pdfs/{invoice.invoice_number}.pdf")
+                rendered += 1
+    db.session.commit()
+    current_app.logger.info("Batch export rendered %d PDFs (%d failed)", rendered, failed)
+    return rendered, failed
+
+
+def queue_missing(invoices):
+    """
+    Queue a background render (``utils.render_queue``) for every invoice
+    without a PDF on disk, and make sure already queued ones are running.
+    Commits. Returns the invoices that still have no PDF on disk.
+    """
+    jobs = [queue_render(invoice, document_form_data(invoice), invoice.document_type)
+            for invoice in _missing(invoices)]
+    waiting = [invoice.id for invoice in invoices if invoice.pdf_status == PENDING and pdf_path(invoice) is None]
+    db.session.commit()
+    for job in jobs:
+        dispatch(job.id)
+    for invoice_id in waiting:
+        dispatch_for_invoice(invoice_id)
+    return [invoice for invoice in invoices if pdf_path(invoice) is None]
+
+
+def export_entries(invoices):
+    """(archive name, path) for every invoice with a PDF on disk; names are made unique."""
+    entries, seen = [], set()
+    for invoice in invoices:
+        path = pdf_path(invoice)
+        if path is None:
+            continue
+        name = f"{invoice.invoice_number}.pdf"
+        if name in seen:
+            name = f"{invoice.invoice_number}-{invoice.id}.pdf"
+        seen.add(name)
+        entries.append((name, path))
+    return entries
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable write target that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def iter_zip(entries, notes=None):
+    """Yield a ZIP of ``entries`` ((name, path) pairs) chunk by chunk, plus ``notes`` as README.txt if given."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, path in entries:
+            info = zipfile.ZipInfo.from_file(path, name)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as src, archive.open(info, 'w') as dest:
+                while True:
+                    block = src.read(CHUNK_SIZE)
+                    if not block:
+                        break
+                    dest.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+        if notes:
+            archive.writestr('README.txt', notes)
+    yield sink.drain()
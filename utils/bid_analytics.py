@@ -0,0 +1,53 @@
+# utils/bid_analytics.py
+"""
+Bid intelligence query layer.
+
+``get_bid_insights()`` returns every bid together with its lowest competitor
+offer and a "price too high" flag, computed in one SQL statement with a
+``ROW_NUMBER()`` window over ``competitor_bid`` -- so the dashboard no longer
+lazy-loads ``bid.competitor_bids`` once per row.
+"""
+from collections import namedtuple
+
+from sqlalchemy import and_, case, false, func, select
+
+from models_core import db
+from models_core.models import Bid, CompetitorBid
+
+# Our price is "too high" when it exceeds the lowest competitor by more than this
+DEFAULT_THRESHOLD = 0.15
+
+BidInsight = namedtuple('BidInsight', 'bid lowest_price lowest_competitor price_too_high')
+
+
+def get_bid_insights(status=None, currency=None, threshold=DEFAULT_THRESHOLD):
+    """Return a list of ``BidInsight`` rows, optionally filtered by bid status and currency."""
+    ranked = select(
+        CompetitorBid.bid_id,
+        CompetitorBid.competitor_name,
+        CompetitorBid.bid_price,
+        func.row_number().over(
+            partition_by=CompetitorBid.bid_id,
+            order_by=(CompetitorBid.bid_price, CompetitorBid.id),
+        ).label('price_rank'),
+    ).subquery()
+
+    too_high = case(
+        (ranked.c.bid_price.is_(None), false()),
+        else_=Bid.our_bid_price > ranked.c.bid_price * (1 + threshold),
+    )
+
+    stmt = (
+        select(Bid, ranked.c.bid_price, ranked.c.competitor_name, too_high.label('price_too_high'))
+        .outerjoin(ranked, and_(ranked.c.bid_id == Bid.id, ranked.c.price_rank == 1))
+        .order_by(Bid.id)
+    )
+    if status:
+        stmt = stmt.where(Bid.status == status)
+    if currency:
+        stmt = stmt.where(Bid.currency == currency)
+
+    return [
+        BidInsight(bid, lowest_price, lowest_competitor, bool(price_too_high))
+        for bid, lowest_price, lowest_competitor, price_too_high in db.session.execute(stmt)
+    ]
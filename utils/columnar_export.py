@@ -0,0 +1,258 @@
+# utils/columnar_export.py
+"""
+Typed columnar export of the finance tables for offline analysis.
+
+    export_columnar('exports/finance')                    # everything
+    export_columnar('exports/finance', since_last=True)   # only what changed since the last run
+    invoices = read_table('exports/finance', 'invoice')   # {column: numpy array}
+
+Each table is written in batches of ``BATCH_SIZE`` rows, one compressed numpy
+archive per batch (``<table>/part-00000.npz``), one array per column in its
+real type -- int64, float64, bool, datetime64[D] for dates, datetime64[us] for
+timestamps, unicode for text -- plus a ``<column>__null`` mask for nullable
+columns. Money columns stay exact: int64 minor units (cents), with the
+column's ``scale`` (2) in the manifest, so ``amount / 10 ** scale`` gives
+dollars. ``manifest.json`` records the schema, the parts and each table's
+watermark. (Parquet/Arrow would need pyarrow, which is not a dependency;
+``numpy.load`` reads these parts directly and pandas can wrap them as is.)
+
+Incremental runs append new parts holding the rows changed since the
+watermark:
+
+    invoice, bid                    coalesce(updated_at, created_at)
+    invoice_item, competitor_bid    the parent invoice / bid's change time
+    procurement_item                updated_at
+
+``updated_at`` is set when a row is written, not when its transaction
+commits, so a slow transaction can commit a change stamped before the
+watermark. Incremental runs therefore re-read ``OVERLAP`` before the
+watermark. An updated or re-read row appears in several parts, and
+``read_table`` keeps the last version of each id.
+
+Deleted rows are not tracked (there are no tombstones), and neither are
+transactions slower than ``OVERLAP``. Instead, an incremental run does a
+full export of any table whose last full export is older than
+``FULL_EXPORT_EVERY``. That replaces the table's parts, so deletions show
+up there within that time.
+"""
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, func, select
+
+from models_core import db
+from models_core.money import Money
+from models_core.models import Bid, CompetitorBid, Invoice, InvoiceItem, ProcurementItem
+
+BATCH_SIZE = 50_000
+MANIFEST = 'manifest.json'
+FORMAT = 'apex-columnar/2'
+NULL_SUFFIX = '__null'
+MONEY_SCALE = 2
+OVERLAP = timedelta(minutes=10)
+FULL_EXPORT_EVERY = timedelta(days=7)
+
+# table -> (model, parent model whose change time it follows, foreign key to the parent)
+EXPORT_TABLES = {
+    'invoice': (Invoice, None, None),
+    'invoice_item': (InvoiceItem, Invoice, InvoiceItem.invoice_id),
+    'bid': (Bid, None, None),
+    'competitor_bid': (CompetitorBid, Bid, CompetitorBid.bid_id),
+    'procurement_item': (ProcurementItem, None, None),
+}
+
+
+def _column_type(column):
+    if isinstance(column.type, Boolean):
+        return 'bool'
+    if isinstance(column.type, Integer):
+        return 'int64'
+    if isinstance(column.type, Money):
+        return 'money'
+    if isinstance(column.type, (Float, Numeric)):
+        return 'float64'
+    if isinstance(column.type, DateTime):
+        return 'datetime64[us]'
+    if isinstance(column.type, Date):
+        return 'datetime64[D]'
+    return 'str'
+
+
+def _to_numpy(values, column_type):
+    """(array, null mask) for one column of a batch."""
+    mask = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+    if column_type == 'str':
+        return np.array(['' if v is None else str(v) for v in values], dtype=str), mask
+    if column_type == 'float64':
+        return np.array([np.nan if v is None else float(v) for v in values], dtype='float64'), mask
+    if column_type == 'money':
+        return np.array([0 if v is None else int(v.scaleb(MONEY_SCALE)) for v in values], dtype='int64'), mask
+    if column_type == 'datetime64[us]':
+        # Aware timestamps are stored as naive UTC, like the rest of the database
+        values = [v.astimezone(timezone.utc).replace(tzinfo=None) if v is not None and v.tzinfo else v
+                  for v in values]
+        return np.array(['NaT' if v is None else v for v in values], dtype=column_type), mask
+    if column_type == 'datetime64[D]':
+        return np.array(['NaT' if v is None else v for v in values], dtype=column_type), mask
+    fill = False if column_type == 'bool' else 0
+    return np.array([fill if v is None else v for v in values], dtype=column_type), mask
+
+
+def _change_expression(table):
+    model, parent, _ = EXPORT_TABLES[table]
+    source = parent or model
+    if not hasattr(source, 'created_at'):
+        return source.updated_at
+    return func.coalesce(source.updated_at, source.created_at)
+
+
+def _statement(table, watermark):
+    model, parent, foreign_key = EXPORT_TABLES[table]
+    change = _change_expression(table)
+    statement = select(*model.__table__.columns, change.label('_change'))
+    if parent is not None:
+        statement = statement.join(parent, foreign_key == parent.id)
+    if watermark is not None:
+        statement = statement.where(change >= datetime.fromisoformat(watermark) - OVERLAP)
+    return statement.order_by(model.id)
+
+
+def _full_export_due(entry, now):
+    last = entry.get('full_export_at')
+    return last is None or datetime.fromisoformat(last) <= now - FULL_EXPORT_EVERY
+
+
+def _manifest_column(name, column_type, nullable):
+    if column_type == 'money':
+        return {'name': name, 'type': 'int64', 'scale': MONEY_SCALE, 'nullable': bool(nullable)}
+    return {'name': name, 'type': column_type, 'nullable': bool(nullable)}
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'format': FORMAT, 'tables': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _drop_parts(out_dir, entry):
+    for part in entry.get('parts', []):
+        path = os.path.join(out_dir, part['file'])
+        if os.path.exists(path):
+            os.remove(path)
+    entry.clear()
+
+
+def export_table(out_dir, table, entry, since_last=False, batch_size=BATCH_SIZE, compress=True):
+    """Append the table's rows (with ``since_last``, only those changed since the watermark less ``OVERLAP``) as parts.
+
+    ``entry`` is the table's manifest entry and is updated in place. Returns the number of rows written.
+    """
+    model = EXPORT_TABLES[table][0]
+    columns = [(column.name, _column_type(column), column.nullable) for column in model.__table__.columns]
+    entry.setdefault('columns', [_manifest_column(n, t, nullable) for n, t, nullable in columns])
+    entry.setdefault('watermark_column', 'updated_at')
+    parts = entry.setdefault('parts', [])
+    watermark = entry.get('watermark') if since_last else None
+
+    save = np.savez_compressed if compress else np.savez
+    rows_written = 0
+    result = db.session.execute(_statement(table, watermark).execution_options(yield_per=batch_size))
+    for batch in result.partitions():
+        arrays = {}
+        for index, (name, column_type, nullable) in enumerate(columns):
+            values, mask = _to_numpy([row[index] for row in batch], column_type)
+            arrays[name] = values
+            if nullable:
+                arrays[name + NULL_SUFFIX] = mask
+        changes = [row[-1] for row in batch if row[-1] is not None]
+        if changes:
+            latest = max(changes).isoformat()
+            if entry.get('watermark') is None or latest > entry['watermark']:
+                entry['watermark'] = latest
+
+        filename = f"{table}/part-{len(parts):05d}.npz"
+        _write_atomic(os.path.join(out_dir, filename), lambda f: save(f, **arrays))
+        parts.append({'file': filename, 'rows': len(batch)})
+        rows_written += len(batch)
+    entry['rows'] = sum(part['rows'] for part in parts)
+    return rows_written
+
+
+def export_columnar(out_dir, tables=None, since_last=False, batch_size=BATCH_SIZE, compress=True):
+    """Export ``tables`` (default: all of EXPORT_TABLES) to ``out_dir``. Returns {table: rows written}.
+
+    Without ``since_last``, or when a table's last full export is ``FULL_EXPORT_EVERY`` old, the
+    table's previous parts are replaced.
+    """
+    manifest = load_manifest(out_dir)
+    if manifest.get('format') != FORMAT:
+        # Parts in an older layout (money as float64) can't be appended to: start over
+        for entry in manifest['tables'].values():
+            _drop_parts(out_dir, entry)
+        manifest = {'format': FORMAT, 'tables': {}}
+    now = datetime.utcnow()
+    written = {}
+    for table in tables or EXPORT_TABLES:
+        entry = manifest['tables'].setdefault(table, {})
+        incremental = since_last and not _full_export_due(entry, now)
+        if not incremental:
+            _drop_parts(out_dir, entry)
+        written[table] = export_table(out_dir, table, entry, since_last=incremental, batch_size=batch_size,
+                                      compress=compress)
+        if not incremental:
+            entry['full_export_at'] = now.isoformat()
+    manifest['exported_at'] = now.isoformat()
+    _write_atomic(os.path.join(out_dir, MANIFEST),
+                  lambda f: f.write(json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')))
+    return written
+
+
+def read_table(out_dir, table):
+    """Concatenate a table's parts into {column: array}, keeping the latest version of each id.
+
+    Nullable columns come back as ``numpy.ma.MaskedArray``; money columns as int64 cents (see the
+    manifest's ``scale``).
+    """
+    entry = load_manifest(out_dir)['tables'][table]
+    chunks = {column['name']: [] for column in entry['columns']}
+    masks = {column['name']: [] for column in entry['columns'] if column['nullable']}
+    for part in entry['parts']:
+        with np.load(os.path.join(out_dir, part['file'])) as data:
+            for name in chunks:
+                chunks[name].append(data[name])
+            for name in masks:
+                masks[name].append(data[name + NULL_SUFFIX])
+    columns = {name: np.concatenate(arrays) if arrays else np.array([]) for name, arrays in chunks.items()}
+    if not entry['parts']:
+        return columns
+
+    # Later parts hold newer versions: keep the last occurrence of every id, in id order
+    ids = columns['id']
+    reversed_ids = ids[::-1]
+    _, last_from_end = np.unique(reversed_ids, return_index=True)
+    keep = len(ids) - 1 - last_from_end
+    result = {}
+    for name, values in columns.items():
+        if name in masks:
+            result[name] = np.ma.MaskedArray(values[keep], mask=np.concatenate(masks[name])[keep])
+        else:
+            result[name] = values[keep]
+    return result
@@ -0,0 +1,60 @@
+# utils/csv_export.py
+"""
+Streaming CSV downloads.
+
+    rows = stream_rows(select(Bid.item_description, ...).order_by(Bid.id))
+    return csv_response('bids.csv', header, rows)
+
+``stream_rows`` executes with ``yield_per``, which makes SQLAlchemy use a
+server-side cursor (``stream_results``) where the driver has one and fetch in
+batches, so only one batch of rows is alive at a time. ``csv_response`` sends
+the header straight away and then one chunk per ``CHUNK_ROWS`` rows; the
+generator runs under ``stream_with_context`` so the session stays open until
+the last row has been written.
+"""
+import csv
+from io import StringIO
+
+from flask import Response, stream_with_context
+
+from models_core import db
+
+CHUNK_ROWS = 500
+YIELD_PER = 1000
+
+
+def stream_rows(statement, yield_per=YIELD_PER):
+    """Execute ``statement`` with a server-side cursor and yield its rows batch by batch."""
+    return db.session.execute(statement.execution_options(yield_per=yield_per))
+
+
+def iter_csv(header, rows, chunk_rows=CHUNK_ROWS):
+    """Yield CSV text: the header on its own, then one string per ``chunk_rows`` rows."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def drain():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(header)
+    yield drain()
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending == chunk_rows:
+            yield drain()
+            pending = 0
+    if pending:
+        yield drain()
+
+
+def csv_response(filename, header, rows):
+    return Response(
+        stream_with_context(iter_csv(header, rows)),
+        mimetype='text/csv',
+        headers={"Content-Disposition": f"attachment;filename={filename}"},
+    )
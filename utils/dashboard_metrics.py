@@ -0,0 +1,333 @@
+# utils/dashboard_metrics.py
+"""
+Rollup store behind the dashboard headline figures.
+
+Every figure the dashboard shows is kept as a row in ``dashboard_metric``
+(metric + dimension -> value).  Routes that change invoices, suppliers,
+procurement items or bids push *deltas* into the rollup inside the same
+transaction, so the dashboard only has to read a handful of indexed rows
+instead of re-aggregating the ``invoice`` table on every page load. The
+monthly revenue and VAT series come from ``revenue_by_month`` instead (see
+``utils/revenue_rollup.py``).
+
+``rebuild_dashboard_metrics()`` recomputes everything from the live tables and
+``check_dashboard_metrics()`` reports rows that drifted from them; both are
+exposed as Flask CLI commands (see ``models_core/cli.py``). ``upgrade_schema()``
+builds the rollup once; until then the dashboard aggregates the live tables
+without writing anything.
+
+Deltas are applied with one upsert per row, so two requests creating the same
+row at once (the first document of a day, a bid's first new status) both
+count instead of one failing on the unique (metric, dimension) constraint.
+
+Only the last ``ACTIVITY_DAYS`` days of ``documents_created_day`` are kept:
+every day-bucket update also deletes the buckets that fell out of the window
+(an index range that is empty except on the first document of a new day).
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, extract, func, not_, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models_core import db
+from models_core.models import Bid, Client, DashboardMetric, Invoice, ProcurementItem, Supplier
+from models_core.money import ZERO, to_money
+from utils.invoice_stats import STATUSES, InvoiceKpis, invoice_kpis
+from utils.revenue_rollup import record_revenue_change
+
+# Metric names
+INVOICE_COUNT = 'invoice_count'           # dimension: "<document_type>:<status>"
+INVOICE_TOTAL = 'invoice_total'           # dimension: "<document_type>:<status>"
+INVOICE_VAT = 'invoice_vat'               # dimension: "<document_type>:<status>"
+CLIENT_PAID = 'client_paid'               # dimension: client id, paid documents only
+DOCUMENTS_CREATED_DAY = 'documents_created_day'  # dimension: "YYYY-MM-DD"
+SUPPLIER_COUNT = 'supplier_count'
+PROCUREMENT_COUNT = 'procurement_count'   # dimension: procurement status
+BID_COUNT = 'bid_count'                   # dimension: bid status
+
+# Written by a rebuild so an empty rollup can be told apart from an empty database
+BUILT_MARKER = 'rollup_built'
+
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+# The dashboard's "recent activity" window; older documents_created_day rows are pruned
+ACTIVITY_DAYS = 7
+
+# Rows dashboard_summary() reads besides the activity window (client totals are ranked in SQL)
+_SUMMARY_METRICS = (INVOICE_COUNT, INVOICE_TOTAL, INVOICE_VAT, SUPPLIER_COUNT, PROCUREMENT_COUNT, BID_COUNT,
+                    BUILT_MARKER)
+
+
+def first_activity_day(now=None):
+    """Oldest ``YYYY-MM-DD`` bucket inside the activity window."""
+    return ((now or datetime.now(timezone.utc)) - timedelta(days=ACTIVITY_DAYS)).strftime('%Y-%m-%d')
+
+
+def _expired_days(first_day):
+    return and_(DashboardMetric.metric == DOCUMENTS_CREATED_DAY, DashboardMetric.dimension < first_day)
+
+
+# ========================
+# Incremental updates
+# ========================
+
+def invoice_snapshot(invoice):
+    """Freeze the invoice fields that feed the rollup. Call it *before* mutating the invoice."""
+    if invoice is None:
+        return None
+    status = invoice.status or 'Pending'
+    return {
+        'document_type': invoice.document_type or 'invoice',
+        # Same bucketing as utils.invoice_stats.invoice_kpis()
+        'status': status if status in STATUSES else 'Other',
+        'total_amount': to_money(invoice.total_amount),
+        'vat_amount': to_money(invoice.vat_amount),
+        'currency': invoice.currency or 'USD',
+        'client_id': invoice.client_id,
+        'created': invoice.date_created or datetime.now(timezone.utc),
+    }
+
+
+def _invoice_contributions(snapshot):
+    """Map one invoice snapshot to the rollup rows it adds to."""
+    if not snapshot:
+        return {}
+
+    key = f"{snapshot['document_type']}:{snapshot['status']}"
+    total = snapshot['total_amount']
+    vat = snapshot['vat_amount']
+    created = snapshot['created']
+
+    contributions = {
+        (INVOICE_COUNT, key): 1,
+        (INVOICE_TOTAL, key): total,
+        (INVOICE_VAT, key): vat,
+    }
+    day = created.strftime('%Y-%m-%d')
+    if day >= first_activity_day():
+        contributions[(DOCUMENTS_CREATED_DAY, day)] = 1
+    if snapshot['status'] == 'Paid':
+        contributions[(CLIENT_PAID, str(snapshot['client_id']))] = total
+    return contributions
+
+
+def _add_to_row(metric, dimension, delta, now):
+    table = DashboardMetric.__table__
+    dialect = db.session.connection().dialect.name
+    if dialect in _INSERTS:
+        stmt = _INSERTS[dialect](table).values(metric=metric, dimension=dimension, value=delta, updated_at=now)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.metric, table.c.dimension],
+            set_={'value': table.c.value + stmt.excluded.value, 'updated_at': now},
+        ))
+    elif db.session.execute(
+        update(table).where(table.c.metric == metric, table.c.dimension == dimension)
+        .values(value=table.c.value + delta, updated_at=now)
+    ).rowcount == 0:
+        db.session.add(DashboardMetric(metric=metric, dimension=dimension, value=delta))
+
+
+def apply_deltas(deltas):
+    """Add each delta to its rollup row, creating missing rows. Does not commit."""
+    now = datetime.utcnow()
+    days_moved = False
+    for (metric, dimension), delta in deltas.items():
+        if not delta:
+            continue
+        _add_to_row(metric, dimension, delta, now)
+        days_moved = days_moved or metric == DOCUMENTS_CREATED_DAY
+    if days_moved:
+        db.session.execute(delete(DashboardMetric).where(_expired_days(first_activity_day()))
+                           .execution_options(synchronize_session=False))
+
+
+def record_invoice_change(invoice, before=None):
+    """
+    Push the difference between ``before`` (an ``invoice_snapshot``, or None for a
+    new document) and the current state of ``invoice`` into the rollup.
+    Call inside the transaction that saves the invoice, before committing.
+    Also keeps the monthly revenue rollup (``utils.revenue_rollup``) in step.
+    """
+    after = invoice_snapshot(invoice)
+    deltas = defaultdict(int)
+    for key, value in _invoice_contributions(after).items():
+        deltas[key] += value
+    for key, value in _invoice_contributions(before).items():
+        deltas[key] -= value
+    apply_deltas(deltas)
+    record_revenue_change(after, before)
+
+
+def bump_metric(metric, dimension='', delta=1):
+    """Increment a single counter, e.g. ``bump_metric(BID_COUNT, 'Won', -1)``."""
+    apply_deltas({(metric, dimension or ''): delta})
+
+
+def record_status_change(metric, old_status, new_status):
+    """Move one row of a per-status counter from ``old_status`` to ``new_status``."""
+    if old_status == new_status:
+        return
+    apply_deltas({(metric, old_status or ''): -1, (metric, new_status or ''): 1})
+
+
+# ========================
+# Live aggregation, rebuild & consistency check
+# ========================
+
+def live_metric_values():
+    """Recompute every rollup row from the source tables."""
+    values = defaultdict(int)
+
+    for document_type, status, count, total, vat in invoice_kpis():
+        key = f"{document_type}:{status}"
+        values[(INVOICE_COUNT, key)] += count
+        values[(INVOICE_TOTAL, key)] += total
+        values[(INVOICE_VAT, key)] += vat
+
+    paid_by_client = db.session.execute(
+        select(Invoice.client_id, func.sum(Invoice.total_amount))
+        .where(Invoice.status == 'Paid')
+        .group_by(Invoice.client_id)
+    ).all()
+    for client_id, total in paid_by_client:
+        values[(CLIENT_PAID, str(client_id))] += total or ZERO
+
+    year = extract('year', Invoice.date_created)
+    month = extract('month', Invoice.date_created)
+    day = extract('day', Invoice.date_created)
+
+    first_day = first_activity_day()
+    created_by_day = db.session.execute(
+        select(year, month, day, func.count(Invoice.id))
+        .where(Invoice.date_created >= datetime.strptime(first_day, '%Y-%m-%d'))
+        .group_by(year, month, day)
+    ).all()
+    for y, m, d, count in created_by_day:
+        if y is None:
+            continue
+        values[(DOCUMENTS_CREATED_DAY, f"{int(y):04d}-{int(m):02d}-{int(d):02d}")] += count
+
+    values[(SUPPLIER_COUNT, '')] += db.session.scalar(select(func.count(Supplier.id))) or 0
+
+    for status, count in db.session.execute(
+        select(ProcurementItem.status, func.count(ProcurementItem.id)).group_by(ProcurementItem.status)
+    ).all():
+        values[(PROCUREMENT_COUNT, status or '')] += count
+
+    for status, count in db.session.execute(
+        select(Bid.status, func.count(Bid.id)).group_by(Bid.status)
+    ).all():
+        values[(BID_COUNT, status or '')] += count
+
+    return dict(values)
+
+
+def build_dashboard_metrics():
+    """Build the rollup unless it already is (for ``upgrade_schema()``). Returns a change description, if any."""
+    if db.session.scalar(select(DashboardMetric.id).where(DashboardMetric.metric == BUILT_MARKER)):
+        return []
+    return [f"dashboard_metric ({rebuild_dashboard_metrics()} rows)"]
+
+
+def rebuild_dashboard_metrics():
+    """Throw the rollup away and recompute it from scratch. Commits; returns the row count."""
+    values = live_metric_values()
+    db.session.execute(delete(DashboardMetric))
+    db.session.add_all(
+        DashboardMetric(metric=metric, dimension=dimension, value=value)
+        for (metric, dimension), value in values.items()
+        if value
+    )
+    db.session.add(DashboardMetric(metric=BUILT_MARKER, dimension='', value=1))
+    db.session.commit()
+    return len(values)
+
+
+def check_dashboard_metrics():
+    """
+    Compare the rollup with the live aggregates.
+    Returns a list of ``(metric, dimension, stored, live)`` tuples that disagree.
+    """
+    live = live_metric_values()
+    stored = {
+        (row.metric, row.dimension): row.value
+        for row in db.session.scalars(select(DashboardMetric).where(
+            DashboardMetric.metric != BUILT_MARKER, not_(_expired_days(first_activity_day()))
+        ))
+    }
+    mismatches = []
+    for key in sorted(set(live) | set(stored)):
+        live_value = live.get(key, 0)
+        stored_value = stored.get(key, 0)
+        if live_value != stored_value:
+            mismatches.append((key[0], key[1], stored_value, live_value))
+    return mismatches
+
+
+# ========================
+# Dashboard read path
+# ========================
+
+def _load_rows(first_day):
+    return db.session.execute(
+        select(DashboardMetric.metric, DashboardMetric.dimension, DashboardMetric.value)
+        .where(or_(DashboardMetric.metric.in_(_SUMMARY_METRICS),
+                   and_(DashboardMetric.metric == DOCUMENTS_CREATED_DAY, DashboardMetric.dimension >= first_day)))
+    ).all()
+
+
+def _top_client():
+    return db.session.execute(
+        select(DashboardMetric.dimension, DashboardMetric.value)
+        .where(DashboardMetric.metric == CLIENT_PAID, DashboardMetric.value > 0)
+        .order_by(DashboardMetric.value.desc())
+        .limit(1)
+    ).first()
+
+
+def dashboard_summary(now=None):
+    """Return the dashboard headline figures as template variables, read from the rollup."""
+    now = now or datetime.now(timezone.utc)
+    first_day = first_activity_day(now)
+
+    rows = _load_rows(first_day)
+    if any(metric == BUILT_MARKER for metric, _, _ in rows):
+        top_client = _top_client()
+    else:
+        # Not built yet (upgrade_schema() does that): aggregate the live tables, read-only
+        live = live_metric_values()
+        rows = [(metric, dimension, value) for (metric, dimension), value in live.items() if metric != CLIENT_PAID]
+        paid = [(dimension, value) for (metric, dimension), value in live.items()
+                if metric == CLIENT_PAID and value > 0]
+        top_client = max(paid, key=lambda row: row[1], default=None)
+
+    metrics = defaultdict(dict)
+    for metric, dimension, value in rows:
+        metrics[metric][dimension] = value
+    kpis = InvoiceKpis.from_rollup(metrics[INVOICE_COUNT], metrics[INVOICE_TOTAL], metrics[INVOICE_VAT])
+
+    top_client_name, top_client_amount = "N/A", ZERO
+    if top_client:
+        dimension, amount = top_client
+        client = db.session.get(Client, int(dimension))
+        if client:
+            top_client_name, top_client_amount = client.name, amount
+
+    return {
+        'pending_invoices': kpis.count('invoice', 'Pending'),
+        'total_revenue': kpis.total('invoice', 'Paid'),
+        'overdue_invoices': kpis.count('invoice', 'Overdue'),
+        'pending_proformas': kpis.count('proforma', 'Pending'),
+        'pending_delivery_notes': kpis.count('delivery_note'),
+        'recent_activity_count': int(sum(
+            v for d, v in metrics[DOCUMENTS_CREATED_DAY].items() if d >= first_day
+        )),
+        'top_client_name': top_client_name,
+        'top_client_amount': top_client_amount,
+        'avg_invoice_value': kpis.average('invoice'),
+        'total_suppliers': int(metrics[SUPPLIER_COUNT].get('', 0)),
+        'pending_procurements': int(metrics[PROCUREMENT_COUNT].get('Ordered', 0)),
+        'total_bids': int(sum(metrics[BID_COUNT].values())),
+        'pending_bids': int(metrics[BID_COUNT].get('Pending', 0)),
+    }
@@ -0,0 +1,180 @@
+# utils/forecasting.py
+"""
+Monthly revenue forecasts for /business_prediction.
+
+``monthly_revenue()`` builds the series of paid-invoice revenue per calendar
+month with one ``GROUP BY year, month`` (served by
+``ix_invoice_status_type_date_created``), filling months without sales with 0.
+``fit_revenue_model()`` fits it by least squares with NumPy:
+
+    revenue[t] = a + b*t + sum_k (c_k cos(2*pi*k*t/12) + s_k sin(2*pi*k*t/12))
+
+i.e. a linear trend plus ``HARMONICS`` Fourier terms of the yearly season. The
+season is only fitted once two full years are available (a single year cannot
+tell a season from noise), the trend once there are three months.
+Forecasts carry prediction intervals from the residual variance and the
+coefficient covariance, with Student-t quantiles.
+
+    forecast = revenue_forecast(horizon=6)
+    for point in forecast.points:
+        point.month, point.revenue, point.lower, point.upper
+
+The fitted model is cached per database and reused until the invoice table
+changes (its ``data_version`` counter, a single-row lookup) or a new month
+begins, so the page only refits after invoices were written.
+"""
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timezone
+
+import numpy as np
+from sqlalchemy import func, select
+
+from models_core import db
+from models_core.data_version import data_versions
+from models_core.models import Invoice
+from models_core.money import to_money
+
+SEASON = 12
+HARMONICS = 3
+
+ForecastPoint = namedtuple('ForecastPoint', 'month revenue lower upper')
+RevenueForecast = namedtuple('RevenueForecast', 'history points level model')
+
+_lock = threading.Lock()
+# {database url: (fingerprint, history, model)}
+_fitted = {}
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _paid_invoices():
+    return (Invoice.status == 'Paid', Invoice.document_type == 'invoice')
+
+
+def monthly_revenue(until=None):
+    """
+    ``[(first day of month, Decimal revenue)]`` of paid invoices, one grouped query.
+
+    The series runs from the first month with a paid invoice up to, but not
+    including, ``until`` (default: the current month, which is still
+    incomplete); months without revenue are 0.
+    """
+    until = _month_start(until or datetime.now(timezone.utc).date())
+    year = func.extract('year', Invoice.date_created)
+    month = func.extract('month', Invoice.date_created)
+    rows = db.session.execute(
+        select(year, month, func.sum(Invoice.total_amount))
+        .where(*_paid_invoices(), Invoice.date_created < until)
+        .group_by(year, month)
+    ).all()
+    totals = {date(int(y), int(m), 1): to_money(total) for y, m, total in rows}
+    if not totals:
+        return []
+    series, current = [], min(totals)
+    while current < until:
+        series.append((current, totals.get(current, to_money(0))))
+        current = _add_months(current, 1)
+    return series
+
+
+def _design(steps, trend, harmonics):
+    columns = [np.ones_like(steps)]
+    if trend:
+        columns.append(steps)
+    for k in range(1, harmonics + 1):
+        angle = 2 * np.pi * k * steps / SEASON
+        columns += [np.cos(angle), np.sin(angle)]
+    return np.column_stack(columns)
+
+
+class RevenueModel:
+    """A least-squares trend + seasonality fit of a monthly series, with what prediction intervals need."""
+
+    def __init__(self, values, start):
+        y = np.asarray(values, dtype=np.float64)
+        self.start = start
+        self.n = len(y)
+        self.trend = self.n >= 3
+        self.harmonics = HARMONICS if self.n >= 2 * SEASON else 0
+        X = _design(np.arange(self.n, dtype=np.float64), self.trend, self.harmonics)
+        self.coef = np.linalg.lstsq(X, y, rcond=None)[0] if self.n else np.zeros(X.shape[1])
+        residuals = y - X @ self.coef
+        self.dof = self.n - X.shape[1]
+        self.sigma = float(np.sqrt(residuals @ residuals / self.dof)) if self.dof > 0 else 0.0
+        self.xtx_inv = np.linalg.pinv(X.T @ X)
+
+    @property
+    def monthly_trend(self):
+        """Fitted revenue change per month."""
+        return float(self.coef[1]) if self.trend else 0.0
+
+    def fitted(self):
+        """The in-sample fit, one value per month of the series."""
+        return _design(np.arange(self.n, dtype=np.float64), self.trend, self.harmonics) @ self.coef
+
+    def predict(self, horizon, level=0.95):
+        """``(months, mean, lower, upper)`` for the ``horizon`` months after the series."""
+        steps = np.arange(self.n, self.n + horizon, dtype=np.float64)
+        X = _design(steps, self.trend, self.harmonics)
+        mean = X @ self.coef
+        # Prediction (not confidence) interval: new-observation noise plus coefficient uncertainty
+        spread = self.sigma * np.sqrt(1 + np.einsum('ij,jk,ik->i', X, self.xtx_inv, X))
+        half_width = _t_quantile(level, self.dof) * spread if self.dof > 0 else np.zeros(horizon)
+        months = [_add_months(self.start, self.n + step) for step in range(horizon)]
+        return months, mean, mean - half_width, mean + half_width
+
+
+def _t_quantile(level, dof):
+    from scipy.stats import t  # only needed once intervals are drawn; scipy is slow to import
+
+    return float(t.ppf((1 + level) / 2, dof))
+
+
+def fit_revenue_model(values, start=None):
+    """Fit ``values`` (one per month from ``start``) and return the ``RevenueModel``."""
+    return RevenueModel(values, start or date.today().replace(day=1))
+
+
+def _fingerprint(until):
+    """Changes whenever a transaction writes to the invoice table, or a month ends."""
+    return until, data_versions('invoice')['invoice']
+
+
+def revenue_model(today=None):
+    """``(history, model)`` for the current paid invoices, fitted once per change."""
+    until = _month_start(today or datetime.now(timezone.utc).date())
+    key = str(db.engine.url)
+    fingerprint = _fingerprint(until)
+    cached = _fitted.get(key)
+    if cached and cached[0] == fingerprint:
+        return cached[1], cached[2]
+    with _lock:
+        history = monthly_revenue(until)
+        model = fit_revenue_model([float(amount) for _, amount in history],
+                                  history[0][0] if history else until)
+        _fitted[key] = (fingerprint, history, model)
+    return history, model
+
+
+def revenue_forecast(horizon=6, level=0.95, today=None):
+    """
+    ``RevenueForecast`` for the next ``horizon`` months (the current one first).
+
+    Amounts are ``Decimal`` like every other money value; revenue cannot be
+    negative, so point forecasts and bounds are floored at zero.
+    """
+    history, model = revenue_model(today)
+    points = []
+    if history:
+        months, mean, lower, upper = model.predict(horizon, level)
+        for month, values in zip(months, zip(mean, lower, upper)):
+            points.append(ForecastPoint(month, *(to_money(round(max(value, 0.0), 2)) for value in values)))
+    return RevenueForecast(history, points, level, model)
@@ -0,0 +1,59 @@
+# utils/http_cache.py
+"""
+Conditional GET for the JSON endpoints the dashboard polls.
+
+``@etag_cached('invoice', 'client')`` derives the response ETag from the
+change counters of the tables the view reads (``models_core.data_version``),
+the URL and an optional extra key, *before* running the view. A client that
+sends the same ETag back in ``If-None-Match`` gets an empty 304 for the price
+of that one counter lookup; otherwise the view runs as usual and its 200
+response is tagged.
+
+Responses are marked ``private`` (they sit behind the login) and ``no-cache``
+(the browser stores them but asks again every time), or ``max-age=<n>`` when
+a few seconds of staleness are acceptable.
+"""
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from models_core.data_version import data_versions
+
+
+def data_etag(tables, *key):
+    """Opaque ETag for the current versions of ``tables`` plus ``key`` (URL, month, ...)."""
+    versions = sorted(data_versions(*tables).items())
+    payload = repr((versions, key))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def _cache_headers(response, etag, max_age):
+    response.set_etag(etag)
+    response.cache_control.private = True
+    if max_age:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def etag_cached(*tables, max_age=0, key=None):
+    """
+    Answer ``If-None-Match`` with 304 while none of ``tables`` changed.
+
+    ``key`` is a callable returning anything else the response depends on,
+    e.g. the current month for "this month's revenue".
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = data_etag(tables, request.full_path, key() if key else None)
+            if request.if_none_match.contains_weak(etag):
+                return _cache_headers(current_app.response_class(status=304), etag, max_age)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            return _cache_headers(response, etag, max_age)
+        return wrapper
+    return decorator
@@ -0,0 +1,60 @@
+# utils/inventory_alerts.py
+"""
+Low-stock and out-of-stock alerts for the dashboard, computed in SQL.
+
+An item is *out of stock* at ``quantity_on_hand = 0`` and *low on stock* at
+``0 < quantity_on_hand <= reorder_point``. Each set has a partial index on
+``our_product_service`` holding only its rows
+(``ix_our_product_service_low_stock`` / ``ix_our_product_service_out_of_stock``),
+so ``inventory_alerts()`` costs two index-only counts and two short index
+scans for the first ``limit`` items: it grows with the number of alerting
+items, not with the size of the catalogue.
+"""
+from collections import namedtuple
+
+from sqlalchemy import and_, func, select
+
+from models_core import db
+from models_core.models import OurProductService
+
+# Items listed per alert on the dashboard; the counts are always exact
+TOP_N = 10
+
+StockAlert = namedtuple('StockAlert', 'id name quantity_on_hand reorder_point')
+InventoryAlerts = namedtuple('InventoryAlerts', 'low_stock_count out_of_stock_count low_stock out_of_stock')
+
+# Must stay in step with the WHERE clauses of the partial indexes, or the planner cannot use them
+LOW_STOCK = and_(OurProductService.quantity_on_hand > 0,
+                 OurProductService.quantity_on_hand <= OurProductService.reorder_point)
+OUT_OF_STOCK = OurProductService.quantity_on_hand == 0
+
+_COLUMNS = (OurProductService.id, OurProductService.name,
+            OurProductService.quantity_on_hand, OurProductService.reorder_point)
+
+
+def _count(condition):
+    return select(func.count()).select_from(OurProductService).where(condition).scalar_subquery()
+
+
+def inventory_alerts(limit=TOP_N):
+    """
+    Alert counts plus the ``limit`` most urgent items of each kind: low stock
+    by lowest quantity first, out of stock by name.
+    """
+    low_count, out_count = db.session.execute(select(_count(LOW_STOCK), _count(OUT_OF_STOCK))).one()
+    low_stock = db.session.execute(
+        select(*_COLUMNS).where(LOW_STOCK)
+        .order_by(OurProductService.quantity_on_hand, OurProductService.name, OurProductService.id)
+        .limit(limit)
+    ).all()
+    out_of_stock = db.session.execute(
+        select(*_COLUMNS).where(OUT_OF_STOCK)
+        .order_by(OurProductService.name, OurProductService.id)
+        .limit(limit)
+    ).all()
+    return InventoryAlerts(
+        low_stock_count=low_count,
+        out_of_stock_count=out_count,
+        low_stock=[StockAlert(*row) for row in low_stock],
+        out_of_stock=[StockAlert(*row) for row in out_of_stock],
+    )
@@ -0,0 +1,125 @@
+# utils/invoice_stats.py
+"""
+Single-pass invoice KPI queries.
+
+Instead of one ``Invoice.query.filter_by(status=..., document_type=...).count()``
+per figure, ``invoice_kpis()`` computes the whole status x document_type matrix
+(count, total_amount, vat_amount) with one ``GROUP BY document_type`` and
+conditional ``SUM(CASE ...)`` columns, and ``client_revenue()`` ranks clients the
+same way.  Callers then read any cell from the returned ``InvoiceKpis``.
+Amounts stay exact: totals and VAT are ``Decimal`` cents, as the ``Money``
+columns return them.
+"""
+from sqlalchemy import case, func, select
+
+from models_core import db
+from models_core.models import Client, Invoice
+from models_core.money import ZERO, to_money
+
+DOCUMENT_TYPES = ('invoice', 'proforma', 'delivery_note')
+STATUSES = ('Pending', 'Sent', 'Paid', 'Overdue', 'Cancelled')
+
+
+class InvoiceKpis:
+    """
+    Count / total / VAT per (document_type, status) cell.
+
+    Every accessor takes optional ``document_type`` and ``status`` filters; leaving
+    one out sums across it, e.g. ``kpis.count('delivery_note')`` or
+    ``kpis.total(status='Paid')``.
+    """
+
+    def __init__(self, cells=None):
+        # {(document_type, status): [count, total_amount, vat_amount]}
+        self.cells = cells or {}
+
+    @classmethod
+    def from_rollup(cls, counts, totals, vats):
+        """Build from ``{"<document_type>:<status>": value}`` dicts (see utils/dashboard_metrics.py)."""
+        cells = {}
+        for source, index in ((counts, 0), (totals, 1), (vats, 2)):
+            for key, value in source.items():
+                document_type, _, status = key.partition(':')
+                cells.setdefault((document_type, status), [0, ZERO, ZERO])[index] = value
+        return cls(cells)
+
+    def _sum(self, index, document_type=None, status=None):
+        return sum(
+            (values[index]
+             for (cell_type, cell_status), values in self.cells.items()
+             if (document_type is None or cell_type == document_type)
+             and (status is None or cell_status == status)),
+            0 if index == 0 else ZERO,
+        )
+
+    def count(self, document_type=None, status=None):
+        return int(self._sum(0, document_type, status))
+
+    def total(self, document_type=None, status=None):
+        return to_money(self._sum(1, document_type, status))
+
+    def vat(self, document_type=None, status=None):
+        return to_money(self._sum(2, document_type, status))
+
+    def average(self, document_type=None, status=None):
+        count = self.count(document_type, status)
+        return to_money(self.total(document_type, status) / count) if count else ZERO
+
+    def document_types(self):
+        return sorted({document_type for document_type, _ in self.cells})
+
+    def __iter__(self):
+        """Yield ``(document_type, status, count, total, vat)`` for every non-empty cell."""
+        for (document_type, status), (count, total, vat) in sorted(self.cells.items()):
+            if count:
+                yield document_type, status, int(count), to_money(total), to_money(vat)
+
+
+def invoice_kpis(*criteria):
+    """
+    Return the ``InvoiceKpis`` matrix in one round-trip.
+
+    ``criteria`` are extra ``WHERE`` clauses, e.g. ``Invoice.client_id == 3``.
+    Statuses outside ``STATUSES`` are kept in an ``'Other'`` bucket so the
+    per-type totals always match a plain ``GROUP BY``.
+    """
+    columns = [Invoice.document_type, func.count(Invoice.id),
+               func.coalesce(func.sum(Invoice.total_amount), 0),
+               func.coalesce(func.sum(Invoice.vat_amount), 0)]
+    for status in STATUSES:
+        matches = func.coalesce(Invoice.status, 'Pending') == status
+        columns += [
+            func.sum(case((matches, 1), else_=0)),
+            func.sum(case((matches, Invoice.total_amount), else_=0)),
+            func.sum(case((matches, Invoice.vat_amount), else_=0)),
+        ]
+
+    rows = db.session.execute(select(*columns).where(*criteria).group_by(Invoice.document_type)).all()
+
+    cells = {}
+    for row in rows:
+        document_type, all_count, all_total, all_vat = row[:4]
+        known = [0, ZERO, ZERO]
+        for i, status in enumerate(STATUSES):
+            count, total, vat = row[4 + 3 * i:7 + 3 * i]
+            if count:
+                total, vat = to_money(total), to_money(vat)
+                cells[(document_type, status)] = [count, total, vat]
+                known = [known[0] + count, known[1] + total, known[2] + vat]
+        if all_count > known[0]:
+            cells[(document_type, 'Other')] = [all_count - known[0],
+                                               to_money(all_total) - known[1], to_money(all_vat) - known[2]]
+    return InvoiceKpis(cells)
+
+
+def client_revenue(limit=5, status='Paid'):
+    """Top clients by the sum of their ``status`` documents, as ``(name, amount)`` rows."""
+    amount = func.sum(case((Invoice.status == status, Invoice.total_amount), else_=0))
+    return db.session.execute(
+        select(Client.name, amount.label('amount'))
+        .join(Invoice, Invoice.client_id == Client.id)
+        .group_by(Client.id, Client.name)
+        .having(amount > 0)
+        .order_by(amount.desc())
+        .limit(limit)
+    ).all()
@@ -0,0 +1,46 @@
+# utils/lazy_views.py
+"""
+Routes whose view module is imported on the first request that hits them.
+
+The analysis pages pull in NumPy and SciPy (utils/forecasting.py), which
+would otherwise be imported by every worker at boot even though most requests
+never touch them. ``app.py`` declares those URLs up front with
+
+    add_lazy_routes(app, 'views.analysis', [
+        ('/business_prediction', 'business_prediction', {}),
+    ])
+
+and ``views/analysis.py`` (and whatever it imports) is only loaded when one of
+them is first requested. Endpoint names stay the plain function names, so
+``url_for('business_prediction')`` keeps working unchanged.
+"""
+import threading
+
+from werkzeug.utils import import_string
+
+
+class LazyView:
+    """Stands in for ``<module>.<name>`` and imports it on the first call."""
+
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+        self._view = None
+        self._lock = threading.Lock()
+
+    @property
+    def view(self):
+        if self._view is None:
+            with self._lock:
+                if self._view is None:
+                    self._view = import_string(self.import_name)
+        return self._view
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def add_lazy_routes(app, module, routes):
+    """Register ``(rule, function name, add_url_rule options)`` routes served from ``module``."""
+    for rule, name, options in routes:
+        app.add_url_rule(rule, endpoint=name, view_func=LazyView(f"{module}.{name}"), **options)
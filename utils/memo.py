@@ -0,0 +1,155 @@
+# utils/memo.py
+"""
+Per-process memoization for read helpers whose data changes rarely.
+
+    @memoize(ttl=60, maxsize=32, tags=('our_product_service',))
+    def get_inventory_alerts(): ...
+
+    invalidate('our_product_service')   # after add/edit/delete of a product
+
+Each decorated function gets its own ``MemoCache``: results are keyed on the
+database URL and the call arguments, expire ``ttl`` seconds after they were
+computed, and the least recently used entry is evicted once ``maxsize``
+entries are held. ``invalidate(*tags)`` empties every cache carrying one of
+the tags; routes call it right after committing a change. It only reaches
+the process it runs in, so other workers serve their copy until its TTL
+runs out -- keep TTLs short for anything a user expects to see change.
+
+Cached values are shared between requests and threads: cache plain rows or
+tuples, never ORM instances (they would be detached from the next request's
+session), and do not modify what you get back.
+
+``cache_stats()`` reports hits, misses, evictions, entry counts and an
+approximate size in bytes per cache, for monitoring.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import has_app_context
+
+from models_core import db
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def approximate_size(value):
+    """Shallow ``sys.getsizeof`` of ``value`` plus its items for lists, tuples, sets and dicts."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + approximate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class MemoCache:
+    """TTL + LRU store for one function's results, with hit/miss counters."""
+
+    def __init__(self, name, ttl, maxsize, tags=()):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.tags = frozenset(tags)
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+        self.size = 0
+
+    def get(self, key, now=None):
+        """``(True, value)`` for a live entry, ``(False, None)`` otherwise."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, value, now=None):
+        now = time.monotonic() if now is None else now
+        size = approximate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (now + self.ttl, value, size)
+            self.size += size
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        self.size -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'bytes': self.size,
+                'ttl': self.ttl,
+            }
+
+
+def _database_key():
+    # Results of one database must never answer for another (tests, several apps per process)
+    return str(db.engine.url) if has_app_context() else None
+
+
+def memoize(ttl=60, maxsize=128, tags=()):
+    """Cache the decorated function's results (see module docstring). Arguments must be hashable."""
+    def decorator(func):
+        cache = MemoCache(f"{func.__module__}.{func.__qualname__}", ttl, maxsize, tags)
+        with _registry_lock:
+            _registry[cache.name] = cache
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (_database_key(), args, tuple(sorted(kwargs.items())))
+            found, value = cache.get(key)
+            if not found:
+                value = func(*args, **kwargs)
+                cache.put(key, value)
+            return value
+
+        wrapper.cache = cache
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags):
+    """Empty every cache tagged with one of ``tags`` (in this process)."""
+    tags = set(tags)
+    with _registry_lock:
+        caches = [cache for cache in _registry.values() if cache.tags & tags]
+    for cache in caches:
+        cache.clear()
+
+
+def cache_stats():
+    """``{cache name: counters}`` for every memoized function."""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,157 @@
+# utils/pagination.py
+"""
+Keyset (seek) pagination shared by the list views.
+
+Instead of ``OFFSET n`` -- which makes the database walk and discard every
+earlier row -- each page is fetched with ``WHERE (sort_col, id) > (:last_value,
+:last_id) ORDER BY sort_col, id LIMIT per_page + 1`` so page 1 and page 1,000
+cost the same when ``(sort_col, id)`` is indexed.
+
+Usage in a route::
+
+    query = apply_search(Client.query, Client.name)
+    page = paginate_request(query, {'name': Client.name}, default_sort='name')
+    return render_template('clients/list.html', clients=page.items, page=page)
+
+and in the template::
+
+    {% from "_pagination.html" import render_pagination, sort_link %}
+    {{ render_pagination(page, 'list_clients') }}
+"""
+import base64
+import json
+
+from flask import request
+from sqlalchemy import tuple_
+
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 100
+
+
+class KeysetPage:
+    """One page of results plus the cursors needed to build next/prev links."""
+
+    def __init__(self, items, sort, direction, per_page, has_next, has_prev,
+                 next_cursor=None, prev_cursor=None, args=None):
+        self.items = items
+        self.sort = sort
+        self.direction = direction
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        # Filter/sort query args to carry over into next/prev links
+        self.args = args or {}
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def link_args(self, **overrides):
+        """Query args for a link that keeps the current filters and sort."""
+        args = {k: v for k, v in self.args.items() if k not in ('after', 'before')}
+        args.update({'sort': self.sort, 'dir': self.direction, 'per_page': self.per_page})
+        args.update(overrides)
+        return {k: v for k, v in args.items() if v not in (None, '')}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from a URL; returns None for anything malformed."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) and len(values) == 2 else None
+
+
+def keyset_paginate(query, sort_column, id_column, direction='asc', per_page=DEFAULT_PER_PAGE,
+                    after=None, before=None, sort='id', args=None):
+    """
+    Return a ``KeysetPage`` of ``query`` ordered by ``(sort_column, id_column)``.
+
+    ``after`` / ``before`` are cursors taken from a previous page; at most one is used.
+    ``sort_column`` must be NOT NULL, otherwise rows with NULLs are skipped.
+    """
+    descending = direction == 'desc'
+    after_values = decode_cursor(after)
+    before_values = None if after_values else decode_cursor(before)
+    key = tuple_(sort_column, id_column)
+
+    # Walking backwards ("before") flips both the comparison and the ordering
+    backwards = before_values is not None
+    ascending = descending == backwards
+    if after_values:
+        query = query.filter(key < tuple(after_values) if descending else key > tuple(after_values))
+    elif backwards:
+        query = query.filter(key > tuple(before_values) if descending else key < tuple(before_values))
+
+    order = (sort_column.asc(), id_column.asc()) if ascending else (sort_column.desc(), id_column.desc())
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(row):
+        return encode_cursor([getattr(row, sort_column.key), getattr(row, id_column.key)])
+
+    return KeysetPage(
+        items=rows,
+        sort=sort,
+        direction=direction,
+        per_page=per_page,
+        has_next=bool(rows) and (backwards or has_more),
+        has_prev=bool(rows) and (has_more if backwards else after_values is not None),
+        next_cursor=cursor_for(rows[-1]) if rows else None,
+        prev_cursor=cursor_for(rows[0]) if rows else None,
+        args=args,
+    )
+
+
+def apply_search(query, column, arg='q'):
+    """Filter ``query`` to rows whose ``column`` contains the ``q`` query-string arg."""
+    term = request.args.get(arg, '').strip()
+    return query.filter(column.ilike(f"%{term}%")) if term else query
+
+
+def paginate_request(query, sortable, default_sort, default_direction='asc', id_column=None):
+    """
+    Paginate ``query`` using the ``sort``, ``dir``, ``per_page``, ``after`` and
+    ``before`` query-string args. ``sortable`` maps the allowed ``sort`` values
+    to columns; anything else falls back to ``default_sort``.
+    """
+    entity = query.column_descriptions[0]['entity']
+    id_column = id_column if id_column is not None else entity.id
+
+    sort = request.args.get('sort', default_sort)
+    if sort not in sortable:
+        sort = default_sort
+    direction = request.args.get('dir', default_direction)
+    if direction not in ('asc', 'desc'):
+        direction = default_direction
+    per_page = request.args.get('per_page', DEFAULT_PER_PAGE, type=int) or DEFAULT_PER_PAGE
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+
+    return keyset_paginate(
+        query,
+        sortable[sort],
+        id_column,
+        direction=direction,
+        per_page=per_page,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        sort=sort,
+        args=request.args.to_dict(),
+    )
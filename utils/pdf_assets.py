@@ -0,0 +1,69 @@
+# utils/pdf_assets.py
+"""
+Process-wide cache of decoded company images (logo, signature, stamp) for PDF
+rendering.
+
+Handing ReportLab a filename makes it open and decode the file on every
+render. ``asset_cache.get_image(path)`` instead returns a shared
+``ImageReader`` whose pixel data is decoded once and reused by every later
+render. Entries are keyed by path plus (mtime, size), so replacing a file is
+picked up automatically; the upload routes also call ``invalidate`` after
+writing.
+
+Readers are fully decoded before they are shared, so the background render
+workers only ever read from them.
+"""
+import os
+import threading
+from io import BytesIO
+
+
+def _decode(path):
+    from reportlab.lib.utils import ImageReader
+
+    with open(path, 'rb') as f:
+        reader = ImageReader(BytesIO(f.read()))
+    reader.getRGBData()
+    if reader._dataA is not None:  # alpha channel, used for mask='auto'
+        reader._dataA.getRGBData()
+    return reader
+
+
+class AssetCache:
+    def __init__(self):
+        self._entries = {}  # path -> ((mtime_ns, size), ImageReader)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get_image(self, path):
+        """Return a decoded ``ImageReader`` for ``path``, or None if the file does not exist."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.invalidate(path)
+            return None
+        version = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            reader = _decode(path)
+            self._entries[path] = (version, reader)
+            self.loads += 1
+            return reader
+
+    def invalidate(self, path=None):
+        """Forget ``path`` (or everything) so the next render reloads it."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'loads': self.loads}
+
+
+asset_cache = AssetCache()
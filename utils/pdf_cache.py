@@ -0,0 +1,260 @@
+# utils/pdf_cache.py
+"""
+Content-addressed cache of rendered document PDFs.
+
+Re-downloading or re-previewing an unchanged document used to redraw the whole
+PDF. ``generate_invoice_pdf`` now looks the render up first, keyed by a hash of
+the normalized form data, document type, preview flag and the company settings
+version (see ``utils.pdf_generator.settings_version``), so any change to the
+inputs is a miss and stale PDFs are never served.
+
+Layout under the cache directory::
+
+    objects/<ab>/<sha256 of the PDF>.pdf   the bytes, stored once
+    keys/<ab>/<sha256 of the inputs>       the object hash for that render
+
+Identical PDFs produced from different keys share one object, and saved
+documents are hard-linked to it instead of written again. The directory is
+kept under ``PDF_CACHE_MAX_BYTES`` by evicting the least recently used objects
+(mtime is touched on every hit) together with the key files naming them. All
+writes go through a temp file and ``os.replace`` so concurrent render workers
+never see partial files.
+
+``put`` only adds the bytes it wrote to a running total; the directory is
+walked when that total goes over budget, and eviction then goes down to
+``LOW_WATER`` of it so the next walk is many renders away. The total is per
+process (other workers' writes show up at the next walk). Objects also
+hard-linked into ``generated_pdfs`` (``st_nlink > 1``) are neither counted
+nor evicted: deleting them would free no disk.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app, has_app_context
+
+# Bump when the drawing code changes so old renders stop matching
+RENDERER_VERSION = 2
+
+# Eviction frees space down to this fraction of the budget
+LOW_WATER = 0.9
+
+
+def _normalize(value):
+    """Canonical JSON-able form: 10, 10.0 and Decimal('10.00') hash the same."""
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        try:
+            number = Decimal(str(value))
+        except InvalidOperation:
+            return str(value)
+        return format(number.normalize(), 'f') if number.is_finite() else str(number)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class RenderCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None  # running total of key files and unlinked objects; None until the first walk
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(form_data, document_type, preview, settings_version):
+        payload = json.dumps(
+            [RENDERER_VERSION, document_type, bool(preview), _normalize(settings_version), _normalize(form_data)],
+            sort_keys=True, separators=(',', ':'),
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _key_path(self, key):
+        return os.path.join(self.root, 'keys', key[:2], key)
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], f"{digest}.pdf")
+
+    def _lookup(self, key):
+        """Path of the cached object for ``key``, or None."""
+        try:
+            with open(self._key_path(key)) as f:
+                path = self._object_path(f.read().strip())
+        except OSError:
+            return None
+        return path if os.path.exists(path) else None
+
+    def get(self, key):
+        """Cached PDF bytes for ``key``, or None on a miss."""
+        path = self._lookup(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # LRU: most recently used survives eviction
+        except (OSError, TypeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, pdf_bytes):
+        digest = hashlib.sha256(pdf_bytes).hexdigest()
+        path = self._object_path(digest)
+        added = 0
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            _atomic_write(path, pdf_bytes)
+            added += len(pdf_bytes)
+        key_path = self._key_path(key)
+        if not os.path.exists(key_path):
+            added += len(digest)
+        _atomic_write(key_path, digest.encode('ascii'))
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += added
+            over = self._bytes is None or self._bytes > self.max_bytes
+        if over:
+            self.evict()
+        return path
+
+    def link(self, key, dest):
+        """Hard-link the cached object for ``key`` to ``dest``; False if that is not possible."""
+        path = self._lookup(key)
+        if not path:
+            return False
+        tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(path, tmp)
+            os.replace(tmp, dest)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        return True
+
+    def _objects(self):
+        """``{digest: (mtime_ns, size, nlink, path)}`` for every stored object."""
+        objects = {}
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, 'objects')):
+            for name in filenames:
+                if name.endswith('.pdf'):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    objects[name[:-len('.pdf')]] = (st.st_mtime_ns, st.st_size, st.st_nlink, path)
+        return objects
+
+    def _keys(self):
+        """``{digest: [(key file, size)]}``: the key files naming each object."""
+        keys = {}
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, 'keys')):
+            for name in filenames:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    with open(path) as f:
+                        digest = f.read().strip()
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                keys.setdefault(digest, []).append((path, size))
+        return keys
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        return True
+
+    def evict(self):
+        """
+        Walk the cache and, if it is over ``max_bytes``, drop least recently
+        used objects (and their key files) until it fits ``LOW_WATER`` of it.
+        Key files of objects already gone are removed as well. Returns the bytes left.
+        """
+        with self._lock:
+            # Keys first: put() writes the object before its key, so every key seen has its object listed
+            keys = self._keys()
+            objects = self._objects()
+            total = 0
+            for digest, key_files in keys.items():
+                if digest in objects:
+                    total += sum(size for _, size in key_files)
+                else:
+                    for path, _ in key_files:
+                        self._remove(path)
+            unlinked = sorted((mtime, size, path, digest)
+                              for digest, (mtime, size, nlink, path) in objects.items() if nlink == 1)
+            total += sum(size for _, size, _, _ in unlinked)
+            if total > self.max_bytes:
+                target = self.max_bytes * LOW_WATER
+                for _, size, path, digest in unlinked:
+                    if total <= target:
+                        break
+                    if not self._remove(path):
+                        continue
+                    total -= size
+                    self.evictions += 1
+                    for key_path, key_size in keys.get(digest, ()):
+                        if self._remove(key_path):
+                            total -= key_size
+            self._bytes = total
+            return total
+
+    def stats(self):
+        objects, keys = self._objects(), self._keys()
+        key_files = [size for entries in keys.values() for _, size in entries]
+        return {
+            'objects': len(objects), 'linked': sum(1 for _, _, nlink, _ in objects.values() if nlink > 1),
+            'keys': len(key_files), 'bytes': sum(size for _, size, _, _ in objects.values()) + sum(key_files),
+            'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_render_cache():
+    """The app's render cache, or None when disabled or outside an app context."""
+    if not has_app_context() or not current_app.config.get('PDF_CACHE_ENABLED', True):
+        return None
+    root = current_app.config.get('PDF_CACHE_DIR') or os.path.join(current_app.instance_path, 'pdf_cache')
+    max_bytes = current_app.config.get('PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = RenderCache(root, max_bytes)
+        cache.max_bytes = max_bytes
+        return cache
@@ -295,13 +295,28 @@
 # utils/pdf_generator.py
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
 from reportlab.lib.colors import black
 from decimal import Decimal
+from collections import namedtuple
+from functools import lru_cache
 import os
 from io import BytesIO
 from flask import current_app as app
 
+from utils.pdf_assets import asset_cache
+from utils.pdf_cache import get_render_cache
+from utils.pricing import price_lines
+
+# Stamp the letterhead and table header as form XObjects (drawn once per
+# document, referenced from every page). False redraws them on each page;
+# the output looks the same, only larger and slower (see benchmarks/).
+USE_PAGE_FORMS = True
+
+# Continuation pages start below the letterhead band
+LETTERHEAD_BOTTOM = 150
+
+Letterhead = namedtuple('Letterhead', 'company_name company_id contact_lines logo_path')
+
 
 def to_decimal(value, default='0.00'):
     if value is None or value == '':
@@ -322,70 +337,138 @@ def get_static_file_path(relative_path):
         return os.path.join(base_dir, 'static', 'uploads', relative_path)
 
 
-def generate_invoice_pdf(form_data, preview=False, document_type='invoice', save_to_disk=True):
-    print(f"🖨️ PDF Generator: {document_type}, preview={preview}, save_to_disk={save_to_disk}")
-    print("\n📊 FINAL ITEMS BEING DRAWN IN PDF:")
-    for i, item in enumerate(form_data['items']):
-        desc = item['description'][:30] + "..." if len(item['description']) > 30 else item['description']
-        unit_price = float(item.get('unit_price') or 0.0)
-        total_price = float(item.get('total_price') or 0.0)
-        quantity = item['quantity']
-        print(f" {i+1}. '{desc}' x{quantity} @ ${unit_price:.2f} = ${total_price:.2f}")
+@lru_cache(maxsize=32)
+def _letterhead(company_name, company_id, phone, email, website, logo_image_path):
+    """Resolved letterhead for one version of the company settings."""
+    contact_lines = tuple(line for line in (
+        f"📞 {phone}" if phone else None,
+        f"✉️ {email}" if email else None,
+        f"🌐 {website}" if website else None,
+    ) if line)
+    logo_path = get_static_file_path(logo_image_path) if logo_image_path else None
+    return Letterhead(company_name, company_id, contact_lines, logo_path)
 
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    margin = 56.69  # ~2cm
-    y = height - margin
 
-    try:
-        from models_core.models import get_or_create_company_settings
-        settings = get_or_create_company_settings()
-    except Exception as e:
-        print(f"⚠️ Could not load company settings: {e}")
-        settings = None
+def letterhead_for(settings):
+    """Cached ``Letterhead`` keyed by the settings fields it depends on."""
+    if not settings:
+        return _letterhead('APEX BNN SERVICES', 'N/A', None, None, None, None)
+    return _letterhead(settings.name, settings.company_id, settings.phone, settings.email,
+                       settings.website, settings.logo_image_path)
 
+
+def _draw_letterhead(c, letterhead, width, height, margin):
     # --- Watermark Logo ---
-    if settings and settings.logo_image_path:
-        logo_path = get_static_file_path(settings.logo_image_path)
-        if os.path.exists(logo_path):
-            c.saveState()
-            c.setFillAlpha(0.15)
-            try:
-                img = ImageReader(logo_path)
-                w, h = width * 0.4, (width * 0.4) / (img.getSize()[0] / img.getSize()[1])
-                c.drawImage(img, (width - w) / 2, (height - h) / 2,
-                            width=w, height=h, mask='auto', preserveAspectRatio=True)
-            except Exception as err:
-                print(f"❌ Failed to draw logo: {err}")
-            c.restoreState()
+    if letterhead.logo_path and os.path.exists(letterhead.logo_path):
+        c.saveState()
+        c.setFillAlpha(0.15)
+        try:
+            img = asset_cache.get_image(letterhead.logo_path)
+            w, h = width * 0.4, (width * 0.4) / (img.getSize()[0] / img.getSize()[1])
+            c.drawImage(img, (width - w) / 2, (height - h) / 2,
+                        width=w, height=h, mask='auto', preserveAspectRatio=True)
+        except Exception as err:
+            print(f"❌ Failed to draw logo: {err}")
+        c.restoreState()
 
     # --- Company Info (Top Left) ---
-    company_name = getattr(settings, 'name', 'APEX BNN SERVICES')
-    company_id = getattr(settings, 'company_id', 'N/A')
-
+    y = height - margin
     c.setFont("Helvetica-Bold", 16)
-    c.drawString(margin, y, company_name)
+    c.drawString(margin, y, letterhead.company_name)
 
     # --- Company ID (Top Right) ---
     c.setFont("Helvetica", 10)
-    c.drawRightString(width - 100, height - 100, f"ID: {company_id}")
+    c.drawRightString(width - 100, height - 100, f"ID: {letterhead.company_id}")
 
     # Contact Info Below Company Name
     c.setFont("Helvetica", 9)
     contact_y = y - 15
-    if settings:
-        if settings.phone:
-            c.drawString(margin, contact_y, f"📞 {settings.phone}")
-            contact_y -= 12
-        if settings.email:
-            c.drawString(margin, contact_y, f"✉️ {settings.email}")
-            contact_y -= 12
-        if settings.website:
-            c.drawString(margin, contact_y, f"🌐 {settings.website}")
-            contact_y -= 12
-
-    y = height - 150
+    for line in letterhead.contact_lines:
+        c.drawString(margin, contact_y, line)
+        contact_y -= 12
+
+
+def _draw_table_header(c, headers, columns, width, margin):
+    """Column titles on baseline 0 and the rule 15pt below; callers translate to the row."""
+    c.setFont("Helvetica-Bold", 11)
+    for i, head in enumerate(headers):
+        c.drawString(columns[i], 0, head)
+    c.line(margin, -15, width - margin, -15)
+
+
+class PageTemplate:
+    """Letterhead + table header for one document, defined once as forms and stamped per page."""
+
+    def __init__(self, c, letterhead, width, height, margin, use_forms=None):
+        self.c, self.width, self.height, self.margin = c, width, height, margin
+        self.letterhead = letterhead
+        self.use_forms = USE_PAGE_FORMS if use_forms is None else use_forms
+        self.headers = self.columns = None
+        if self.use_forms:
+            c.beginForm('letterhead')
+            _draw_letterhead(c, letterhead, width, height, margin)
+            c.endForm()
+
+    def set_table(self, headers, columns):
+        self.headers, self.columns = headers, columns
+        if self.use_forms:
+            self.c.beginForm('table_header')
+            _draw_table_header(self.c, headers, columns, self.width, self.margin)
+            self.c.endForm()
+
+    def stamp_letterhead(self):
+        if self.use_forms:
+            self.c.doForm('letterhead')
+        else:
+            self.c.saveState()
+            _draw_letterhead(self.c, self.letterhead, self.width, self.height, self.margin)
+            self.c.restoreState()
+
+    def stamp_table_header(self, y):
+        """Draw the table header at ``y``; returns the y just below its rule."""
+        self.c.saveState()
+        self.c.translate(0, y)
+        if self.use_forms:
+            self.c.doForm('table_header')
+        else:
+            _draw_table_header(self.c, self.headers, self.columns, self.width, self.margin)
+        self.c.restoreState()
+        return y - 15
+
+    def new_page(self):
+        """Start a continuation page; returns the y where content may begin."""
+        self.c.showPage()
+        self.stamp_letterhead()
+        return self.height - LETTERHEAD_BOTTOM
+
+
+def settings_version(settings):
+    """Everything about the company settings that can change a rendered PDF."""
+    if not settings:
+        return None
+    values = [getattr(settings, column.name) for column in settings.__table__.columns]
+    for path in (settings.logo_image_path, settings.signature_image_path, settings.stamp_image_path):
+        try:
+            st = os.stat(get_static_file_path(path)) if path else None
+        except OSError:
+            st = None
+        values.append((st.st_mtime_ns, st.st_size) if st else None)
+    return values
+
+
+def render_invoice_pdf(form_data, preview, document_type, settings):
+    """Draw the document and return the PDF bytes (no caching, nothing written)."""
+    buffer = BytesIO()
+    # invariant: identical inputs give byte-identical output, which the render cache relies on
+    c = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    width, height = A4
+    margin = 56.69  # ~2cm
+    y = height - margin
+
+    page = PageTemplate(c, letterhead_for(settings), width, height, margin)
+    page.stamp_letterhead()
+
+    y = height - LETTERHEAD_BOTTOM
 
     # --- Document Title ---
     title_map = {
@@ -444,43 +527,32 @@ def generate_invoice_pdf(form_data, preview=False, document_type='invoice', save
             margin + width * sum(col_widths[:3])
         ]
 
-    for i, head in enumerate(headers):
-        c.drawString(columns[i], y, head)
-    y -= 15
-    c.line(margin, y, width - margin, y)
+    page.set_table(headers, columns)
+    y = page.stamp_table_header(y)
 
     # --- Items ---
     c.setFont("Helvetica", 10)
-    subtotal = Decimal('0.00')
 
     items = form_data.get('items', [])
+    # Every line total, the VAT and the grand total in one pass (utils/pricing.py)
+    priced = price_lines(
+        [to_decimal(item.get('quantity')) for item in items],
+        [item.get('unit_price') if document_type != "delivery_note" else None for item in items],
+        to_decimal(form_data.get('vat_rate', 0)) if document_type != "delivery_note" else 0,
+    )
     if not items:
         c.drawString(margin, y - 20, "No items listed.")
         y -= 40
     else:
-        for item in items:
+        for item, (qty, price, total) in zip(items, priced.lines()):
             desc = str(item.get('description', '') or '')
-            qty = to_decimal(item.get('quantity'))
-
-            if document_type != "delivery_note" and 'unit_price' in item:
-                price = to_decimal(item.get('unit_price'))
-                total = qty * price
-                subtotal += total
-            else:
-                price = Decimal('0.00')
-                total = Decimal('0.00')
 
             max_chars = 60
             desc_lines = [desc[i:i + max_chars] for i in range(0, len(desc), max_chars)] or [""]
 
             for line in desc_lines:
                 if y < 100:
-                    c.showPage()
-                    y = height - margin
-                    for i, head in enumerate(headers):
-                        c.drawString(columns[i], y, head)
-                    y -= 15
-                    c.line(margin, y, width - margin, y)
+                    y = page.stamp_table_header(page.new_page())
                     c.setFont("Helvetica", 10)
 
                 c.drawString(columns[0], y - 15, line)
@@ -499,14 +571,11 @@ def generate_invoice_pdf(form_data, preview=False, document_type='invoice', save
 
     # --- Totals ---
     if document_type != "delivery_note":
-        vat_rate = to_decimal(form_data.get('vat_rate', 0)) / Decimal('100')
-        vat_amount = (subtotal * vat_rate).quantize(Decimal('0.00'))
-        total_amount = (subtotal + vat_amount).quantize(Decimal('0.00'))
+        subtotal, vat_amount, total_amount = priced.subtotal, priced.vat_amount, priced.total_amount
 
         y -= 30
         if y < 100:
-            c.showPage()
-            y = height - margin
+            y = page.new_page()
 
         c.setFont("Helvetica-Bold", 11)
         c.drawRightString(width - margin - 80, y, "Subtotal:")
@@ -543,7 +612,7 @@ def generate_invoice_pdf(form_data, preview=False, document_type='invoice', save
         sig_path = get_static_file_path(settings.signature_image_path)
         if os.path.exists(sig_path):
             try:
-                c.drawImage(sig_path, x=signature_x, y=sig_bottom_y,
+                c.drawImage(asset_cache.get_image(sig_path), x=signature_x, y=sig_bottom_y,
                             width=signature_width, height=signature_height, mask='auto')
                 print(f"✅ Signature drawn: {sig_path}")
             except Exception as e:
@@ -556,7 +625,7 @@ def generate_invoice_pdf(form_data, preview=False, document_type='invoice', save
                 c.saveState()
                 c.translate(sig_x + signature_width - 5, sig_bottom_y + signature_height + 15)
                 c.rotate(8)
-                c.drawImage(stamp_path, x=-stamp_size // 2, y=-stamp_size // 2,
+                c.drawImage(asset_cache.get_image(stamp_path), x=-stamp_size // 2, y=-stamp_size // 2,
                             width=stamp_size, height=stamp_size, mask='auto')
                 c.restoreState()
                 print(f"✅ Stamp drawn: {stamp_path}")
@@ -577,7 +646,35 @@ def generate_invoice_pdf(form_data, preview=False, document_type='invoice', save
     # Finalize
     c.save()
     buffer.seek(0)
-    pdf_bytes = buffer.getvalue()
+    return buffer.getvalue()
+
+
+def generate_invoice_pdf(form_data, preview=False, document_type='invoice', save_to_disk=True):
+    print(f"🖨️ PDF Generator: {document_type}, preview={preview}, save_to_disk={save_to_disk}")
+    print("\n📊 FINAL ITEMS BEING DRAWN IN PDF:")
+    for i, item in enumerate(form_data['items']):
+        desc = item['description'][:30] + "..." if len(item['description']) > 30 else item['description']
+        unit_price = float(item.get('unit_price') or 0.0)
+        total_price = float(item.get('total_price') or 0.0)
+        quantity = item['quantity']
+        print(f" {i+1}. '{desc}' x{quantity} @ ${unit_price:.2f} = ${total_price:.2f}")
+
+    try:
+        from models_core.settings_cache import company_settings
+        settings = company_settings()
+    except Exception as e:
+        print(f"⚠️ Could not load company settings: {e}")
+        settings = None
+
+    cache = get_render_cache()
+    cache_key = cache.key_for(form_data, document_type, preview, settings_version(settings)) if cache else None
+    pdf_bytes = cache.get(cache_key) if cache else None
+    if pdf_bytes is None:
+        pdf_bytes = render_invoice_pdf(form_data, preview, document_type, settings)
+        if cache:
+            cache.put(cache_key, pdf_bytes)
+    else:
+        print("♻️ PDF served from render cache")
 
     if save_to_disk:
         pdf_dir = os.path.join(app.static_folder, 'generated_pdfs')
@@ -585,11 +682,15 @@ def generate_invoice_pdf(form_data, preview=False, document_type='invoice', save
         filename = f"{form_data['doc_number']}.pdf"
         filepath = os.path.join(pdf_dir, filename)
 
-        with open(filepath, 'wb') as f:
-            f.write(pdf_bytes)
+        # Hard-link the cached object when possible so identical PDFs share one file
+        if not (cache and cache.link(cache_key, filepath)):
+            if os.path.exists(filepath):
+                os.remove(filepath)  # may be a hard link into the cache; never write through it
+            with open(filepath, 'wb') as f:
+                f.write(pdf_bytes)
 
         rel_path = f"generated_pdfs/{filename}"
         print(f"📄 PDF saved to: {rel_path}")
         return rel_path
 
-    return pdf_bytes
\ No newline at end of file
+    return pdf_bytes
@@ -0,0 +1,94 @@
+# utils/pricing.py
+"""
+Line-item pricing shared by document creation, editing, preview and the PDF
+renderer, so the four of them cannot disagree about a total.
+
+    priced = price_lines(quantities=[3, 1], unit_prices=['19.99', Decimal('5')], vat_rate=16)
+    priced.subtotal, priced.vat_amount, priced.total_amount   # Decimal('64.97'), Decimal('10.40'), Decimal('75.37')
+    for quantity, unit_price, total_price in priced.lines(): ...
+
+All arithmetic is on int64 numpy arrays of cents: line totals are one
+vectorized ``quantities * unit_cents`` and the subtotal one ``sum()``. VAT is
+charged once on the subtotal and rounded half-up to the cent, like
+``models_core.money.to_money``. Quantities are whole units (the
+``invoice_item.quantity`` column is an integer); fractions are truncated.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+from models_core.money import to_money
+
+
+CENT = Decimal('0.01')
+# Below this many cents a float64 still holds every whole cent exactly
+_FLOAT_EXACT_CENTS = 2 ** 52
+
+
+def _cents_to_money(cents):
+    return Decimal(int(cents)) * CENT
+
+
+def _as_quantities(quantities):
+    try:
+        return np.asarray(quantities, dtype=np.float64).astype(np.int64)
+    except (TypeError, ValueError):
+        return np.fromiter((int(q or 0) for q in quantities), dtype=np.int64)
+
+
+def to_cents(amounts):
+    """int64 array of cents for a sequence of amounts (Decimal, str, number or None) or a numeric array."""
+    try:
+        scaled = np.asarray(amounts, dtype=np.float64) * 100
+    except (TypeError, ValueError):
+        scaled = None  # None or blank entries: take the exact path
+    if scaled is not None:
+        cents = np.rint(scaled)
+        # Whole cents (the usual case) survive the float round trip exactly; anything
+        # finer, e.g. '0.125', is rounded half-up by to_money like every other amount
+        if len(cents) == 0 or (np.abs(scaled - cents).max() < 1e-6 and np.abs(cents).max() < _FLOAT_EXACT_CENTS):
+            return cents.astype(np.int64)
+    return np.fromiter((int(to_money(a).scaleb(2)) for a in amounts), dtype=np.int64)
+
+
+class PricedLines:
+    """Per-line and document totals for one set of line items, kept in integer cents."""
+
+    def __init__(self, quantities, unit_cents, vat_rate=0):
+        self.quantities = _as_quantities(quantities)
+        self.unit_cents = np.asarray(unit_cents, dtype=np.int64)
+        if self.quantities.shape != self.unit_cents.shape:
+            raise ValueError(f"{len(self.quantities)} quantities for {len(self.unit_cents)} prices")
+        self.vat_rate = vat_rate if isinstance(vat_rate, Decimal) else Decimal(str(vat_rate or 0))
+        self.line_cents = self.quantities * self.unit_cents
+        self.subtotal_cents = int(self.line_cents.sum())
+        # One rounding, on the document subtotal (Python ints: no int64 overflow)
+        self.vat_cents = int((self.subtotal_cents * self.vat_rate / 100).to_integral_value(ROUND_HALF_UP))
+        self.total_cents = self.subtotal_cents + self.vat_cents
+
+    def __len__(self):
+        return len(self.line_cents)
+
+    @property
+    def subtotal(self):
+        return _cents_to_money(self.subtotal_cents)
+
+    @property
+    def vat_amount(self):
+        return _cents_to_money(self.vat_cents)
+
+    @property
+    def total_amount(self):
+        return _cents_to_money(self.total_cents)
+
+    def lines(self):
+        """Yield ``(quantity, unit_price, total_price)`` per line, amounts as Decimal."""
+        for quantity, unit, total in zip(self.quantities.tolist(), self.unit_cents.tolist(),
+                                         self.line_cents.tolist()):
+            yield quantity, _cents_to_money(unit), _cents_to_money(total)
+
+
+def price_lines(quantities, unit_prices, vat_rate=0):
+    """Price a batch of line items; ``unit_prices`` may be amounts or a float array (see ``to_cents``)."""
+    return PricedLines(quantities, to_cents(unit_prices), vat_rate)
+
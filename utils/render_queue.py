@@ -0,0 +1,218 @@
+# utils/render_queue.py
+"""
+Background PDF rendering for saved documents.
+
+``generate_document`` / ``edit_document`` no longer render inside the request:
+
+    job = queue_render(invoice, form_data, document_type)   # same transaction as the invoice
+    db.session.commit()
+    dispatch(job.id)                                        # hand off to the worker pool
+
+Jobs are durable ``render_job`` rows, so a restart loses nothing --
+``resume_pending_jobs()`` picks up whatever was left. Workers claim a job with a
+conditional ``UPDATE ... WHERE status = 'pending'`` so each job renders once even
+if several processes share the database. ``Invoice.pdf_status`` mirrors the job:
+pending -> rendering -> ready / failed.
+
+A render changes no document data, so ``set_render_state`` writes the status
+(and ``pdf_file``) with a plain UPDATE that leaves ``invoice.updated_at`` and
+the ``invoice`` data_version alone. Otherwise every render would invalidate
+the API ETags and the forecast model cache, and move the analytics export
+watermark.
+
+With ``PDF_RENDER_ASYNC = False`` (the testing config) ``dispatch`` renders inline.
+"""
+import json
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import inspect, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models_core import db
+from models_core.models import Invoice, RenderJob
+
+PENDING, RENDERING, READY, FAILED = 'pending', 'rendering', 'ready', 'failed'
+IN_PROGRESS = (PENDING, RENDERING)
+
+POLL_INTERVAL = 0.2
+# A job still 'rendering' after this long belonged to a worker that died
+STALE_AFTER = timedelta(minutes=5)
+
+_executor = None
+_lock = threading.Lock()
+_in_flight = set()
+
+
+def _get_executor(app):
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('PDF_RENDER_WORKERS', 2),
+                thread_name_prefix='pdf-render',
+            )
+        return _executor
+
+
+def set_render_state(invoice, status, pdf_file=None):
+    """Set ``invoice``'s pdf_status (and pdf_file) without counting as an edit of it. Does not commit."""
+    values = {'pdf_status': status}
+    if pdf_file is not None:
+        values['pdf_file'] = pdf_file
+    if not inspect(invoice).persistent:
+        # Not inserted yet: the INSERT carries the values
+        for name, value in values.items():
+            setattr(invoice, name, value)
+        return
+    table = Invoice.__table__
+    db.session.execute(update(table).where(table.c.id == invoice.id)
+                       .values(updated_at=table.c.updated_at, **values))
+    for name, value in values.items():
+        set_committed_value(invoice, name, value)
+
+
+def queue_render(invoice, form_data, document_type):
+    """Add a render job for ``invoice`` to the session; commit, then ``dispatch(job.id)``."""
+    job = RenderJob(
+        invoice=invoice,
+        payload=json.dumps({'document_type': document_type, 'form_data': form_data}, default=str),
+    )
+    set_render_state(invoice, PENDING)
+    db.session.add(job)
+    return job
+
+
+def document_form_data(invoice):
+    """The ``generate_invoice_pdf`` input for a saved document, rebuilt from its rows."""
+    return {
+        'document_type': invoice.document_type,
+        'doc_number': invoice.invoice_number,
+        'po_number': invoice.po_number,
+        'client_name': invoice.client.name,
+        'client_address': invoice.client.address,
+        'issue_date': invoice.issue_date.strftime('%Y-%m-%d') if invoice.issue_date else 'N/A',
+        'due_date': invoice.due_date.strftime('%Y-%m-%d') if invoice.due_date else 'N/A',
+        'signing_person_name': invoice.signing_person_name,
+        'signing_person_function': invoice.signing_person_function,
+        'vat_rate': float(invoice.vat_rate or 0),
+        'subtotal': invoice.subtotal,
+        'total_amount': invoice.total_amount,
+        'items': [
+            {
+                'description': i.description,
+                'quantity': i.quantity,
+                'unit_price': i.unit_price,
+                'total_price': i.total_price,
+                'comment': i.comment
+            }
+            for i in invoice.items
+        ]
+    }
+
+
+def dispatch(job_id):
+    """Start a committed job on the worker pool (or inline when PDF_RENDER_ASYNC is off)."""
+    app = current_app._get_current_object()
+    if not app.config.get('PDF_RENDER_ASYNC', True):
+        run_job(job_id)
+        return
+    with _lock:
+        if job_id in _in_flight:
+            return
+        _in_flight.add(job_id)
+    _get_executor(app).submit(_run_in_app, app, job_id)
+
+
+def _run_in_app(app, job_id):
+    try:
+        with app.app_context():
+            try:
+                run_job(job_id)
+            finally:
+                db.session.remove()
+    except Exception:
+        traceback.print_exc()
+    finally:
+        with _lock:
+            _in_flight.discard(job_id)
+
+
+def run_job(job_id):
+    """Claim and render one job. Returns its final status, or None if it was not pending."""
+    claimed = db.session.execute(
+        update(RenderJob)
+        .where(RenderJob.id == job_id, RenderJob.status == PENDING)
+        .values(status=RENDERING, started_at=datetime.utcnow(), attempts=RenderJob.attempts + 1)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return None
+    job = db.session.get(RenderJob, job_id)
+    set_render_state(job.invoice, RENDERING)
+    db.session.commit()
+
+    payload = json.loads(job.payload)
+    try:
+        from utils.pdf_generator import generate_invoice_pdf  # ReportLab loads with the first render
+        pdf_file = generate_invoice_pdf(payload['form_data'], document_type=payload['document_type'],
+                                        save_to_disk=True)
+    except Exception as exc:
+        db.session.rollback()
+        traceback.print_exc()
+        job = db.session.get(RenderJob, job_id)
+        job.status = FAILED
+        job.error = f"{type(exc).__name__}: {exc}"
+        set_render_state(job.invoice, FAILED)
+    else:
+        job.status = READY
+        job.error = None
+        set_render_state(job.invoice, READY, pdf_file)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    print(f"🖨️ Render job {job_id} for invoice {job.invoice_id}: {job.status}")
+    return job.status
+
+
+def dispatch_for_invoice(invoice_id):
+    """(Re)start the invoice's unfinished job, e.g. one queued before a restart. Safe to repeat."""
+    job_id = db.session.scalar(
+        select(RenderJob.id)
+        .where(RenderJob.invoice_id == invoice_id, RenderJob.status == PENDING)
+        .order_by(RenderJob.id.desc())
+    )
+    if job_id is not None:
+        dispatch(job_id)
+
+
+def resume_pending_jobs(now=None):
+    """Re-queue stale 'rendering' jobs and dispatch every pending one. Returns how many were dispatched."""
+    now = now or datetime.utcnow()
+    db.session.execute(
+        update(RenderJob)
+        .where(RenderJob.status == RENDERING, RenderJob.started_at < now - STALE_AFTER)
+        .values(status=PENDING)
+    )
+    db.session.commit()
+    job_ids = db.session.scalars(
+        select(RenderJob.id).where(RenderJob.status == PENDING).order_by(RenderJob.id)
+    ).all()
+    for job_id in job_ids:
+        dispatch(job_id)
+    return len(job_ids)
+
+
+def wait_for_render(invoice_id, timeout):
+    """Poll until the invoice's PDF is no longer pending/rendering or ``timeout`` seconds pass; returns the status."""
+    deadline = time.monotonic() + timeout
+    while True:
+        status = db.session.scalar(select(Invoice.pdf_status).where(Invoice.id == invoice_id))
+        if status not in IN_PROGRESS or time.monotonic() >= deadline:
+            return status
+        # End the read transaction so the next poll sees the worker's commit
+        db.session.rollback()
+        time.sleep(POLL_INTERVAL)
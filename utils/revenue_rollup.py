@@ -0,0 +1,188 @@
+# utils/revenue_rollup.py
+"""
+Paid revenue per calendar month, kept up to date incrementally.
+
+``revenue_by_month`` holds one row per (year, month, document_type, currency)
+with the number of paid documents, their total and their VAT, bucketed by
+``date_created`` like the dashboard. ``get_monthly_summary()`` and
+``/api/monthly_revenue`` read a handful of those rows instead of grouping the
+invoice table on every call.
+
+The rows move with the documents: ``record_revenue_change()`` is called from
+``dashboard_metrics.record_invoice_change()``, so creating a document,
+editing it into a new version and switching its status to or from 'Paid'
+all add their delta in the same transaction as the change. Each delta is a
+single ``INSERT ... ON CONFLICT DO UPDATE SET revenue = revenue + :delta``,
+so concurrent writers never lose an update.
+
+A rollup is *built* once it holds the marker row (year 0, document_type
+``BUILT_MARKER``) written by every fill. ``upgrade_schema()`` builds it on
+start-up, ``rebuild_revenue_by_month()`` (the ``rebuild-revenue-rollup`` CLI
+command) recomputes it after bulk SQL that bypasses the ORM. Until it is
+built, changes are not tracked and reads fall back to grouping the invoice
+table; request handlers never fill it themselves.
+"""
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import delete, exists, extract, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models_core import db
+from models_core.models import Invoice, RevenueByMonth
+from models_core.money import ZERO, to_money
+
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+MonthRevenue = namedtuple('MonthRevenue', 'year month revenue vat_collected invoice_count')
+
+# document_type of the row (year 0, invoice_count 0) marking the rollup as built
+BUILT_MARKER = 'rollup_built'
+
+
+# ========================
+# Incremental updates
+# ========================
+
+def _contributions(snapshot):
+    """The rollup row a ``dashboard_metrics.invoice_snapshot`` counts towards, if it is paid."""
+    if not snapshot or snapshot['status'] != 'Paid':
+        return {}
+    created = snapshot['created']
+    key = (created.year, created.month, snapshot['document_type'], snapshot['currency'])
+    return {key: (1, snapshot['total_amount'], snapshot['vat_amount'])}
+
+
+def _apply(key, count, revenue, vat):
+    table = RevenueByMonth.__table__
+    year, month, document_type, currency = key
+    period = (table.c.year == year, table.c.month == month,
+              table.c.document_type == document_type, table.c.currency == currency)
+    increments = {
+        'invoice_count': table.c.invoice_count + count,
+        'revenue': table.c.revenue + revenue,
+        'vat': table.c.vat + vat,
+    }
+    dialect = db.session.connection().dialect.name
+    if dialect in _INSERTS:
+        stmt = _INSERTS[dialect](table).values(
+            year=year, month=month, document_type=document_type, currency=currency,
+            invoice_count=count, revenue=revenue, vat=vat,
+        ).on_conflict_do_update(
+            index_elements=[table.c.year, table.c.month, table.c.document_type, table.c.currency],
+            set_=increments,
+        )
+        db.session.execute(stmt)
+    elif db.session.execute(update(table).where(*period).values(**increments)).rowcount == 0:
+        db.session.add(RevenueByMonth(year=year, month=month, document_type=document_type,
+                                      currency=currency, invoice_count=count, revenue=revenue, vat=vat))
+
+
+def record_revenue_change(after, before=None):
+    """
+    Move one document's paid amounts from ``before`` to ``after`` (both
+    ``invoice_snapshot``s; ``before`` is None for a new document). Does not commit.
+    """
+    if not _is_built():
+        # The initial build (upgrade_schema) will count this change
+        return
+    deltas = defaultdict(lambda: [0, ZERO, ZERO])
+    for sign, snapshot in ((1, after), (-1, before)):
+        for key, values in _contributions(snapshot).items():
+            for i, value in enumerate(values):
+                deltas[key][i] += sign * value
+    for key, (count, revenue, vat) in sorted(deltas.items()):
+        if count or revenue or vat:
+            _apply(key, count, revenue, vat)
+
+
+# ========================
+# Live aggregation & rebuild
+# ========================
+
+def _live_query():
+    year = extract('year', Invoice.date_created)
+    month = extract('month', Invoice.date_created)
+    return (
+        select(year.label('year'), month.label('month'), Invoice.document_type, Invoice.currency,
+               func.count(Invoice.id).label('invoice_count'),
+               func.coalesce(func.sum(Invoice.total_amount), 0).label('revenue'),
+               func.coalesce(func.sum(Invoice.vat_amount), 0).label('vat'))
+        .where(Invoice.status == 'Paid', Invoice.date_created.is_not(None))
+        .group_by(year, month, Invoice.document_type, Invoice.currency)
+    )
+
+
+def live_revenue_by_month():
+    """``{(year, month, document_type, currency): (count, revenue, vat)}`` straight from the invoice table."""
+    return {
+        (int(y), int(m), document_type, currency): (count, to_money(revenue), to_money(vat))
+        for y, m, document_type, currency, count, revenue, vat in db.session.execute(_live_query())
+    }
+
+
+def stored_revenue_by_month():
+    """The rollup in the same shape as ``live_revenue_by_month()`` (months with no paid documents left out)."""
+    rows = db.session.execute(
+        select(RevenueByMonth.year, RevenueByMonth.month, RevenueByMonth.document_type, RevenueByMonth.currency,
+               RevenueByMonth.invoice_count, RevenueByMonth.revenue, RevenueByMonth.vat)
+        .where(RevenueByMonth.invoice_count != 0)
+    )
+    return {(y, m, document_type, currency): (count, revenue, vat)
+            for y, m, document_type, currency, count, revenue, vat in rows}
+
+
+def _is_built():
+    return db.session.scalar(select(exists().where(
+        RevenueByMonth.year == 0, RevenueByMonth.document_type == BUILT_MARKER
+    )))
+
+
+def _refill():
+    db.session.flush()
+    table = RevenueByMonth.__table__
+    db.session.execute(delete(table))
+    db.session.execute(table.insert().from_select(
+        ['year', 'month', 'document_type', 'currency', 'invoice_count', 'revenue', 'vat'], _live_query()
+    ))
+    db.session.execute(table.insert().values(year=0, month=0, document_type=BUILT_MARKER, currency='',
+                                             invoice_count=0, revenue=0, vat=0))
+
+
+def rebuild_revenue_by_month():
+    """Recompute the rollup from the invoice table in one ``INSERT ... SELECT``. Commits; returns the row count."""
+    _refill()
+    db.session.commit()
+    return db.session.scalar(select(func.count(RevenueByMonth.id)).where(RevenueByMonth.year != 0))
+
+
+def build_revenue_by_month():
+    """Build the rollup unless it already is (for ``upgrade_schema()``). Returns a change description, if any."""
+    if _is_built():
+        return []
+    return [f"revenue_by_month ({rebuild_revenue_by_month()} rows)"]
+
+
+# ========================
+# Read path
+# ========================
+
+def monthly_revenue(since, document_type='invoice', currency=None):
+    """
+    Paid revenue per month from the ``since`` month (a date or datetime) on,
+    oldest first, as ``MonthRevenue`` rows; all currencies together unless
+    ``currency`` is given. Grouped from the invoice table while the rollup
+    is not built yet.
+    """
+    rows = RevenueByMonth.__table__ if _is_built() else _live_query().subquery()
+    query = (
+        select(rows.c.year, rows.c.month,
+               func.sum(rows.c.revenue), func.sum(rows.c.vat), func.sum(rows.c.invoice_count))
+        .where(rows.c.document_type == document_type, rows.c.invoice_count != 0,
+               or_(rows.c.year > since.year, (rows.c.year == since.year) & (rows.c.month >= since.month)))
+        .group_by(rows.c.year, rows.c.month)
+        .order_by(rows.c.year, rows.c.month)
+    )
+    if currency is not None:
+        query = query.where(rows.c.currency == currency)
+    return [MonthRevenue(int(year), int(month), revenue, vat, count)
+            for year, month, revenue, vat, count in db.session.execute(query)]
@@ -0,0 +1,77 @@
+# utils/typeahead.py
+"""
+Name lookups for the typeahead fields (``/api/typeahead/<kind>?q=...``).
+
+Only the top ``limit`` matches leave the database: names starting with the
+term first, then names containing it. Both are served by the
+``lower(name)`` indexes from ``models.name_lookup_index``:
+
+* SQLite: the prefix match is a range scan on the btree
+  (``lower(name) >= 'ab' AND lower(name) < 'ac'``); the substring fallback
+  only runs when the prefixes did not fill the page.
+* PostgreSQL: one ``lower(name) LIKE '%ab%'`` on the pg_trgm GIN index,
+  prefixes first, then by trigram similarity.
+"""
+from sqlalchemy import and_, case, func, not_, select
+
+from models_core import db
+from models_core.models import Client, OurProductService, Supplier
+
+LOOKUPS = {
+    'clients': Client,
+    'products': OurProductService,
+    'suppliers': Supplier,
+}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _base(model):
+    statement = select(model.id, model.name)
+    if model is OurProductService:
+        statement = statement.where(OurProductService.is_active.isnot(False))
+    return statement
+
+
+def typeahead(kind, term, limit=DEFAULT_LIMIT):
+    """Up to ``limit`` ``{'id', 'label'}`` dicts whose name starts with, then contains, ``term``."""
+    model = LOOKUPS[kind]
+    term = (term or '').strip().lower()
+    limit = max(1, min(limit, MAX_LIMIT))
+    if not term:
+        return []
+    key = func.lower(model.name)
+    escaped = _escape_like(term)
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        rows = db.session.execute(
+            _base(model)
+            .where(key.like(f"%{escaped}%", escape='\\'))
+            .order_by(case((key.like(f"{escaped}%", escape='\\'), 0), else_=1),
+                      func.similarity(key, term).desc(), key, model.id)
+            .limit(limit)
+        ).all()
+    else:
+        prefix = and_(key >= term, key < term[:-1] + chr(ord(term[-1]) + 1))
+        rows = db.session.execute(_base(model).where(prefix).order_by(key, model.id).limit(limit)).all()
+        if len(rows) < limit:
+            rows += db.session.execute(
+                _base(model)
+                .where(key.like(f"%{escaped}%", escape='\\'), not_(prefix))
+                .order_by(key, model.id)
+                .limit(limit - len(rows))
+            ).all()
+    return [{'id': row.id, 'label': row.name} for row in rows]
+
+
+def selected_choice(model, value):
+    """SelectField choices holding just the chosen row (the rest arrive through the typeahead)."""
+    try:
+        row = db.session.get(model, int(value)) if value not in (None, '', -1, '-1') else None
+    except (TypeError, ValueError):
+        row = None
+    return [(row.id, row.name)] if row else []
@@ -0,0 +1,64 @@
+# views/analysis.py
+"""
+Business analysis pages. Registered lazily by ``app.py`` (see
+utils/lazy_views.py): this module, and NumPy/SciPy with it, is imported on the
+first request to one of these pages.
+"""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from flask import render_template
+from flask_login import login_required
+from sqlalchemy import func, select
+
+from models_core import db
+from models_core.models import Invoice, OurProductService, ProcurementItem
+from utils.forecasting import revenue_forecast
+from utils.invoice_stats import invoice_kpis
+
+
+@login_required
+def profitability_analysis():
+    # Money columns are integer minor units, so both sums are exact in the database
+    total_revenue = invoice_kpis(Invoice.document_type == 'invoice').total('invoice', 'Paid')
+    total_cogs = db.session.scalar(select(func.coalesce(func.sum(OurProductService.cogs), 0)))
+    gross_profit = total_revenue - total_cogs
+    profit_margin = (gross_profit / total_revenue * 100) if total_revenue > 0 else Decimal('0.00')
+
+    return render_template('analysis/profitability.html',
+                           total_revenue=total_revenue,
+                           total_cogs=total_cogs,
+                           gross_profit=gross_profit,
+                           profit_margin=round(profit_margin, 2))
+
+
+@login_required
+def procurement_spending_analysis():
+    one_year_ago = datetime.now(timezone.utc) - timedelta(days=365)
+    total_spent = db.session.query(func.coalesce(func.sum(ProcurementItem.total_cost), 0)) \
+        .filter(ProcurementItem.purchase_date >= one_year_ago).scalar()
+    return render_template('analysis/procurement.html', total_spent=total_spent)
+
+
+@login_required
+def business_prediction():
+    forecast = revenue_forecast(horizon=6)
+    recent_invoices = Invoice.query.filter_by(document_type='invoice') \
+        .order_by(Invoice.date_created.desc()).limit(10).all()
+    history = forecast.history[-24:]
+    return render_template('analysis/prediction.html',
+                           forecast=forecast,
+                           predicted_revenue=sum(point.revenue for point in forecast.points),
+                           chart_labels=[month.strftime('%b %Y') for month, _ in history]
+                           + [point.month.strftime('%b %Y') for point in forecast.points],
+                           history_values=[float(amount) for _, amount in history],
+                           recent_invoices=recent_invoices)
+
+
+@login_required
+def business_outlook():
+    upcoming_invoices = Invoice.query.filter(
+        Invoice.status == 'Pending',
+        Invoice.document_type == 'invoice'
+    ).order_by(Invoice.due_date.asc()).limit(5).all()
+    return render_template('analysis/business_outlook.html', upcoming_invoices=upcoming_invoices)